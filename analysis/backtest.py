@@ -0,0 +1,242 @@
+# analysis/backtest.py
+# %%
+
+import hashlib
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+"""
+Rolling-origin backtest for SARIMAX price forecasts.
+
+For every origin (by default one per day at `origin_hour` UTC) the model
+forecasts the next `horizon` quarter-hours from the information available at
+the origin. Exogenous variables enter with their realized values, so the
+scores measure the model given the fundamentals, not the fundamentals'
+own forecast error.
+
+Parameters are estimated once per block of origins (`refit_every_days`, or
+once for the whole run) on the `train_days` preceding the block. Inside a
+block nothing is refitted: the model is filtered once over the block with
+fixed parameters and all origins are forecast together by propagating the
+filter's one-step-ahead states through the transition matrix, which is a
+handful of small matrix products per horizon step for every origin at once.
+Blocks run in parallel on a process pool.
+"""
+
+DAY_AHEAD_STEPS = 96
+MAXITER = 50
+
+
+def origin_positions(index: pd.DatetimeIndex, n_origins: int, origin_hour: int, min_pos: int, horizon: int) -> np.ndarray:
+    """
+    Positions of the last observation before each daily origin time
+    (hh:00 UTC), newest `n_origins` that leave room for `horizon` steps and
+    for `min_pos` training observations before them.
+    """
+    times = index[(index.hour == origin_hour) & (index.minute == 0)]
+    pos = index.get_indexer(times) - 1
+    pos = pos[(pos >= min_pos) & (pos + horizon < len(index))]
+    return pos[-n_origins:] if n_origins else pos
+
+
+def _at(mat: np.ndarray, t: np.ndarray | int) -> np.ndarray:
+    """Time-varying state-space matrices have a trailing nobs axis, time-invariant ones length 1."""
+    return mat[..., 0] if mat.shape[-1] == 1 else mat[..., t]
+
+
+def forecast_paths(res, origins: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    (n_origins, horizon) forecasts y[o+1 .. o+horizon | info up to o] from a
+    filtered SARIMAX results object, positions relative to its sample.
+    """
+    ssm = res.model.ssm
+    Z = ssm.design  # (k_endog, k_states, 1 | nobs)
+    d = ssm.obs_intercept  # (k_endog, 1 | nobs)
+    T = ssm.transition  # (k_states, k_states, 1 | nobs)
+    c = ssm.state_intercept  # (k_states, 1 | nobs)
+
+    # a[t+1 | t] for every origin: (k_states, n_origins)
+    a = res.predicted_state[:, origins + 1]
+    out = np.empty((len(origins), horizon))
+    for k in range(horizon):
+        t = origins + 1 + k
+        if Z.shape[-1] == 1:
+            yk = Z[0, :, 0] @ a
+        else:
+            yk = np.einsum("sn,sn->n", Z[0][:, t], a)
+        out[:, k] = yk + _at(d, t)[0]
+
+        # a[t+1 | o] = T a[t | o] + c[t]
+        if T.shape[-1] == 1:
+            a = T[:, :, 0] @ a
+        else:
+            a = np.einsum("ijn,jn->in", T[:, :, t], a)
+        a = a + (_at(c, t) if c.shape[-1] > 1 else c[:, :1])
+    return out
+
+
+def _make_model(y: pd.Series, X: pd.DataFrame, order: tuple[int, int, int]):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    return SARIMAX(
+        endog=y,
+        exog=X,
+        order=tuple(int(o) for o in order),
+        trend="c",
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+    )
+
+
+def fit_params(y: pd.Series, X: pd.DataFrame, order: tuple[int, int, int], start_params=None) -> np.ndarray:
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning
+
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+    res = _make_model(y, X, order).fit(
+        start_params=start_params, disp=False, maxiter=MAXITER, cov_type="none"
+    )
+    return np.asarray(res.params)
+
+
+def _run_block(
+    y: pd.Series,
+    X: pd.DataFrame,
+    order: tuple[int, int, int],
+    origins: np.ndarray,
+    horizon: int,
+    train_obs: int,
+    params: np.ndarray | None = None,
+    start_params: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """
+    Fit (unless `params` is given) on the train_obs observations before the
+    first origin, filter once up to the last forecast target and forecast
+    every origin of the block. Returns the long forecast frame.
+    """
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    first = int(origins[0])
+    lo = max(first + 1 - train_obs, 0)
+    if params is None:
+        params = fit_params(y.iloc[lo : first + 1], X.iloc[lo : first + 1], order, start_params)
+
+    hi = int(origins[-1]) + horizon + 1
+    res = _make_model(y.iloc[lo:hi], X.iloc[lo:hi], order).filter(params)
+    paths = forecast_paths(res, origins - lo, horizon)
+
+    steps = np.arange(1, horizon + 1)
+    target_pos = origins[:, None] + steps[None, :]
+    return pd.DataFrame(
+        {
+            "origin": np.repeat(y.index[origins], horizon),
+            "time": y.index[target_pos.ravel()],
+            "step": np.tile(steps, len(origins)),
+            "actual": y.to_numpy()[target_pos.ravel()],
+            "forecast": paths.ravel(),
+        }
+    )
+
+
+def score_forecasts(fc: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """MAE / RMSE overall, by horizon step and by hour of the target time."""
+    err = fc["forecast"] - fc["actual"]
+    tmp = pd.DataFrame({"step": fc["step"], "hour": fc["time"].dt.hour, "abs": err.abs(), "sq": err**2})
+
+    def _agg(g):
+        out = g.agg(mae=("abs", "mean"), rmse=("sq", "mean"), n=("abs", "size"))
+        out["rmse"] = np.sqrt(out["rmse"])
+        return out
+
+    overall = pd.DataFrame(
+        {"mae": [tmp["abs"].mean()], "rmse": [np.sqrt(tmp["sq"].mean())], "n": [len(tmp)]}
+    )
+    return {
+        "overall": overall,
+        "by_horizon": _agg(tmp.groupby("step")),
+        "by_hour": _agg(tmp.groupby("hour")),
+    }
+
+
+def run_backtest(
+    y: pd.Series,
+    X: pd.DataFrame,
+    order: tuple[int, int, int],
+    horizon: int = DAY_AHEAD_STEPS,
+    n_origins: int = 365,
+    origin_hour: int = 0,
+    train_days: int = 90,
+    refit_every_days: int | None = None,
+    max_workers: int | None = None,
+    progress=None,
+) -> dict:
+    """
+    Rolling-origin backtest of one SARIMAX specification on (y, X).
+    Returns {"forecasts", "overall", "by_horizon", "by_hour", "n_origins",
+    "n_fits", "seconds"}.
+    """
+    t0 = time.perf_counter()
+    train_obs = int(train_days * 96)
+    origins = origin_positions(y.index, n_origins, origin_hour, min(train_obs, len(y) // 2), horizon)
+    if len(origins) == 0:
+        raise ValueError("Not enough data for a single backtest origin.")
+
+    if refit_every_days:
+        blocks = [origins[i : i + refit_every_days] for i in range(0, len(origins), refit_every_days)]
+    else:
+        blocks = [origins]
+
+    if progress is not None:
+        progress.update({"stage": "fitting", "done": 0, "total": len(blocks)})
+
+    # first block fitted here; its parameters warm-start the others
+    first = int(origins[0])
+    lo = max(first + 1 - train_obs, 0)
+    first_params = fit_params(y.iloc[lo : first + 1], X.iloc[lo : first + 1], order)
+    frames = [_run_block(y, X, order, blocks[0], horizon, train_obs, params=first_params)]
+    if progress is not None:
+        progress["done"] = 1
+
+    if len(blocks) > 1:
+        if max_workers is None:
+            max_workers = max((os.cpu_count() or 2) - 1, 1)
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, len(blocks) - 1), mp_context=mp.get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(_run_block, y, X, order, block, horizon, train_obs, None, first_params)
+                for block in blocks[1:]
+            ]
+            for fut in futures:
+                frames.append(fut.result())
+                if progress is not None:
+                    progress["done"] = progress.get("done", 0) + 1
+
+    fc = pd.concat(frames, ignore_index=True)
+    return {
+        "forecasts": fc,
+        **score_forecasts(fc),
+        "n_origins": int(len(origins)),
+        "n_fits": len(blocks),
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def submit_backtest(queue, y: pd.Series, X: pd.DataFrame, order: tuple[int, int, int], **kwargs) -> str:
+    """Run the backtest as one JobQueue job; returns the job key."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    h.update(repr((list(X.columns), tuple(order), sorted(kwargs.items()))).encode())
+    return queue.submit("backtest-" + h.hexdigest(), run_backtest, y, X, tuple(order), **kwargs)
@@ -0,0 +1,245 @@
+# analysis/baseline_forecast.py
+# %%
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.de_features import build_feature_frame
+from analysis.read_data import load_filter_history
+from analysis.seasonality import fourier_basis, fourier_columns
+from power.fetch_power.parquet_convert import merge_incoming_data
+from power.fetch_power.smard_filters import MARKET_PRICE_FILTER_IDS
+
+"""
+Closed-form baseline price forecaster for every market-price zone.
+
+Per zone, price(t) is regressed on
+    1, daily / weekly Fourier terms (analysis/seasonality.py),
+    DE wind / solar forecasts (GW), price(t - 1 day)
+with a ridge penalty. Only the normal equations X'X and X'y are kept per zone
+(state/baseline_forecast.json); each run adds the rows after the zone's
+watermark and solves all zones in one batched np.linalg.solve. The next
+HORIZON quarter-hours are then forecast and merged into their own root,
+data/baseline/region=DE/filter=<price filter id>/ (same layout as the raw
+lake, kept out of it like data/indicators), so pages read them with
+load_filter_history(data_root=...).
+"""
+
+BASELINE_STATE_PATH = PROJECT_ROOT / "state" / "baseline_forecast.json"
+
+BASELINE_ROOT = PROJECT_ROOT / "data" / "baseline"
+
+STEP = pd.Timedelta(minutes=15)
+
+# (daily, weekly, yearly) orders of the seasonality basis
+FOURIER_ORDERS = (3, 2, 0)
+BASELINE_EXOGS = ["wind_fc", "solar_fc"]
+EXOG_SCALE = 1e-3  # MW -> GW, keeps X'X well scaled
+PRICE_LAG = 96  # same quarter-hour yesterday: known for the whole day-ahead horizon
+HORIZON = 96
+RIDGE_LAMBDA = 1e-3
+
+# bump when the design changes: stored normal equations are rebuilt
+BASELINE_VERSION = 1
+
+
+def design_columns(exogs: list[str]) -> list[str]:
+    return ["const"] + fourier_columns(*FOURIER_ORDERS) + list(exogs) + [f"price_lag{PRICE_LAG}"]
+
+
+def design_matrix(index: pd.DatetimeIndex, exog: pd.DataFrame, price_lag: np.ndarray) -> np.ndarray:
+    """(n, k) design in design_columns() order."""
+    parts = [np.ones((len(index), 1))]
+    parts.append(fourier_basis(index, *FOURIER_ORDERS).to_numpy(dtype=np.float64))
+    parts.append(exog.to_numpy(dtype=np.float64) * EXOG_SCALE)
+    parts.append(np.asarray(price_lag, dtype=np.float64)[:, None])
+    return np.concatenate(parts, axis=1)
+
+
+def load_baseline_state(path: str | Path = BASELINE_STATE_PATH) -> dict:
+    file_path = Path(path)
+    if not file_path.exists():
+        return {}
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline_state(path: str | Path, state: dict) -> None:
+    file_path = Path(path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "w") as f:
+        json.dump(state, f)
+
+
+def _load_price_wide(start=None, end=None, root: Path = PROJECT_ROOT) -> pd.DataFrame:
+    """time x price filter id (regular 15-min grid, NaN where missing)."""
+    cols = {}
+    for filter_id in MARKET_PRICE_FILTER_IDS:
+        df = load_filter_history(filter_id, region="DE", root=root, start=start, end=end)
+        if df is None or df.empty:
+            continue
+        cols[filter_id] = pd.Series(
+            df["value"].to_numpy(dtype=np.float64),
+            index=pd.DatetimeIndex(pd.to_datetime(df["time_utc"], utc=True)),
+        )
+    if not cols:
+        return pd.DataFrame()
+    wide = pd.DataFrame(cols).sort_index()
+    return wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq=STEP))
+
+
+def solve_ridge(xtx: np.ndarray, xty: np.ndarray, lam: float = RIDGE_LAMBDA) -> np.ndarray:
+    """
+    Batched ridge solve: xtx (Z, k, k), xty (Z, k) -> beta (Z, k).
+    The penalty is lam * diag(X'X) (scale-free), the intercept is not penalized.
+    """
+    k = xtx.shape[-1]
+    diag = np.diagonal(xtx, axis1=1, axis2=2).copy()
+    diag[:, 0] = 0.0
+    penalty = lam * diag[:, :, None] * np.eye(k)[None, :, :]
+    # tiny jitter keeps zones with (almost) no rows solvable
+    return np.linalg.solve(xtx + penalty + 1e-9 * np.eye(k)[None], xty[:, :, None])[:, :, 0]
+
+
+def update_baseline_forecasts(
+    end=None,
+    rebuild: bool = False,
+    horizon: int = HORIZON,
+    root: Path = PROJECT_ROOT,
+    state_path: Path = BASELINE_STATE_PATH,
+    baseline_root: Path = BASELINE_ROOT,
+) -> dict:
+    """
+    Add rows after each zone's watermark to its normal equations, re-solve
+    all zones at once and write the next `horizon` quarter-hours of every
+    zone under `baseline_root`. Full rebuild when there is no state, on
+    `rebuild=True` or when BASELINE_VERSION changed. Returns the new state.
+    """
+    state = load_baseline_state(state_path)
+    incremental = not rebuild and state.get("version") == BASELINE_VERSION and bool(state.get("zones"))
+
+    start = None
+    if incremental:
+        oldest = min(pd.Timestamp(z["watermark"]) for z in state["zones"].values())
+        # one extra day for the price lag
+        start = oldest - PRICE_LAG * STEP - pd.Timedelta(days=1)
+
+    wide = _load_price_wide(start=start, end=end, root=root)
+    if wide.empty:
+        return state
+
+    future = pd.date_range(wide.index.max() + STEP, periods=horizon, freq=STEP)
+    index = wide.index.append(future)
+
+    exog = build_feature_frame(index, BASELINE_EXOGS, start=index.min())
+    if incremental:
+        exogs = state["exogs"]
+    else:
+        # fundamentals that are not in the lake are left out of the design
+        exogs = [c for c in BASELINE_EXOGS if c in exog.columns and exog[c].notna().any()]
+    exog = exog.reindex(columns=exogs)
+
+    columns = design_columns(exogs)
+    k = len(columns)
+    zones = [fid for fid in MARKET_PRICE_FILTER_IDS if fid in wide.columns]
+
+    xtx = np.zeros((len(zones), k, k))
+    xty = np.zeros((len(zones), k))
+    designs, last_obs, watermarks = {}, {}, {}
+
+    for i, fid in enumerate(zones):
+        y = wide[fid].reindex(index)
+        lag = wide[fid].reindex(index - PRICE_LAG * STEP).to_numpy()
+        X = design_matrix(index, exog, lag)
+        designs[fid] = X
+
+        prev = state["zones"].get(fid) if incremental else None
+        if prev is not None:
+            xtx[i] = np.asarray(prev["xtx"])
+            xty[i] = np.asarray(prev["xty"])
+            n_prev = prev["n"]
+            wm = pd.Timestamp(prev["watermark"])
+        else:
+            n_prev, wm = 0, None
+
+        yv = y.to_numpy()
+        use = np.isfinite(yv) & np.isfinite(X).all(axis=1)
+        if wm is not None:
+            use &= index > wm
+        Xu, yu = X[use], yv[use]
+        xtx[i] += Xu.T @ Xu
+        xty[i] += Xu.T @ yu
+
+        observed = index[np.isfinite(yv)]
+        last_obs[fid] = observed.max() if len(observed) else wm
+        new_wm = index[use].max() if use.any() else wm
+        watermarks[fid] = {
+            "n": int(n_prev + use.sum()),
+            "watermark": new_wm.isoformat() if new_wm is not None else None,
+        }
+
+    beta = solve_ridge(xtx, xty)
+
+    # zones without rows in this run keep their stored equations
+    zone_state = dict(state["zones"]) if incremental else {}
+    for i, fid in enumerate(zones):
+        if watermarks[fid]["watermark"] is None:
+            continue
+        zone_state[fid] = {
+            "xtx": xtx[i].tolist(),
+            "xty": xty[i].tolist(),
+            "beta": beta[i].tolist(),
+            **watermarks[fid],
+        }
+
+        # next `horizon` quarter-hours after the zone's last observed price
+        lo = last_obs[fid]
+        ahead = (index > lo) & (index <= lo + horizon * STEP)
+        fc = designs[fid][ahead] @ beta[i]
+        out = pd.DataFrame({"time_utc": index[ahead], "value": fc})
+        out = out[np.isfinite(out["value"])]
+        if not out.empty:
+            merge_incoming_data(baseline_root, "DE", fid, out)
+
+    state = {
+        "version": BASELINE_VERSION,
+        "columns": columns,
+        "exogs": exogs,
+        "zones": zone_state,
+    }
+    save_baseline_state(state_path, state)
+    return state
+
+
+def load_baseline_forecasts(
+    start=None,
+    end=None,
+    root: Path = PROJECT_ROOT,
+    baseline_root: Path = BASELINE_ROOT,
+) -> pd.DataFrame:
+    """Long frame time, filter_id, forecast of the stored baseline series."""
+    frames = []
+    for filter_id in MARKET_PRICE_FILTER_IDS:
+        df = load_filter_history(filter_id, region="DE", root=root, start=start, end=end, data_root=baseline_root)
+        if df is None or df.empty:
+            continue
+        frames.append(
+            pd.DataFrame(
+                {
+                    "time": pd.to_datetime(df["time_utc"], utc=True),
+                    "filter_id": filter_id,
+                    "forecast": df["value"].to_numpy(),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=["time", "filter_id", "forecast"])
+    return pd.concat(frames, ignore_index=True)
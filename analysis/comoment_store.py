@@ -0,0 +1,215 @@
+# analysis/comoment_store.py
+# %%
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.de_features import build_de_features, TARGET_COLUMNS, FUNDAMENTAL_COLUMNS
+from analysis.feature_store import load_feature_store
+from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.state import ensure_utc
+
+"""
+Feature x feature covariance / correlation store (DE targets + fundamentals).
+
+For every closed UTC day we keep four F x F co-moment blocks over the rows
+where both features of a pair are present (pairwise-complete, like
+dropna() on the two columns):
+
+    n[i, j] = count          s[i, j] = sum of x_i
+    q[i, j] = sum of x_i^2   p[i, j] = sum of x_i * x_j
+
+Blocks of different days simply add up, so a window is the sum of its
+days. Each run appends the days that closed since the last one
+(data/stats/comoment_days.parquet) and rewrites the matrices of the
+standard windows (data/stats/comoment_windows.parquet), which is all the
+correlation page reads. SMARD publishes some fundamentals (actual
+generation, consumption) with a lag, so the last REDERIVE_DAYS stored days
+are dropped and recomputed on every run instead of being frozen at close.
+"""
+
+COMOMENT_DAYS_PATH = PROJECT_ROOT / "data" / "stats" / "comoment_days.parquet"
+COMOMENT_WINDOWS_PATH = PROJECT_ROOT / "data" / "stats" / "comoment_windows.parquet"
+
+COMOMENT_FEATURES = TARGET_COLUMNS + FUNDAMENTAL_COLUMNS
+COMOMENT_WINDOWS = {"7D": 7, "30D": 30, "90D": 90, "1Y": 365}
+BLOCK_KINDS = ("n", "s", "q", "p")
+
+# closed days recomputed each run (late-published fundamentals)
+REDERIVE_DAYS = int(os.environ.get("COMOMENT_REDERIVE_DAYS", "3"))
+
+
+def _block_columns(features: list[str]) -> list[str]:
+    return [f"{a}|{b}" for a in features for b in features]
+
+
+def day_blocks(x: np.ndarray) -> dict[str, np.ndarray]:
+    """Co-moment blocks (F x F) of one day's rows x (n_rows x F, NaN = missing)."""
+    m = np.isfinite(x).astype(np.float64)
+    xz = np.where(m > 0, x, 0.0)
+    return {
+        "n": m.T @ m,
+        "s": xz.T @ m,
+        "q": (xz * xz).T @ m,
+        "p": xz.T @ xz,
+    }
+
+
+def blocks_to_cov_corr(blocks: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(n, cov, corr) pairwise-complete sample covariance / Pearson correlation."""
+    n, s, q, p = (blocks[k] for k in BLOCK_KINDS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # s[i, j] = sum x_i over pair rows, s.T[i, j] = sum x_j over the same rows
+        cov = (p - s * s.T / n) / (n - 1)
+        var_i = (q - s * s / n) / (n - 1)
+        var_j = var_i.T
+        corr = cov / np.sqrt(var_i * var_j)
+    cov[n < 2] = np.nan
+    corr[n < 2] = np.nan
+    return n, cov, np.clip(corr, -1.0, 1.0)
+
+
+def _load_features(start, end) -> pd.DataFrame:
+    feat = load_feature_store(columns=COMOMENT_FEATURES, start=start, end=end)
+    if feat.empty:
+        feat = build_de_features(COMOMENT_FEATURES, start=start, end=end)
+    return feat.reindex(columns=COMOMENT_FEATURES).astype(np.float64)
+
+
+def _days_frame(feat: pd.DataFrame, last_closed: pd.Timestamp) -> pd.DataFrame:
+    """One row per (date, kind) with the flattened F x F block."""
+    cols = _block_columns(COMOMENT_FEATURES)
+    rows, index = [], []
+    feat = feat[feat.index < last_closed + pd.Timedelta(days=1)]
+    for day, g in feat.groupby(feat.index.floor("D")):
+        blocks = day_blocks(g.to_numpy())
+        for kind in BLOCK_KINDS:
+            rows.append(blocks[kind].ravel())
+            index.append((day, kind))
+    if not rows:
+        return pd.DataFrame(columns=["date", "kind"] + cols)
+    out = pd.DataFrame(np.vstack(rows), columns=cols)
+    out.insert(0, "kind", [k for _, k in index])
+    out.insert(0, "date", pd.to_datetime([d for d, _ in index], utc=True))
+    return out
+
+
+def window_matrices(days: pd.DataFrame, n_days: int) -> dict[str, np.ndarray] | None:
+    """Summed blocks of the last `n_days` stored days (None if the store is empty)."""
+    if days.empty:
+        return None
+    last = days["date"].max()
+    recent = days[days["date"] > last - pd.Timedelta(days=n_days)]
+    F = len(COMOMENT_FEATURES)
+    cols = _block_columns(COMOMENT_FEATURES)
+    sums = recent.groupby("kind")[cols].sum()
+    return {kind: sums.loc[kind].to_numpy().reshape(F, F) for kind in BLOCK_KINDS}
+
+
+def build_window_frame(days: pd.DataFrame) -> pd.DataFrame:
+    """Long frame: window, as_of, x, y, n, cov, corr for every standard window."""
+    frames = []
+    for window, n_days in COMOMENT_WINDOWS.items():
+        blocks = window_matrices(days, n_days)
+        if blocks is None:
+            continue
+        n, cov, corr = blocks_to_cov_corr(blocks)
+        xs, ys = np.meshgrid(COMOMENT_FEATURES, COMOMENT_FEATURES, indexing="ij")
+        frames.append(
+            pd.DataFrame(
+                {
+                    "window": window,
+                    "as_of": days["date"].max(),
+                    "x": xs.ravel(),
+                    "y": ys.ravel(),
+                    "n": n.ravel(),
+                    "cov": cov.ravel(),
+                    "corr": corr.ravel(),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=["window", "as_of", "x", "y", "n", "cov", "corr"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def update_comoment_store(
+    end=None,
+    rebuild: bool = False,
+    days_path: Path = COMOMENT_DAYS_PATH,
+    windows_path: Path = COMOMENT_WINDOWS_PATH,
+) -> pd.DataFrame:
+    """
+    Add the day blocks of every day closed since the last run (a day is
+    closed once `end` reaches its last quarter-hour) and recompute the last
+    REDERIVE_DAYS stored ones, keep 1Y of days and rewrite the window
+    matrices. Returns the window frame.
+    """
+    end_ts = ensure_utc(end) if end is not None else None
+    days = None if rebuild else read_parquet_if_exists(Path(days_path))
+
+    start = None
+    if days is not None and not days.empty:
+        days["date"] = pd.to_datetime(days["date"], utc=True)
+        start = days["date"].max() + pd.Timedelta(days=1) - pd.Timedelta(days=REDERIVE_DAYS)
+        if list(days.columns[2:]) != _block_columns(COMOMENT_FEATURES):
+            # feature list changed -> rebuild
+            days, start = None, None
+
+    keep_days = max(COMOMENT_WINDOWS.values())
+    if start is None and end_ts is not None:
+        start = end_ts.floor("D") - pd.Timedelta(days=keep_days)
+
+    # one extra day so returns at the start of the range have a previous price
+    feat = _load_features(start - pd.Timedelta(days=1) if start is not None else None, end_ts)
+    if start is not None:
+        feat = feat[feat.index >= start]
+    if not feat.empty:
+        last_ts = feat.index.max() if end_ts is None else min(feat.index.max(), end_ts)
+        # the last day is closed only if it reached its final quarter-hour
+        last_closed = last_ts.floor("D")
+        if last_ts < last_closed + pd.Timedelta(days=1) - pd.Timedelta(minutes=15):
+            last_closed -= pd.Timedelta(days=1)
+
+        new_days = _days_frame(feat, last_closed)
+        if days is not None and not days.empty and not new_days.empty:
+            # re-derived days replace their stored blocks
+            kept = days[days["date"] < start] if start is not None else days.iloc[:0]
+            days = pd.concat([kept, new_days], ignore_index=True)
+        elif not new_days.empty:
+            days = new_days
+
+    if days is None or days.empty:
+        return pd.DataFrame(columns=["window", "as_of", "x", "y", "n", "cov", "corr"])
+
+    days = days[days["date"] > days["date"].max() - pd.Timedelta(days=keep_days)]
+    days = days.sort_values(["date", "kind"]).reset_index(drop=True)
+    write_atomic(Path(days_path), to_parquet_bytes(days))
+
+    windows = build_window_frame(days)
+    write_atomic(Path(windows_path), to_parquet_bytes(windows))
+    return windows
+
+
+def load_comoment_windows(path: Path = COMOMENT_WINDOWS_PATH) -> pd.DataFrame:
+    df = read_parquet_if_exists(Path(path))
+    if df is None:
+        return pd.DataFrame(columns=["window", "as_of", "x", "y", "n", "cov", "corr"])
+    return df
+
+
+def corr_matrix(windows: pd.DataFrame, window: str, value: str = "corr") -> pd.DataFrame:
+    """Square feature x feature matrix of one window (value = "corr" or "cov")."""
+    sub = windows[windows["window"] == window]
+    mat = sub.pivot(index="x", columns="y", values=value)
+    order = [f for f in COMOMENT_FEATURES if f in mat.index]
+    return mat.loc[order, order]
@@ -0,0 +1,231 @@
+# analysis/data_quality.py
+# %%
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.parquet_convert import to_parquet_bytes
+from power.fetch_power.smard_filters import FILTER_GROUPS
+
+"""
+Lake-wide data quality scan.
+
+Each filter's partitions are read with only their time_utc / value columns
+(plus the date= key of each file) and checked with numpy on int64 timestamps:
+
+- off_grid         timestamp not on the 15-min grid
+- unsorted         row earlier than (or equal to) the previous row of its file
+- wrong_partition  row stored under a date= other than its own UTC day
+- duplicates       timestamp stored more than once (within or across files)
+- missing          15-min slots without a row between the filter's first and last timestamp
+- nan              null / NaN values
+- outliers         value beyond OUTLIER_IQR interquartile ranges outside [Q1, Q3]
+
+Days are tagged dst_day on the EU clock-change Sundays, where local-time bugs
+show up as duplicates / missing quarter-hours. Filters are scanned in
+parallel; scan_lake() returns (per filter, per day) reports and
+write_quality_report() stores them as two small parquet files under
+QUALITY_ROOT/region=<R>/.
+"""
+
+QUALITY_ROOT = PROJECT_ROOT / "data" / "quality"
+SCAN_WORKERS = int(os.environ.get("QUALITY_SCAN_WORKERS", os.cpu_count() or 1))  # reads are CPU-bound: one per core
+OUTLIER_IQR = float(os.environ.get("QUALITY_OUTLIER_IQR", "6"))
+
+STEP_NS = 15 * 60 * 10**9
+DAY_NS = 24 * 3600 * 10**9
+
+CHECKS = ["missing", "duplicates", "off_grid", "unsorted", "wrong_partition", "nan", "outliers"]
+
+_SCHEMA = pa.schema([("time_utc", pa.timestamp("ns", tz="UTC")), ("value", pa.float64())])
+
+LABEL_BY_FILTER_ID = {fid: label for filters in FILTER_GROUPS.values() for fid, label in filters.items()}
+GROUP_BY_FILTER_ID = {fid: group for group, filters in FILTER_GROUPS.items() for fid in filters}
+
+
+def _dst_days(years) -> np.ndarray:
+    """EU clock changes: last Sunday of March and of October (days since epoch)."""
+    days = []
+    for year in years:
+        for month in (3, 10):
+            last = pd.Timestamp(year=year, month=month, day=31)
+            days.append((last - pd.Timedelta(days=(last.dayofweek + 1) % 7)).value // DAY_NS)
+    return np.array(days, dtype=np.int64)
+
+
+def _read_filter(data_root: Path, region: str, filter_id: str):
+    """
+    (time_utc as int64 ns, value, date= day of the row's file as days since epoch)
+    for every row of one filter, or None without partitions. Files are read one by
+    one with only the two columns: for thousands of ~100-row files this beats a
+    dataset scan, and the file -> date= mapping comes for free.
+    """
+    prefix = Path(data_root) / f"region={region}" / f"filter={filter_id}"
+    files = sorted(prefix.glob("date=*/data.parquet"))
+    if not files:
+        return None
+    tables = []
+    for path in files:
+        table = pq.ParquetFile(path).read(columns=["time_utc", "value"], use_threads=False)
+        if not table.schema.equals(_SCHEMA):
+            table = table.select(["time_utc", "value"]).cast(_SCHEMA)
+        tables.append(table)
+    table = pa.concat_tables(tables)
+    days = np.array([p.parent.name.split("date=", 1)[1] for p in files], dtype="datetime64[D]").astype(np.int64)
+    part_day = np.repeat(days, [t.num_rows for t in tables])
+    t = table.column("time_utc").cast(pa.int64()).to_numpy(zero_copy_only=False)
+    v = table.column("value").to_numpy(zero_copy_only=False)
+    return t, v, part_day
+
+
+def scan_filter(filter_id: str, region: str = "DE", data_root: Path = PROJECT_ROOT / "data") -> pd.DataFrame:
+    """Per-day check counts of one filter (empty frame when it has no partitions)."""
+    read = _read_filter(data_root, region, filter_id)
+    if read is None:
+        return pd.DataFrame()
+
+    t, v, part_day = read
+    partition_days = np.unique(part_day)
+
+    row_day = t // DAY_NS
+    first_day, last_day = int(min(row_day.min(), partition_days.min())), int(max(row_day.max(), partition_days.max()))
+    n_days = last_day - first_day + 1
+
+    def per_day(mask, days=row_day) -> np.ndarray:
+        return np.bincount(days[mask] - first_day, minlength=n_days)
+
+    on_grid = t % STEP_NS == 0
+    same_file = np.r_[False, part_day[1:] == part_day[:-1]]
+    unsorted = same_file & (np.r_[np.iinfo(np.int64).max, t[1:] - t[:-1]] <= 0)
+
+    order = np.argsort(t, kind="stable")
+    ts = t[order]
+    dup_sorted = np.r_[False, ts[1:] == ts[:-1]]
+    duplicates = np.zeros(len(t), dtype=bool)
+    duplicates[order] = dup_sorted
+
+    # expected slots: the 15-min grid between the first and last on-grid timestamp
+    present = np.unique(t[on_grid])
+    if len(present):
+        n_slots = (present[-1] - present[0]) // STEP_NS + 1
+        grid_days = (present[0] + np.arange(n_slots, dtype=np.int64) * STEP_NS) // DAY_NS
+        expected = np.bincount(grid_days - first_day, minlength=n_days)
+        have = np.bincount(present // DAY_NS - first_day, minlength=n_days)
+        missing = expected - have
+    else:
+        expected = np.zeros(n_days, dtype=np.int64)
+        missing = expected
+
+    nan = np.isnan(v)
+    finite = v[~nan]
+    if len(finite):
+        # IQR fences: robust to the many zeros of PV / storage series
+        q1, q3 = np.percentile(finite, [25, 75])
+        iqr = q3 - q1
+        outliers = ~nan & ((v < q1 - OUTLIER_IQR * iqr) | (v > q3 + OUTLIER_IQR * iqr))
+    else:
+        outliers = np.zeros(len(v), dtype=bool)
+
+    out = pd.DataFrame(
+        {
+            "filter_id": str(filter_id),
+            "date": (np.arange(first_day, last_day + 1).astype("datetime64[D]")).astype(str),
+            "partition": np.isin(np.arange(first_day, last_day + 1), partition_days),
+            "rows": np.bincount(part_day - first_day, minlength=n_days).astype(np.int32),
+            "expected": expected.astype(np.int32),
+            "missing": missing.astype(np.int32),
+            "duplicates": per_day(duplicates).astype(np.int32),
+            "off_grid": per_day(~on_grid).astype(np.int32),
+            "unsorted": per_day(unsorted, part_day).astype(np.int32),
+            "wrong_partition": per_day(row_day != part_day, part_day).astype(np.int32),
+            "nan": per_day(nan).astype(np.int32),
+            "outliers": per_day(outliers).astype(np.int32),
+        }
+    )
+    years = range(pd.Timestamp(first_day * DAY_NS).year, pd.Timestamp(last_day * DAY_NS).year + 1)
+    out["dst_day"] = np.isin(np.arange(first_day, last_day + 1), _dst_days(years))
+    return out
+
+
+def summarize(days: pd.DataFrame) -> pd.DataFrame:
+    """Per-filter totals of a per-day report."""
+    if days.empty:
+        return pd.DataFrame(columns=["filter_id", "group", "label", "first_day", "last_day", "partitions", "rows", *CHECKS])
+    issues = days[CHECKS].sum(axis=1) > 0
+    grouped = days.assign(
+        has_issue=issues,
+        dst_issue=issues & days["dst_day"],
+        empty_partition=days["partition"] & (days["rows"] == 0),
+        days_without_partition=~days["partition"],
+    ).groupby("filter_id")
+    out = grouped.agg(
+        first_day=("date", "min"),
+        last_day=("date", "max"),
+        partitions=("partition", "sum"),
+        empty_partitions=("empty_partition", "sum"),
+        days_without_partition=("days_without_partition", "sum"),
+        rows=("rows", "sum"),
+        **{check: (check, "sum") for check in CHECKS},
+        days_with_issues=("has_issue", "sum"),
+        dst_days_with_issues=("dst_issue", "sum"),
+    ).reset_index()
+    out.insert(1, "group", out["filter_id"].map(GROUP_BY_FILTER_ID))
+    out.insert(2, "label", out["filter_id"].map(LABEL_BY_FILTER_ID))
+    return out
+
+
+def scan_lake(
+    region: str = "DE",
+    data_root: Path = PROJECT_ROOT / "data",
+    filter_ids=None,
+    max_workers: int = SCAN_WORKERS,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Scan `filter_ids` (default: every filter= directory of the region) in
+    parallel. Returns (per-filter summary, per-day report).
+    """
+    if filter_ids is None:
+        region_dir = Path(data_root) / f"region={region}"
+        filter_ids = sorted(
+            p.name.split("filter=", 1)[1] for p in region_dir.glob("filter=*") if p.is_dir()
+        ) if region_dir.exists() else []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(lambda fid: scan_filter(str(fid), region=region, data_root=data_root), filter_ids))
+    frames = [f for f in frames if not f.empty]
+    days = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return summarize(days), days
+
+
+def write_quality_report(
+    summary: pd.DataFrame, days: pd.DataFrame, region: str = "DE", quality_root: Path = QUALITY_ROOT
+) -> Path:
+    """filters.parquet (one row per filter) + days.parquet (only days with a finding)."""
+    out_dir = Path(quality_root) / f"region={region}"
+    write_atomic(out_dir / "filters.parquet", to_parquet_bytes(summary))
+    if not days.empty:
+        days = days[(days[CHECKS].sum(axis=1) > 0) | (days["partition"] & (days["rows"] == 0))].reset_index(drop=True)
+    write_atomic(out_dir / "days.parquet", to_parquet_bytes(days))
+    return out_dir
+
+
+if __name__ == "__main__":
+    region = os.environ.get("REGION", "DE")
+    t0 = time.perf_counter()
+    summary, days = scan_lake(region=region)
+    out_dir = write_quality_report(summary, days, region=region)
+    print(summary[["filter_id", "label", "partitions", "rows", *CHECKS]].to_string(index=False))
+    print(f"scanned {int(summary['partitions'].sum())} partitions in {time.perf_counter() - t0:.1f}s -> {out_dir}")
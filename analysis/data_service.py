@@ -0,0 +1,441 @@
+# analysis/data_service.py
+# %%
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from power.fetch_power.io_s3 import list_paths
+from power.fetch_power.parquet_convert import drop_by_timecol
+from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.state import ensure_utc, load_data_versions
+
+"""
+Shared data service for multi-user dashboard deployments.
+
+One process (python analysis/data_service.py) loads every filter of
+SERVED_GROUPS from the lake once and publishes each series as an Arrow IPC
+stream (time_utc, value) in its own shared-memory segment. A local socket
+(multiprocessing.connection on 127.0.0.1:DATA_SERVICE_PORT) answers which
+segment holds a series and which row range covers a [start, end] query.
+
+Dashboard workers attach to the segment and read the rows as an Arrow slice
+of the shared buffer, so the data exists once in RAM however many Streamlit
+processes are running. read_data.load_filter_history() goes through the
+service when DATA_SERVICE_PORT is set and falls back to parquet when the
+service is down or does not hold the series; group_time_bounds() asks it for
+the first / last timestamp of a group, so windowed loads never touch disk.
+Page loaders of served series skip st.cache_data while the service is up
+(versioned_cache.cache_on_versions(served=True)): they request the window
+they show instead of keeping a full-history copy per worker.
+
+Every REFRESH_SECONDS the service reloads the series whose partitions
+changed on disk (from the first changed day) into a new segment; the old one
+is unlinked, clients that still map it keep a valid view until they close it.
+A lookup for a filter whose data version (state/data_versions.json) moved
+past the loaded one refreshes that filter first.
+"""
+
+DATA_SERVICE_HOST = "127.0.0.1"
+DATA_SERVICE_PORT = int(os.environ.get("DATA_SERVICE_PORT", "0"))  # 0 = disabled
+DATA_SERVICE_AUTHKEY = os.environ.get("DATA_SERVICE_AUTHKEY", "smard-data-service").encode()
+REFRESH_SECONDS = int(os.environ.get("DATA_SERVICE_REFRESH_SECONDS", "60"))
+LOAD_WORKERS = 4
+
+SERVED_GROUPS = ("market_price", "generation", "forecast", "consumption")
+
+# set in the service process so its own reads go to disk
+_IN_SERVICE = False
+_ATTACHED: list[shared_memory.SharedMemory] = []
+
+
+def _open_segment(name: str, size: int) -> pa.Table:
+    """Arrow table over an existing segment, without copying it."""
+    path = Path("/dev/shm") / name.lstrip("/")
+    if path.exists():
+        # POSIX: Arrow maps the segment itself and unmaps it with the last table referencing it
+        return pa.ipc.open_stream(pa.memory_map(str(path)).read_buffer(size)).read_all()
+
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+
+            # otherwise the tracker unlinks the service's segment when this worker exits
+            resource_tracker.unregister(shm._name, "shared_memory")
+    _ATTACHED.append(shm)  # kept open for the life of the process
+    return pa.ipc.open_stream(pa.py_buffer(shm.buf[:size])).read_all()
+
+
+def _partition_signature(prefix: Path) -> dict[str, float]:
+    """{YYYY-MM-DD: mtime} of every daily partition under one filter prefix."""
+    out = {}
+    for p in list_paths(prefix):
+        parent = Path(p).parent.name
+        if parent.startswith("date="):
+            out[parent.split("date=", 1)[1]] = os.path.getmtime(p)
+    return out
+
+
+class _Segment:
+    """One published series: shared-memory Arrow stream + its sorted timestamps."""
+
+    def __init__(self, df: pd.DataFrame, version: int, signature: dict[str, float]):
+        df = df[["time_utc", "value"]].reset_index(drop=True)
+        table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        buf = sink.getvalue()
+
+        self.size = buf.size
+        self.shm = shared_memory.SharedMemory(create=True, size=max(buf.size, 1))
+        np.frombuffer(self.shm.buf, dtype=np.uint8, count=buf.size)[:] = np.frombuffer(buf, dtype=np.uint8)
+        self.times = pd.DatetimeIndex(pd.to_datetime(df["time_utc"], utc=True))
+        self.version = version
+        self.signature = signature
+
+    def rows(self, start=None, end=None) -> tuple[int, int]:
+        lo = 0 if start is None else int(self.times.searchsorted(ensure_utc(start), side="left"))
+        hi = len(self.times) if end is None else int(self.times.searchsorted(ensure_utc(end), side="right"))
+        return lo, max(hi, lo)
+
+    def head(self, end: pd.Timestamp) -> pd.DataFrame:
+        """Copy of the rows before `end`, read back from the shared buffer."""
+        lo, hi = 0, int(self.times.searchsorted(end, side="left"))
+        table = pa.ipc.open_stream(pa.py_buffer(self.shm.buf[: self.size])).read_all()
+        out = table.slice(lo, hi - lo).to_pandas().copy()
+        del table
+        return out
+
+    def release(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class DataService:
+    """Holds the hot lake series in shared memory and answers lookups over a local socket."""
+
+    def __init__(self, root: Path = PROJECT_ROOT, region: str = "DE", groups=SERVED_GROUPS):
+        self.root = Path(root)
+        self.region = region
+        self.filter_ids = [fid for g in groups for fid in FILTER_GROUPS.get(g, {})]
+        self.versions_path = self.root / "state" / "data_versions.json"
+        self._segments: dict[str, _Segment] = {}
+        self._loaded_versions: dict[str, int] = {}  # data version each segment is known to cover
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def _prefix(self, filter_id: str) -> Path:
+        return self.root / "data" / f"region={self.region}" / f"filter={filter_id}"
+
+    def _load(self, filter_id: str, start=None) -> pd.DataFrame:
+        """
+        All partitions of one filter from `start`'s day on, read as one Arrow
+        dataset (much faster than a read_parquet per day for years of files).
+        """
+        files = sorted(
+            p
+            for p in list_paths(self._prefix(filter_id))
+            if p.endswith(".parquet") and Path(p).parent.name.startswith("date=")
+        )
+        if start is not None:
+            day = ensure_utc(start).strftime("%Y-%m-%d")
+            files = [p for p in files if Path(p).parent.name.split("date=", 1)[1] >= day]
+        if not files:
+            return pd.DataFrame()
+        try:
+            table = ds.dataset(files, format="parquet").to_table(columns=["time_utc", "value"])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # partitions written with diverging schemas: per-file reader
+            from analysis.read_data import load_filter_history
+
+            return load_filter_history(filter_id, region=self.region, root=self.root, start=start)
+        df = drop_by_timecol(table.to_pandas())
+        if start is not None:
+            df = df[df["time_utc"] >= ensure_utc(start)].reset_index(drop=True)
+        return df
+
+    def _reload(self, filter_id: str, signature: dict[str, float]) -> pd.DataFrame | None:
+        current = self._segments.get(filter_id)
+        if current is None:
+            return self._load(filter_id)
+        dirty = [d for d, m in signature.items() if current.signature.get(d) != m]
+        start = pd.Timestamp(min(dirty) if dirty else min(signature), tz="UTC")
+        fresh = self._load(filter_id, start=start)
+        kept = current.head(start)
+        return pd.concat([kept, fresh], ignore_index=True) if not fresh.empty else kept
+
+    def refresh(self, filter_ids: list[str] | None = None, max_workers: int = LOAD_WORKERS) -> list[str]:
+        """(Re)load every series (of `filter_ids`) whose partitions changed since it was published."""
+        with self._refresh_lock:
+            # versions are read before the partitions: the data is at least that new
+            versions = load_data_versions(self.versions_path)
+            changed = self._refresh(filter_ids or self.filter_ids, max_workers)
+            for filter_id in filter_ids or self.filter_ids:
+                self._loaded_versions[filter_id] = versions.get(filter_id, 0)
+            return changed
+
+    def _refresh(self, filter_ids: list[str], max_workers: int) -> list[str]:
+        todo = {}
+        for filter_id in filter_ids:
+            signature = _partition_signature(self._prefix(filter_id))
+            current = self._segments.get(filter_id)
+            if signature and (current is None or current.signature != signature):
+                todo[filter_id] = signature
+        if not todo:
+            return []
+
+        # Arrow reads release the GIL: load the series side by side
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            frames = dict(zip(todo, pool.map(lambda fid: self._reload(fid, todo[fid]), todo)))
+
+        changed = []
+        for filter_id, df in frames.items():
+            if df is None or df.empty or "value" not in df.columns:
+                continue
+            current = self._segments.get(filter_id)
+            segment = _Segment(df, (current.version + 1) if current is not None else 1, todo[filter_id])
+            with self._lock:
+                self._segments[filter_id] = segment
+            if current is not None:
+                current.release()
+            changed.append(filter_id)
+        return changed
+
+    def _refresh_bumped(self, filter_ids: list[str]) -> None:
+        """
+        Refresh the filters whose version an ingest bumped since the last
+        refresh: the dashboard caches on that version, so it must not get the
+        old rows under it.
+        """
+        versions = load_data_versions(self.versions_path)
+        bumped = [fid for fid in filter_ids if versions.get(fid, 0) > self._loaded_versions.get(fid, 0)]
+        if bumped:
+            self.refresh(bumped)
+
+    def handle(self, request: dict):
+        op = request.get("op")
+        if op == "ping":
+            return True
+        if op == "series":
+            filter_id = str(request["filter_id"])
+            self._refresh_bumped([filter_id])
+            with self._lock:
+                segment = self._segments.get(filter_id)
+            if segment is None or request.get("region", self.region) != self.region:
+                return None
+            lo, hi = segment.rows(request.get("start"), request.get("end"))
+            return {
+                "shm": segment.shm.name,
+                "size": segment.size,
+                "version": segment.version,
+                "lo": lo,
+                "hi": hi,
+            }
+        if op == "bounds":
+            filter_ids = [str(fid) for fid in request["filter_ids"]]
+            self._refresh_bumped(filter_ids)
+            with self._lock:
+                times = [self._segments[fid].times for fid in filter_ids if fid in self._segments]
+            times = [t for t in times if len(t)]
+            if not times or request.get("region", self.region) != self.region:
+                return None
+            return min(t[0] for t in times), max(t[-1] for t in times)
+        if op == "list":
+            with self._lock:
+                return {
+                    fid: {
+                        "rows": len(s.times),
+                        "first": s.times[0] if len(s.times) else None,
+                        "last": s.times[-1] if len(s.times) else None,
+                        "version": s.version,
+                        "bytes": s.size,
+                    }
+                    for fid, s in self._segments.items()
+                }
+        if op == "refresh":
+            return self.refresh()
+        raise ValueError(f"Unknown data service op: {op!r}")
+
+    def _serve_connection(self, conn) -> None:
+        with conn:
+            while not self._closed.is_set():
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", self.handle(request)))
+                except Exception as exc:
+                    conn.send(("error", repr(exc)))
+
+    def _refresh_loop(self, every: int) -> None:
+        while not self._closed.wait(every):
+            try:
+                changed = self.refresh()
+                if changed:
+                    print(f"Data service refreshed {changed}")
+            except Exception as exc:
+                print(f"Data service refresh failed: {exc!r}")
+
+    def serve_forever(self, host: str = DATA_SERVICE_HOST, port: int = DATA_SERVICE_PORT, refresh_seconds: int = REFRESH_SECONDS) -> None:
+        global _IN_SERVICE
+        _IN_SERVICE = True
+
+        try:
+            t0 = time.perf_counter()
+            self.refresh()
+            total = sum(s.size for s in self._segments.values())
+            print(f"Data service: {len(self._segments)} series, {total / 2**20:.1f} MiB in {time.perf_counter() - t0:.1f}s")
+
+            threading.Thread(target=self._refresh_loop, args=(refresh_seconds,), daemon=True).start()
+            with Listener((host, port), authkey=DATA_SERVICE_AUTHKEY) as listener:
+                print(f"Data service listening on {host}:{listener.address[1]}")
+                while not self._closed.is_set():
+                    conn = listener.accept()
+                    threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            segments, self._segments = list(self._segments.values()), {}
+        for segment in segments:
+            segment.release()
+
+
+class DataServiceClient:
+    """Per-process connection to the data service; keeps attached segments mapped."""
+
+    def __init__(self, host: str = DATA_SERVICE_HOST, port: int = DATA_SERVICE_PORT):
+        self.address = (host, port)
+        self._conn = None
+        self._tables: dict[str, tuple[str, pa.Table]] = {}  # filter id -> (segment name, table)
+        self._lock = threading.Lock()
+
+    def _call(self, request: dict):
+        if self._conn is None:
+            self._conn = Client(self.address, authkey=DATA_SERVICE_AUTHKEY)
+        try:
+            self._conn.send(request)
+            status, payload = self._conn.recv()
+        except (EOFError, OSError):
+            self._conn = None
+            raise
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def _table(self, filter_id: str, meta: dict) -> pa.Table:
+        name, table = self._tables.get(filter_id, (None, None))
+        if name != meta["shm"]:
+            # new segment: the replaced one is unmapped once no frame uses it
+            table = _open_segment(meta["shm"], meta["size"])
+            self._tables[filter_id] = (meta["shm"], table)
+        return table
+
+    def series(self, filter_id: str, region: str = "DE", start=None, end=None) -> pd.DataFrame | None:
+        """time_utc / value rows of one filter in [start, end], or None if the service does not hold it."""
+        request = {"op": "series", "filter_id": str(filter_id), "region": region, "start": start, "end": end}
+        with self._lock:
+            meta = self._call(request)
+            if meta is None:
+                return None
+            try:
+                table = self._table(str(filter_id), meta)
+            except FileNotFoundError:
+                # segment replaced between the lookup and the attach
+                meta = self._call(request)
+                table = self._table(str(filter_id), meta)
+        return table.slice(meta["lo"], meta["hi"] - meta["lo"]).to_pandas(split_blocks=True)
+
+    def bounds(self, filter_ids: list[str], region: str = "DE") -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """(first, last) timestamp over the served series of `filter_ids`, or None if it holds none."""
+        with self._lock:
+            return self._call({"op": "bounds", "filter_ids": [str(f) for f in filter_ids], "region": region})
+
+    def ping(self) -> bool:
+        with self._lock:
+            return self._call({"op": "ping"})
+
+    def list_series(self) -> dict:
+        with self._lock:
+            return self._call({"op": "list"})
+
+
+_CLIENT: DataServiceClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def service_client() -> DataServiceClient | None:
+    """Process-wide client, or None when the service is disabled (DATA_SERVICE_PORT unset)."""
+    global _CLIENT
+    if not DATA_SERVICE_PORT or _IN_SERVICE:
+        return None
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = DataServiceClient()
+        return _CLIENT
+
+
+def fetch_from_service(filter_id: str, region: str = "DE", start=None, end=None) -> pd.DataFrame | None:
+    """Rows from the data service, or None (service disabled / unreachable / series not held)."""
+    client = service_client()
+    if client is None:
+        return None
+    try:
+        return client.series(filter_id, region=region, start=start, end=end)
+    except (OSError, EOFError, RuntimeError):
+        return None
+
+
+def fetch_bounds_from_service(filter_ids: list[str], region: str = "DE") -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """(first, last) timestamp of the served `filter_ids`, or None (disabled / unreachable / not held)."""
+    client = service_client()
+    if client is None:
+        return None
+    try:
+        return client.bounds(filter_ids, region=region)
+    except (OSError, EOFError, RuntimeError):
+        return None
+
+
+def service_available() -> bool:
+    """True when DATA_SERVICE_PORT is set and the service answers."""
+    client = service_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.ping())
+    except (OSError, EOFError, RuntimeError):
+        return False
+
+
+if __name__ == "__main__":
+    import signal
+
+    # SIGTERM -> SystemExit so the segments are unlinked on the way out
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    DataService().serve_forever()
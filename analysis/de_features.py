@@ -10,14 +10,232 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.market_price import load_prices_with_returns
-from analysis.group_series import load_group_long
+from analysis.read_data import load_filter_history
 from analysis.group_series import load_group_long
+from analysis.instrumentation import instrumented
+
+
+# bump whenever a feature definition below changes: the persisted feature
+# store (analysis/feature_store.py) is rebuilt when its version differs
+FEATURE_SET_VERSION = 1
+
+TARGET_COLUMNS = ["price_de", "ret_de"]
+
+# derived fundamentals offered as X / exogenous variables by the pages
+FUNDAMENTAL_COLUMNS = [
+    "residual_load",
+    "load_total",
+    "gen_total",
+    "wind_gen",
+    "solar_gen",
+    "wind_share",
+    "solar_share",
+    "res_share",
+    "wind_fc",
+    "solar_fc",
+    "res_fc",
+    "error_wind",
+    "error_solar",
+    "error_res",
+]
+
+
+class FeatureSpec:
+    """
+    One derived feature: `inputs` are the SMARD sources ("generation",
+    "consumption", "forecast") and / or other features it reads, `fn(ctx)`
+    returns the Series (aligned on the DE price index).
+    `fallback_inputs` are only resolved if fn needs them (see residual_load).
+    """
+
+    def __init__(self, inputs: list[str], fn, fallback_inputs: list[str] | None = None):
+        self.inputs = inputs
+        self.fn = fn
+        self.fallback_inputs = fallback_inputs or []
+
+
+SOURCES = ("generation", "consumption", "forecast")
+
+DE_PRICE_FILTER_ID = "4169"
+
+
+def _cols_matching(cols: list[str], *needles: str) -> list[str]:
+    return [c for c in cols if any(n in c.lower() for n in needles)]
+
+
+def _sum_or_nan(ctx, source: str, cols: list[str]) -> pd.Series:
+    if not cols:
+        return pd.Series(np.nan, index=ctx.index)
+    return ctx.source(source)[cols].sum(axis=1)
+
+
+def _load_total(ctx) -> pd.Series:
+    col = None
+    for c in ctx.source("consumption").columns:
+        lc = c.lower()
+        if "total" in lc or "grid load" in lc:
+            col = c
+    return ctx.source("consumption")[col] if col is not None else pd.Series(np.nan, index=ctx.index)
+
+
+def _residual_load(ctx) -> pd.Series:
+    cons = ctx.source("consumption")
+    residual_cols = _cols_matching(list(cons.columns), "residual")
+    if residual_cols:
+        return cons[residual_cols[-1]]
+    # fallback residual load ≈ total load − wind − solar
+    return ctx["load_total"] - ctx["wind_gen"].fillna(0.0) - ctx["solar_gen"].fillna(0.0)
+
+
+def _res_fc(ctx) -> pd.Series:
+    if ctx.source("forecast").empty:
+        return pd.Series(np.nan, index=ctx.index)
+    return ctx["wind_fc"].fillna(0.0) + ctx["solar_fc"].fillna(0.0)
+
+
+def _ratio(num: pd.Series, den: pd.Series) -> pd.Series:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return num / den
+
+
+# insertion order = column order of the full feature frame
+FEATURES: dict[str, FeatureSpec] = {
+    # generation aggregates
+    "gen_total": FeatureSpec(
+        ["generation"],
+        lambda ctx: _sum_or_nan(ctx, "generation", list(ctx.source("generation").columns)),
+    ),
+    "wind_gen": FeatureSpec(
+        ["generation"],
+        lambda ctx: _sum_or_nan(ctx, "generation", _cols_matching(list(ctx.source("generation").columns), "wind")),
+    ),
+    "solar_gen": FeatureSpec(
+        ["generation"],
+        lambda ctx: _sum_or_nan(
+            ctx, "generation", _cols_matching(list(ctx.source("generation").columns), "photovoltaic", "solar")
+        ),
+    ),
+    # consumption aggregates
+    "load_total": FeatureSpec(["consumption"], _load_total),
+    "residual_load": FeatureSpec(
+        ["consumption"], _residual_load, fallback_inputs=["load_total", "wind_gen", "solar_gen"]
+    ),
+    # forecast aggregates
+    "wind_fc": FeatureSpec(
+        ["forecast"],
+        lambda ctx: _sum_or_nan(ctx, "forecast", _cols_matching(list(ctx.source("forecast").columns), "wind")),
+    ),
+    "solar_fc": FeatureSpec(
+        ["forecast"],
+        lambda ctx: _sum_or_nan(
+            ctx, "forecast", _cols_matching(list(ctx.source("forecast").columns), "photovoltaic", "solar")
+        ),
+    ),
+    "res_fc": FeatureSpec(["forecast", "wind_fc", "solar_fc"], _res_fc),
+    # shares (generation mix)
+    "wind_share": FeatureSpec(["wind_gen", "gen_total"], lambda ctx: _ratio(ctx["wind_gen"], ctx["gen_total"])),
+    "solar_share": FeatureSpec(["solar_gen", "gen_total"], lambda ctx: _ratio(ctx["solar_gen"], ctx["gen_total"])),
+    "res_share": FeatureSpec(
+        ["wind_gen", "solar_gen", "gen_total"],
+        lambda ctx: _ratio(ctx["wind_gen"] + ctx["solar_gen"], ctx["gen_total"]),
+    ),
+    # forecast errors (actual − forecast)
+    "error_wind": FeatureSpec(["wind_gen", "wind_fc"], lambda ctx: ctx["wind_gen"] - ctx["wind_fc"]),
+    "error_solar": FeatureSpec(["solar_gen", "solar_fc"], lambda ctx: ctx["solar_gen"] - ctx["solar_fc"]),
+    "error_res": FeatureSpec(
+        ["wind_gen", "solar_gen", "res_fc"],
+        lambda ctx: (ctx["wind_gen"] + ctx["solar_gen"]) - ctx["res_fc"],
+    ),
+    # time features
+    "hour": FeatureSpec([], lambda ctx: pd.Series(ctx.index.hour, index=ctx.index)),
+    "dow": FeatureSpec([], lambda ctx: pd.Series(ctx.index.dayofweek, index=ctx.index)),  # 0=Mon
+}
+
+
+def required_inputs(names: list[str]) -> tuple[list[str], list[str]]:
+    """
+    Dependency subgraph of `names` (declared inputs only, not fallbacks):
+    returns (features in evaluation order, SMARD sources to load).
+    """
+    order, sources, seen = [], [], set()
+
+    def _visit(name: str):
+        if name in seen or name in TARGET_COLUMNS:
+            return
+        seen.add(name)
+        if name in SOURCES:
+            sources.append(name)
+            return
+        if name not in FEATURES:
+            raise KeyError(f"Unknown feature {name!r}")
+        for dep in FEATURES[name].inputs:
+            _visit(dep)
+        order.append(name)
+
+    for n in names:
+        _visit(n)
+    return order, sources
+
+
+class _FeatureContext:
+    """Memoizes features and lazily loads / pivots SMARD sources on first use."""
+
+    def __init__(self, index: pd.DatetimeIndex, start=None, end=None, root: Path = PROJECT_ROOT):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.root = root
+        self._sources: dict[str, pd.DataFrame] = {}
+        self._values: dict[str, pd.Series] = {}
+
+    def source(self, group_name: str) -> pd.DataFrame:
+        if group_name not in self._sources:
+            df = load_group_long(group_name, root=self.root, start=self.start, end=self.end)
+            if df is None or df.empty:
+                pivot = pd.DataFrame(index=self.index)
+            else:
+                df = df.copy()
+                df["time"] = pd.to_datetime(df["time"], utc=True)
+                pivot = (
+                    df
+                    .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
+                    .sort_index()
+                    .reindex(self.index)  # left join on the price index
+                )
+            self._sources[group_name] = pivot
+        return self._sources[group_name]
 
+    def __getitem__(self, name: str) -> pd.Series:
+        if name not in self._values:
+            self._values[name] = FEATURES[name].fn(self)
+        return self._values[name]
 
-def build_de_features() -> pd.DataFrame:
+
+def _load_de_prices(start=None, end=None, root: Path = PROJECT_ROOT) -> pd.DataFrame:
+    """price_de / ret_de indexed by time (reads only the DE price filter)."""
+    df = load_filter_history(DE_PRICE_FILTER_ID, region="DE", root=root, start=start, end=end)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=TARGET_COLUMNS)
+    out = pd.DataFrame(
+        {"price_de": df["value"].to_numpy()},
+        index=pd.DatetimeIndex(pd.to_datetime(df["time_utc"], utc=True), name="time"),
+    ).sort_index()
+    out["ret_de"] = out["price_de"].pct_change()
+    return out
+
+
+@instrumented()
+def build_de_features(
+    features: list[str] | None = None, start=None, end=None, root: Path = PROJECT_ROOT
+) -> pd.DataFrame:
     """Build DE-only feature set for price modelling & correlation.
 
+    `features=None` builds everything (raw SMARD columns included). Otherwise
+    only the requested columns are returned, loading only the SMARD groups and
+    computing only the features they depend on (see FEATURES).
+    `start` / `end` (optional) restrict the partitions that are loaded;
+    `root` is the project root whose data/ lake is read.
+
     Returns DataFrame indexed by time with columns, e.g.:
         price_de, ret_de,
         gen_total, wind_gen, solar_gen,
@@ -27,195 +245,82 @@ def build_de_features() -> pd.DataFrame:
         error_wind, error_solar, error_res,
         hour, dow
     """
-    # -------------------
-    # Prices (DE only)
-    # -------------------
-    prices_all = load_prices_with_returns()
-    prices_de = prices_all[prices_all["zone"] == "DE"].copy()
+    prices_de = _load_de_prices(start=start, end=end, root=root)
     if prices_de.empty:
         return pd.DataFrame()
 
-    prices_de = (
-        prices_de
-        .set_index("time")
-        .sort_index()
-        .rename(columns={"price": "price_de", "return": "ret_de"})
-    )
-    prices_de = prices_de[["price_de", "ret_de"]]
+    ctx = _FeatureContext(prices_de.index, start=start, end=end, root=root)
 
-    # -------------------
-    # Helper to load & pivot SMARD groups
-    # -------------------
-    def _load_pivot(group_name: str) -> pd.DataFrame:
-        df = load_group_long(group_name)
-        if df is None or df.empty:
-            return pd.DataFrame()
-        df = df.copy()
-        df["time"] = pd.to_datetime(df["time"], utc=True)
-        pivot = (
-            df
-            .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
-            .sort_index()
-        )
-        return pivot
-
-    gen_pivot = _load_pivot("generation")
-    cons_pivot = _load_pivot("consumption")
-    fc_pivot = _load_pivot("forecast")
+    if features is None:
+        order, sources = list(FEATURES), list(SOURCES)
+        wanted = list(TARGET_COLUMNS)
+    else:
+        order, sources = required_inputs(features)
+        wanted = list(features)
 
     # -------------------
     # Join everything on price index
     # -------------------
     feat = prices_de.copy()
-    for extra in (gen_pivot, cons_pivot, fc_pivot):
-        if extra is not None and not extra.empty:
-            feat = feat.join(extra, how="left")
+    if features is None:
+        for group_name in sources:
+            extra = ctx.source(group_name)
+            if not extra.empty:
+                feat = feat.join(extra, how="left")
 
-    # -------------------
-    # Generation aggregates
-    # -------------------
-    gen_cols = []
-    if gen_pivot is not None and not gen_pivot.empty:
-        gen_cols = list(gen_pivot.columns)
-
-    if gen_cols:
-        gen_block = feat[gen_cols]
-        feat["gen_total"] = gen_block.sum(axis=1)
-
-        wind_cols = [c for c in gen_cols if "wind" in c.lower()]
-        solar_cols = [
-            c
-            for c in gen_cols
-            if "photovoltaic" in c.lower() or "solar" in c.lower()
-        ]
-
-        if wind_cols:
-            feat["wind_gen"] = feat[wind_cols].sum(axis=1)
-        else:
-            feat["wind_gen"] = np.nan
-
-        if solar_cols:
-            feat["solar_gen"] = feat[solar_cols].sum(axis=1)
-        else:
-            feat["solar_gen"] = np.nan
-    else:
-        feat["gen_total"] = np.nan
-        feat["wind_gen"] = np.nan
-        feat["solar_gen"] = np.nan
+    computed = {name: ctx[name] for name in order}
+    feat = pd.concat([feat, pd.DataFrame(computed, index=feat.index)], axis=1)
 
-    # -------------------
-    # Consumption aggregates
-    # -------------------
-    cons_cols = []
-    if cons_pivot is not None and not cons_pivot.empty:
-        cons_cols = list(cons_pivot.columns)
-
-    if cons_cols:
-        load_total_col = None
-        residual_load_col = None
-        for c in cons_cols:
-            lc = c.lower()
-            if "total" in lc or "grid load" in lc:
-                load_total_col = c
-            if "residual" in lc:
-                residual_load_col = c
-
-        if load_total_col is not None:
-            feat["load_total"] = feat[load_total_col]
-        else:
-            feat["load_total"] = np.nan
-
-        if residual_load_col is not None:
-            feat["residual_load"] = feat[residual_load_col]
-        else:
-            # fallback residual load ≈ total load − wind − solar
-            if (
-                "load_total" in feat.columns
-                and "wind_gen" in feat.columns
-                and "solar_gen" in feat.columns
-            ):
-                feat["residual_load"] = (
-                    feat["load_total"]
-                    - feat["wind_gen"].fillna(0.0)
-                    - feat["solar_gen"].fillna(0.0)
-                )
-            else:
-                feat["residual_load"] = np.nan
-    else:
-        feat["load_total"] = np.nan
-        if "wind_gen" in feat.columns and "solar_gen" in feat.columns:
-            feat["residual_load"] = (
-                feat["load_total"]
-                - feat["wind_gen"].fillna(0.0)
-                - feat["solar_gen"].fillna(0.0)
-            )
-        else:
-            feat["residual_load"] = np.nan
+    if features is not None:
+        feat = feat[[c for c in wanted if c in feat.columns]]
 
-    # -------------------
-    # Forecast aggregates
-    # -------------------
-    fc_cols = []
-    if fc_pivot is not None and not fc_pivot.empty:
-        fc_cols = list(fc_pivot.columns)
-
-    if fc_cols:
-        wind_fc_cols = [c for c in fc_cols if "wind" in c.lower()]
-        solar_fc_cols = [
-            c
-            for c in fc_cols
-            if "photovoltaic" in c.lower() or "solar" in c.lower()
-        ]
-
-        if wind_fc_cols:
-            feat["wind_fc"] = feat[wind_fc_cols].sum(axis=1)
-        else:
-            feat["wind_fc"] = np.nan
-
-        if solar_fc_cols:
-            feat["solar_fc"] = feat[solar_fc_cols].sum(axis=1)
-        else:
-            feat["solar_fc"] = np.nan
-
-        feat["res_fc"] = feat["wind_fc"].fillna(0.0) + feat["solar_fc"].fillna(0.0)
-    else:
-        feat["wind_fc"] = np.nan
-        feat["solar_fc"] = np.nan
-        feat["res_fc"] = np.nan
+    return feat.sort_index()
 
-    # -------------------
-    # Shares (generation mix)
-    # -------------------
-    with np.errstate(divide="ignore", invalid="ignore"):
-        feat["wind_share"] = feat["wind_gen"] / feat["gen_total"]
-        feat["solar_share"] = feat["solar_gen"] / feat["gen_total"]
-        feat["res_share"] = (feat["wind_gen"] + feat["solar_gen"]) / feat["gen_total"]
 
-    # -------------------
-    # Forecast errors (actual − forecast)
-    # -------------------
-    feat["error_wind"] = feat["wind_gen"] - feat["wind_fc"]
-    feat["error_solar"] = feat["solar_gen"] - feat["solar_fc"]
-    feat["error_res"] = (
-        (feat["wind_gen"] + feat["solar_gen"]) - feat["res_fc"]
-    )
+def build_feature_frame(index: pd.DatetimeIndex, features: list[str], start=None, end=None) -> pd.DataFrame:
+    """
+    Registry features evaluated on an arbitrary time index instead of the
+    DE price index, e.g. forecast fundamentals for quarter-hours that have
+    no price yet. Only registry features (no targets) can be requested.
+    """
+    order, _ = required_inputs(features)
+    ctx = _FeatureContext(index, start=start, end=end)
+    computed = {name: ctx[name] for name in order}
+    return pd.DataFrame(computed, index=index)[[f for f in features if f in computed]]
 
-    # -------------------
-    # Time features
-    # -------------------
-    idx = feat.index
-    feat["hour"] = idx.hour
-    feat["dow"] = idx.dayofweek  # 0=Mon
 
-    return feat.sort_index()
+def lag_matrix(values, max_lag: int, dtype=np.float64) -> np.ndarray:
+    """
+    (n, max_lag) read-only strided view whose column k-1 is `values` shifted
+    by k steps (NaN where no history), i.e. the same as .shift(k).
+    Only the NaN-padded input is allocated; the lag block itself is a view.
+    """
+    values = np.asarray(values, dtype=dtype)
+    padded = np.concatenate([np.full(max_lag, np.nan, dtype=dtype), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, max_lag + 1)
+    # row t = values[t - max_lag .. t]; drop lag 0 and reverse -> lag1 .. lag max
+    return windows[:, :-1][:, ::-1]
 
 
-def add_lags(df: pd.DataFrame, cols: list[str], max_lag: int) -> pd.DataFrame:
-    """Add lagged versions of selected columns (in-place style)."""
-    out = df.copy()
-    for c in cols:
-        if c not in out.columns:
-            continue
-        for lag in range(1, max_lag + 1):
-            out[f"{c}_lag{lag}"] = out[c].shift(lag)
-    return out
+def lag_block(df: pd.DataFrame, cols: list[str], max_lag: int, dtype=np.float64) -> pd.DataFrame:
+    """All lag columns `{c}_lag{k}` for cols, built as one contiguous block."""
+    cols = [c for c in cols if c in df.columns]
+    if not cols or max_lag <= 0:
+        return pd.DataFrame(index=df.index)
+
+    block = np.concatenate([lag_matrix(df[c].to_numpy(), max_lag, dtype) for c in cols], axis=1)
+    names = [f"{c}_lag{lag}" for c in cols for lag in range(1, max_lag + 1)]
+    return pd.DataFrame(block, index=df.index, columns=names)
+
+
+def add_lags(df: pd.DataFrame, cols: list[str], max_lag: int, dtype=np.float64) -> pd.DataFrame:
+    """Add lagged versions of selected columns (returns a new frame).
+
+    The lag columns are created in one block and joined once, instead of
+    inserting max_lag * len(cols) single columns. Use dtype=np.float32 to
+    halve the memory of deep lag blocks.
+    """
+    block = lag_block(df, cols, max_lag, dtype)
+    if len(block.columns) == 0:
+        return df.copy()
+    return pd.concat([df, block], axis=1)
@@ -0,0 +1,95 @@
+# analysis/diagnostics.py
+# %%
+
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+"""
+Time-series diagnostics for the deep-dive tab (ACF / PACF, ADF, KPSS).
+
+ACF and PACF are computed once at MAX_LAGS per (zone, window, series,
+data watermark): the ACF via FFT, the PACF from one Levinson-Durbin pass
+over the (adjusted) autocovariances, which gives the same values as
+statsmodels' pacf(method="ywadjusted") for every lag up to MAX_LAGS. Any
+smaller lag count is a slice of that result.
+
+ADF (autolag="AIC") and KPSS are slow on long windows and run as a
+JobQueue job keyed the same way, so the page never waits on them.
+"""
+
+MAX_LAGS = 300
+
+
+def diagnostics_key(zone: str, window: str, series_type: str, watermark) -> str:
+    """Cache / job key: one entry per zone, window, series and data watermark."""
+    wm = pd.Timestamp(watermark).isoformat() if watermark is not None else "none"
+    return f"diag-{zone}-{window}-{series_type}-{wm}"
+
+
+def acf_pacf(values, nlags: int = MAX_LAGS) -> pd.DataFrame:
+    """
+    lag, acf, pacf for lags 0..nlags (capped at len - 1).
+    PACF = partial autocorrelations of the Levinson-Durbin recursion.
+    """
+    from statsmodels.tsa.stattools import acf, acovf, levinson_durbin
+
+    x = np.asarray(values, dtype=np.float64)
+    x = x[np.isfinite(x)]
+    nlags = int(min(nlags, len(x) - 1))
+    if nlags < 1:
+        return pd.DataFrame(columns=["lag", "acf", "pacf"])
+
+    acf_vals = acf(x, nlags=nlags, fft=True)
+    acov = acovf(x, adjusted=True, fft=True, nlag=nlags)
+    _, _, pacf_vals, _, _ = levinson_durbin(acov, nlags=nlags, isacov=True)
+
+    return pd.DataFrame(
+        {"lag": np.arange(nlags + 1), "acf": acf_vals, "pacf": np.asarray(pacf_vals)}
+    )
+
+
+def stationarity_tests(values, progress=None) -> pd.DataFrame:
+    """ADF (H0: unit root) and KPSS (H0: stationary); errors end up in the verdict."""
+    from statsmodels.tsa.stattools import adfuller, kpss
+
+    x = np.asarray(values, dtype=np.float64)
+    x = x[np.isfinite(x)]
+    rows = []
+
+    if progress is not None:
+        progress["stage"] = "ADF"
+    try:
+        adf_p = adfuller(x, autolag="AIC")[1]
+        adf_verdict = "Likely stationary" if adf_p < 0.05 else "Likely non-stationary"
+    except Exception as e:
+        adf_p = np.nan
+        adf_verdict = f"Error: {e}"
+    rows.append({"Test": "ADF", "p-value": adf_p, "Verdict": adf_verdict})
+
+    if progress is not None:
+        progress["stage"] = "KPSS"
+    try:
+        with warnings.catch_warnings():
+            # KPSS warns when the p-value is outside its lookup table
+            warnings.simplefilter("ignore")
+            _, kpss_p, _, _ = kpss(x, regression="c", nlags="auto")
+        kpss_verdict = "Likely non-stationary" if kpss_p < 0.05 else "Likely stationary"
+    except Exception as e:
+        kpss_p = np.nan
+        kpss_verdict = f"Error: {e}"
+    rows.append({"Test": "KPSS", "p-value": kpss_p, "Verdict": kpss_verdict})
+
+    return pd.DataFrame(rows)
+
+
+def submit_stationarity_tests(queue, key: str, values) -> str:
+    """Run the tests in the background under `key` (see diagnostics_key)."""
+    return queue.submit(key, stationarity_tests, np.asarray(values, dtype=np.float64))
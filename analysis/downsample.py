@@ -0,0 +1,176 @@
+# analysis/downsample.py
+# %%
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.pyramid import DEFAULT_MAX_POINTS
+
+"""
+Shape-preserving downsampling for dashboard charts.
+
+Reduces a time series to a bounded number of points before it is handed to
+st.line_chart / Altair, so the payload sent to the browser does not grow with
+the window length. Both methods keep extremes (price spikes, negative prices):
+
+- "minmax": split into equal buckets and keep the min and max of each bucket
+  (plus first / last point), fully vectorized.
+- "lttb": Largest-Triangle-Three-Buckets, keeps the visually most significant
+  point per bucket (one Python step per bucket, vectorized inside).
+"""
+
+
+def _as_float_x(index) -> np.ndarray:
+    if isinstance(index, pd.DatetimeIndex) or pd.api.types.is_datetime64_any_dtype(index):
+        return pd.DatetimeIndex(index).asi8.astype(np.float64)
+    return np.asarray(index, dtype=np.float64)
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Sorted positions of the min and max of each bucket (+ first / last point).
+    Returns at most ~max_points positions.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(max_points // 2 - 1, 1)
+    size = int(np.ceil(n / n_buckets))
+    pad = n_buckets * size - n
+
+    # NaNs never win: +inf for argmin, -inf for argmax
+    lo = np.pad(np.where(np.isnan(y), np.inf, y), (0, pad), constant_values=np.inf)
+    hi = np.pad(np.where(np.isnan(y), -np.inf, y), (0, pad), constant_values=-np.inf)
+    offsets = np.arange(n_buckets) * size
+
+    i_min = lo.reshape(n_buckets, size).argmin(axis=1) + offsets
+    i_max = hi.reshape(n_buckets, size).argmax(axis=1) + offsets
+
+    idx = np.concatenate([[0, n - 1], i_min, i_max])
+    return np.unique(idx[idx < n])
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: sorted positions of the kept points."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n <= max_points or max_points < 3:
+        return valid
+
+    xv, yv = x[valid], y[valid]
+
+    # bucket edges for the n - 2 inner points
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    starts, stops = edges[:-1], edges[1:]
+    sizes = np.maximum(stops - starts, 1)
+
+    # mean of each bucket (the "third point" for the previous bucket)
+    x_avg = np.add.reduceat(xv[: n - 1], starts) / sizes
+    y_avg = np.add.reduceat(yv[: n - 1], starts) / sizes
+    x_avg = np.append(x_avg[1:], xv[-1])
+    y_avg = np.append(y_avg[1:], yv[-1])
+
+    out = np.empty(max_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b, (lo, hi) in enumerate(zip(starts, stops)):
+        hi = max(hi, lo + 1)
+        area = np.abs(
+            (xv[a] - x_avg[b]) * (yv[lo:hi] - yv[a])
+            - (xv[a] - xv[lo:hi]) * (y_avg[b] - yv[a])
+        )
+        a = lo + int(area.argmax())
+        out[b + 1] = a
+
+    return valid[np.unique(out)]
+
+
+def downsample_indices(x, y, max_points: int = DEFAULT_MAX_POINTS, method: str = "minmax") -> np.ndarray:
+    if method == "lttb":
+        return lttb_indices(_as_float_x(x), y, max_points)
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    raise ValueError(f"Unknown downsampling method {method!r}")
+
+
+def downsample_series(
+    s: pd.Series,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax",
+) -> pd.Series:
+    """Downsample one series indexed by time."""
+    s = s.sort_index()
+    if len(s) <= max_points:
+        return s
+    return s.iloc[downsample_indices(s.index, s.to_numpy(dtype=np.float64), max_points, method)]
+
+
+def downsample_wide(
+    df: pd.DataFrame,
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax",
+    key: pd.Series | None = None,
+) -> pd.DataFrame:
+    """
+    Downsample a wide frame indexed by time (one column per series, as passed
+    to st.line_chart) while keeping rows aligned across columns.
+
+    Rows kept = union of the rows each column would keep; with `key` (e.g. the
+    row total of a stacked area) rows are chosen on that series only, which
+    bounds the output to max_points rows.
+    """
+    df = df.sort_index()
+    if len(df) <= max_points:
+        return df
+
+    x = df.index
+    if key is not None:
+        key = key.reindex(df.index)
+        idx = downsample_indices(x, key.to_numpy(dtype=np.float64), max_points, method)
+    else:
+        numeric = df.select_dtypes("number")
+        per_col = max(max_points // max(len(numeric.columns), 1), 4)
+        parts = [
+            downsample_indices(x, numeric[c].to_numpy(dtype=np.float64), per_col, method)
+            for c in numeric.columns
+        ]
+        idx = np.unique(np.concatenate(parts)) if parts else np.arange(len(df))
+    return df.iloc[idx]
+
+
+def downsample_long(
+    df: pd.DataFrame,
+    value_col: str,
+    group_col: str | None = None,
+    time_col: str = "time",
+    max_points: int = DEFAULT_MAX_POINTS,
+    method: str = "minmax",
+) -> pd.DataFrame:
+    """Downsample a long frame per group (e.g. zone / series) on value_col."""
+    if df.empty:
+        return df
+
+    groups = [df] if group_col is None else [g for _, g in df.groupby(group_col, sort=False)]
+    frames = []
+    for g in groups:
+        g = g.sort_values(time_col)
+        if len(g) > max_points:
+            g = g.iloc[
+                downsample_indices(
+                    g[time_col].to_numpy(), g[value_col].to_numpy(dtype=np.float64), max_points, method
+                )
+            ]
+        frames.append(g)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,204 @@
+# analysis/feature_store.py
+# %%
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.de_features import build_de_features, FEATURE_SET_VERSION
+from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
+from power.fetch_power.io_s3 import write_atomic, list_paths
+from power.fetch_power.state import ensure_utc
+from analysis.instrumentation import instrumented
+
+"""
+Materialized DE feature store.
+
+build_de_features() reloads prices plus three SMARD groups and pivots them on
+every call. The stats pipeline instead persists its output once:
+
+    data/features/version=<FEATURE_SET_VERSION>/month=<YYYY-MM>/data.parquet
+
+time-indexed, columnar, float32 (hour / dow as int8), extended from the stored
+watermark on each run. Pages read only the columns and months they need.
+A new FEATURE_SET_VERSION starts a fresh directory and triggers a full build.
+"""
+
+FEATURE_ROOT = PROJECT_ROOT / "data" / "features"
+FEATURE_META_PATH = PROJECT_ROOT / "state" / "feature_store.json"
+
+# re-derive the last hours on each run: SMARD publishes / revises fundamentals
+# (actual generation, consumption) up to a day or more after the fact
+OVERLAP_HOURS = int(os.environ.get("FEATURE_OVERLAP_HOURS", "48"))
+
+
+def _version_root(feature_root: Path = FEATURE_ROOT, version: int = FEATURE_SET_VERSION) -> Path:
+    return Path(feature_root) / f"version={version}"
+
+
+def _month_path(month: str, feature_root: Path = FEATURE_ROOT, version: int = FEATURE_SET_VERSION) -> Path:
+    return _version_root(feature_root, version) / f"month={month}" / "data.parquet"
+
+
+def load_feature_meta(path: str | Path = FEATURE_META_PATH) -> dict:
+    """{"version": int, "watermark": iso str, "columns": [...]} or {} if never built."""
+    file_path = Path(path)
+    if not file_path.exists():
+        return {}
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def save_feature_meta(path: str | Path, meta: dict) -> None:
+    file_path = Path(path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "w") as f:
+        json.dump(meta, f)
+
+
+def to_store_dtypes(feat: pd.DataFrame) -> pd.DataFrame:
+    """float32 for every numeric feature, int8 for the calendar columns."""
+    out = feat.copy()
+    for c in out.columns:
+        if c in ("hour", "dow"):
+            out[c] = out[c].astype(np.int8)
+        elif pd.api.types.is_numeric_dtype(out[c]):
+            out[c] = out[c].astype(np.float32)
+    return out
+
+
+def _write_months(feat: pd.DataFrame, feature_root: Path, version: int) -> list[str]:
+    """Merge rows into their month partitions (last value wins per timestamp)."""
+    touched = []
+    months = feat.index.strftime("%Y-%m")
+    for month in sorted(set(months)):
+        new = feat[months == month]
+        path = _month_path(month, feature_root, version)
+        old = read_parquet_if_exists(path)
+        if old is not None and not old.empty:
+            old = old.set_index("time")
+            new = pd.concat([old[old.index < new.index.min()], new])
+            new = new[~new.index.duplicated(keep="last")].sort_index()
+        write_atomic(path, to_parquet_bytes(new.reset_index()))
+        touched.append(month)
+    return touched
+
+
+def update_feature_store(
+    end=None,
+    rebuild: bool = False,
+    feature_root: Path = FEATURE_ROOT,
+    meta_path: Path = FEATURE_META_PATH,
+) -> dict:
+    """
+    Extend the store from its watermark up to `end` (default: all data).
+    Full build when no store exists, on `rebuild=True`, or when
+    FEATURE_SET_VERSION changed. Returns the updated meta dict.
+    """
+    meta = load_feature_meta(meta_path)
+    incremental = (
+        not rebuild
+        and meta.get("version") == FEATURE_SET_VERSION
+        and meta.get("watermark") is not None
+    )
+
+    keep_from = None
+    load_from = None
+    if incremental:
+        keep_from = pd.Timestamp(meta["watermark"]) - pd.Timedelta(hours=OVERLAP_HOURS)
+        # one extra day so returns at the start of the range have a previous price
+        load_from = keep_from - pd.Timedelta(days=1)
+
+    feat = build_de_features(start=load_from, end=end)
+    if feat.empty:
+        return meta
+    if end is not None:
+        feat = feat[feat.index <= ensure_utc(end)]
+    if keep_from is not None:
+        feat = feat[feat.index >= keep_from]
+    if feat.empty:
+        return meta
+
+    feat = to_store_dtypes(feat)
+    feat.index.name = "time"
+    touched = _write_months(feat, feature_root, FEATURE_SET_VERSION)
+
+    columns = list(feat.columns)
+    if incremental:
+        columns = list(dict.fromkeys(meta.get("columns", []) + columns))
+
+    meta = {
+        "version": FEATURE_SET_VERSION,
+        "watermark": feat.index.max().isoformat(),
+        "columns": columns,
+        "months_touched": touched,
+    }
+    save_feature_meta(meta_path, meta)
+    return meta
+
+
+def feature_store_watermark(meta_path: Path = FEATURE_META_PATH) -> pd.Timestamp | None:
+    """Last timestamp in the store, if it matches the current feature version."""
+    meta = load_feature_meta(meta_path)
+    if meta.get("version") != FEATURE_SET_VERSION or not meta.get("watermark"):
+        return None
+    return pd.Timestamp(meta["watermark"])
+
+
+@instrumented()
+def load_feature_store(
+    columns: list[str] | None = None,
+    start=None,
+    end=None,
+    feature_root: Path = FEATURE_ROOT,
+    meta_path: Path = FEATURE_META_PATH,
+) -> pd.DataFrame:
+    """
+    Read features indexed by time, only for the requested columns and the
+    month partitions overlapping [start, end]. Empty DataFrame if the store
+    has not been built for the current FEATURE_SET_VERSION.
+    """
+    meta = load_feature_meta(meta_path)
+    if meta.get("version") != FEATURE_SET_VERSION:
+        return pd.DataFrame()
+
+    start_ts = ensure_utc(start) if start is not None else None
+    end_ts = ensure_utc(end) if end is not None else None
+
+    months = sorted(
+        {
+            Path(p).parent.name.split("month=", 1)[1]
+            for p in list_paths(_version_root(feature_root))
+            if Path(p).parent.name.startswith("month=")
+        }
+    )
+    if start_ts is not None:
+        months = [m for m in months if m >= start_ts.strftime("%Y-%m")]
+    if end_ts is not None:
+        months = [m for m in months if m <= end_ts.strftime("%Y-%m")]
+
+    if columns is not None:
+        known = set(meta.get("columns", []))
+        columns = ["time"] + [c for c in columns if c in known]
+
+    frames = [pd.read_parquet(_month_path(m, feature_root), columns=columns) for m in months]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    feat = pd.concat(frames, ignore_index=True)
+    feat["time"] = pd.to_datetime(feat["time"], utc=True)
+    feat = feat.set_index("time").sort_index()
+    if start_ts is not None:
+        feat = feat[feat.index >= start_ts]
+    if end_ts is not None:
+        feat = feat[feat.index <= end_ts]
+    return feat
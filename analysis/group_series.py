@@ -8,15 +8,21 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.read_data import load_filter_history
+from analysis.read_data import load_filter_history, list_partition_days
+from analysis.pyramid import choose_level, load_pyramid_level
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from analysis.instrumentation import instrumented
 
 # We already have generation/forecast/consumption filter groups defined
 # in smard_filters.FILTER_GROUPS
 
+@instrumented()
 def load_group_long(
     filter_group_name: str,
     root: Path = PROJECT_ROOT,
+    start=None,
+    end=None,
+    partition_days: dict[str, list[str]] | None = None,
 ) -> pd.DataFrame:
     """
     Generic loader for a SMARD filter group (generation, forecast, consumption).
@@ -26,13 +32,17 @@ def load_group_long(
         series (technology / type, human-readable label)
         value (MW or whatever SMARD provides)
 
+    `start` / `end` (optional) restrict the daily partitions that are read;
+    `partition_days` (filter_id -> days, optional) skips listing them again.
+
     For now, assumes only one region (DE) is used.
     """
     filters = FILTER_GROUPS[filter_group_name]
     frames = []
 
     for filter_id, label in filters.items():
-        df = load_filter_history(filter_id, region="DE", root=root)
+        days = partition_days.get(filter_id, []) if partition_days is not None else None
+        df = load_filter_history(filter_id, region="DE", root=root, start=start, end=end, days=days)
         if df is None or df.empty:
             continue
         tmp = df.copy()
@@ -52,6 +62,95 @@ def load_group_long(
     return out
 
 
+WINDOW_DELTAS = {
+    "1D": pd.Timedelta(days=1),
+    "3D": pd.Timedelta(days=3),
+    "7D": pd.Timedelta(days=7),
+    "30D": pd.Timedelta(days=30),
+    "90D": pd.Timedelta(days=90),
+    "1Y": pd.Timedelta(days=365),
+}
+
+
+def group_time_bounds(
+    filter_group_name: str,
+    root: Path = PROJECT_ROOT,
+    region: str = "DE",
+) -> tuple[pd.Timestamp | None, pd.Timestamp | None]:
+    """
+    (first, last) timestamp stored for a group, reading only the first and
+    last daily partition of each filter (or asking the data service, which
+    holds the group, when DATA_SERVICE_PORT is set).
+    """
+    if Path(root) == PROJECT_ROOT:
+        from analysis.data_service import fetch_bounds_from_service
+
+        served = fetch_bounds_from_service(list(FILTER_GROUPS[filter_group_name]), region=region)
+        if served is not None:
+            return pd.Timestamp(served[0]), pd.Timestamp(served[1])
+
+    firsts, lasts = [], []
+    for filter_id in FILTER_GROUPS[filter_group_name]:
+        days = list_partition_days(filter_id, region=region, root=root)
+        if not days:
+            continue
+        firsts.append(pd.Timestamp(days[0], tz="UTC"))
+        df_last = load_filter_history(filter_id, region=region, root=root, start=days[-1])
+        if not df_last.empty:
+            lasts.append(pd.to_datetime(df_last["time_utc"], utc=True).max())
+
+    if not firsts or not lasts:
+        return None, None
+    return min(firsts), max(lasts)
+
+
+@instrumented()
+def load_group_window(
+    filter_group_name: str,
+    window: str = "max",
+    max_points: int | None = None,
+    root: Path = PROJECT_ROOT,
+) -> pd.DataFrame:
+    """
+    Windowed version of load_group_long for charts.
+
+    Only the partitions inside the window are read. With `max_points`, the
+    coarsest time-pyramid level (hour / day / week) that still gives at least
+    that many points per series is used instead of raw 15-min data; `value`
+    is then the bucket mean and `min` / `max` columns carry the bucket range.
+    Returns a long DataFrame: time, series, value (+ min, max).
+    """
+    first, end = group_time_bounds(filter_group_name, root=root)
+    if end is None:
+        return pd.DataFrame(columns=["time", "series", "value"])
+
+    start = end - WINDOW_DELTAS[window] if window in WINDOW_DELTAS else first
+    level = choose_level(start, end, max_points)
+
+    if level is None:
+        df = load_group_long(filter_group_name, root=root, start=start, end=end)
+        return df[df["time"].between(start, end)].reset_index(drop=True)
+
+    frames = []
+    for filter_id, label in FILTER_GROUPS[filter_group_name].items():
+        agg = load_pyramid_level(
+            filter_id, level, start=start, end=end, pyramid_root=root / "data" / "pyramid"
+        )
+        if agg.empty:
+            continue
+        tmp = agg[["time", "mean", "min", "max"]].rename(columns={"mean": "value"})
+        tmp.insert(1, "series", label)
+        frames.append(tmp)
+
+    if not frames:
+        # pyramid not built yet -> raw data
+        df = load_group_long(filter_group_name, root=root, start=start, end=end)
+        return df[df["time"].between(start, end)].reset_index(drop=True)
+
+    out = pd.concat(frames, ignore_index=True)
+    return out.sort_values(["series", "time"]).reset_index(drop=True)
+
+
 def filter_by_window(df: pd.DataFrame, window: str) -> pd.DataFrame:
     """
     Simple time-window filter (1D, 7D, 30D, 90D, 1Y, max).
@@ -0,0 +1,184 @@
+# analysis/instrumentation.py
+# %%
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+"""
+Named-section timing / memory instrumentation for the dashboard and loaders.
+
+    with section("pivot prices") as s:
+        wide = df.pivot(...)
+        s.rows = len(df)
+
+    @instrumented("load_group_long")      # rows = len(result)
+    def load_group_long(...): ...
+
+Sections nest: a page run (start_run) collects one record per section with
+its depth, wall time, rows and peak traced memory above the memory in use
+when the section started. Sections are off unless enabled for the calling
+thread (one Streamlit script run) via set_enabled(), or for every thread with
+DASHBOARD_PROFILE=1. Disabled sections cost one attribute lookup.
+
+Peak memory comes from tracemalloc, which is process-wide (concurrent
+sessions show up in each other's peaks) and slows every allocation down, so
+it is only started, once, with DASHBOARD_PROFILE=1 and never stopped;
+otherwise peak_mb is None. A session's debug toggle never touches it.
+
+finish_run() returns the records and appends them to METRICS_LOG (JSONL).
+"""
+
+METRICS_LOG = PROJECT_ROOT / "metrics" / "dashboard_sections.jsonl"
+
+DASHBOARD_PROFILE = os.environ.get("DASHBOARD_PROFILE", "0") == "1"
+_local = threading.local()
+
+if DASHBOARD_PROFILE and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class _Section:
+    __slots__ = ("name", "depth", "rows", "t0", "mem0", "peak_seen", "slot")
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.rows = None
+        self.slot = None
+        self.t0 = 0.0
+        self.mem0 = 0
+        self.peak_seen = 0
+
+
+class _Noop:
+    """Stand-in yielded by disabled sections (accepts .rows)."""
+
+    rows = None
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn sections on / off for the calling thread only."""
+    _local.enabled = bool(enabled)
+
+
+def is_enabled() -> bool:
+    return getattr(_local, "enabled", DASHBOARD_PROFILE)
+
+
+def _state():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+        _local.records = None
+        _local.run = None
+    return _local
+
+
+def start_run(page: str) -> None:
+    """Begin collecting records of this thread (one Streamlit script run)."""
+    st_ = _state()
+    st_.stack = []
+    st_.records = []
+    st_.run = {"run_id": uuid.uuid4().hex[:12], "page": page, "started": pd.Timestamp.now(tz="UTC").isoformat()}
+
+
+@contextmanager
+def section(name: str, rows: int | None = None):
+    if not is_enabled():
+        yield _Noop()
+        return
+
+    st_ = _state()
+    sec = _Section(name, len(st_.stack))
+    sec.rows = rows
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if st_.stack:
+            # keep the parent's peak before the counter is reset for this section
+            st_.stack[-1].peak_seen = max(st_.stack[-1].peak_seen, peak)
+        tracemalloc.reset_peak()
+        sec.mem0 = current
+    st_.stack.append(sec)
+    if st_.records is not None:
+        # slot taken on entry: records stay in start order (parents before children)
+        sec.slot = len(st_.records)
+        st_.records.append(None)
+    sec.t0 = time.perf_counter()
+    try:
+        yield sec
+    finally:
+        seconds = time.perf_counter() - sec.t0
+        st_.stack.pop()
+        peak_mb = None
+        if tracing and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], sec.peak_seen)
+            peak_mb = max(peak - sec.mem0, 0) / 2**20
+            if st_.stack:
+                st_.stack[-1].peak_seen = max(st_.stack[-1].peak_seen, peak)
+        if st_.records is not None and sec.slot is not None:
+            st_.records[sec.slot] = {
+                "section": name,
+                "depth": sec.depth,
+                "seconds": seconds,
+                "rows": sec.rows,
+                "peak_mb": peak_mb,
+            }
+
+
+def instrumented(name: str | None = None):
+    """Decorator: run the function inside section(name), rows = len(result) when it has one."""
+
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with section(label) as sec:
+                out = func(*args, **kwargs)
+                try:
+                    sec.rows = len(out)
+                except TypeError:
+                    pass
+                return out
+
+        return wrapper
+
+    return decorator
+
+
+def finish_run(log_path: Path | None = METRICS_LOG) -> pd.DataFrame:
+    """
+    Records of the current run in start order (parents before children),
+    appended to `log_path` as JSON lines. Empty frame when nothing was recorded.
+    """
+    st_ = _state()
+    records = [r for r in (st_.records or []) if r is not None]
+    run = st_.run or {}
+    st_.records, st_.run = None, None
+    if not records:
+        return pd.DataFrame(columns=["section", "depth", "seconds", "rows", "peak_mb"])
+    out = pd.DataFrame(records)
+
+    if log_path is not None:
+        log_path = Path(log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            for rec in out.to_dict("records"):
+                f.write(json.dumps({**run, **rec}) + "\n")
+    return out
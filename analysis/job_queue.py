@@ -0,0 +1,123 @@
+# analysis/job_queue.py
+# %%
+
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Local job queue for heavy model work (SARIMAX fits, stationarity tests, ...).
+
+A JobQueue wraps a process pool. Jobs are identified by a caller-supplied key
+(a hash of the request), so identical requests from different Streamlit
+sessions share one running job instead of fitting twice. Each job gets a
+shared `progress` dict it can update from the worker process; the page polls
+`status(key)` and renders progress / results without blocking on the fit.
+
+The queue is meant to exist once per server process: pages use
+shared_queue(), so SARIMAX fits and diagnostics share one pool.
+"""
+
+MAX_KEPT_JOBS = 64
+
+
+class JobQueue:
+    def __init__(self, max_workers: int | None = None):
+        if max_workers is None:
+            max_workers = max((os.cpu_count() or 2) - 1, 1)
+        # spawn: don't fork a process that runs Streamlit threads
+        ctx = mp.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+        self._manager = ctx.Manager()
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn, *args, **kwargs) -> str:
+        """
+        Run fn(*args, progress=<shared dict>, **kwargs) in the pool under `key`.
+        If a job with the same key is queued, running or finished OK, it is
+        reused instead of submitting again. Returns the key.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not (job["future"].done() and job["future"].exception() is not None):
+                return key
+
+            progress = self._manager.dict()
+            future = self._pool.submit(fn, *args, progress=progress, **kwargs)
+            self._jobs[key] = {"future": future, "progress": progress, "submitted": time.time()}
+            self._prune()
+        return key
+
+    def status(self, key: str) -> dict:
+        """
+        {"state": "unknown" | "queued" | "running" | "done" | "failed",
+         "progress": dict, "result": ..., "error": str | None, "elapsed": s}
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return {"state": "unknown", "progress": {}, "result": None, "error": None, "elapsed": 0.0}
+
+        future = job["future"]
+        out = {
+            "state": "queued",
+            "progress": self._read_progress(job["progress"]),
+            "result": None,
+            "error": None,
+            "elapsed": time.time() - job["submitted"],
+        }
+        if future.done():
+            err = future.exception()
+            if err is not None:
+                out["state"] = "failed"
+                out["error"] = f"{type(err).__name__}: {err}"
+            else:
+                out["state"] = "done"
+                out["result"] = future.result()
+        elif future.running() or out["progress"]:
+            out["state"] = "running"
+        return out
+
+    def cancel(self, key: str) -> bool:
+        """Cancel a job that has not started yet."""
+        with self._lock:
+            job = self._jobs.get(key)
+        return job is not None and job["future"].cancel()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
+
+    @staticmethod
+    def _read_progress(progress) -> dict:
+        try:
+            return dict(progress)
+        except Exception:
+            # manager gone (shutdown) -> no progress to report
+            return {}
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond MAX_KEPT_JOBS."""
+        if len(self._jobs) <= MAX_KEPT_JOBS:
+            return
+        finished = sorted(
+            (job["submitted"], key) for key, job in self._jobs.items() if job["future"].done()
+        )
+        for _, key in finished[: len(self._jobs) - MAX_KEPT_JOBS]:
+            del self._jobs[key]
+
+
+_SHARED_QUEUE: JobQueue | None = None
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_queue() -> JobQueue:
+    """The process-wide JobQueue, created on first use (shared by all pages)."""
+    global _SHARED_QUEUE
+    with _SHARED_LOCK:
+        if _SHARED_QUEUE is None:
+            _SHARED_QUEUE = JobQueue()
+        return _SHARED_QUEUE
@@ -10,7 +10,9 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent  # TRADING-POWER/
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.group_series import load_group_long  # generic loader for SMARD groups
+from analysis.group_series import load_group_long, load_group_window, group_time_bounds  # generic loaders for SMARD groups
+from power.fetch_power.smard_filters import MARKET_PRICE_FILTER_IDS
+from analysis.instrumentation import instrumented
 
 # Time windows for your dashboard
 WINDOWS = {
@@ -23,45 +25,95 @@ WINDOWS = {
     "max": None,  # full history
 }
 
+# Map SMARD label -> compact zone code
+LABEL_TO_ZONE = {
+    "Market price: DE": "DE",
+    "Market price: Belgium": "BE",
+    "Market price: Netherlands": "NL",
+}
+
+# filter_id -> zone code (e.g. "4169" -> "DE")
+ZONE_BY_FILTER_ID = {
+    filter_id: LABEL_TO_ZONE.get(label, label)
+    for filter_id, label in MARKET_PRICE_FILTER_IDS.items()
+}
+
 
+@instrumented()
 def load_prices_with_returns(
     filter_group_name: str = "market_price",
     root: Path = PROJECT_ROOT,
+    start=None,
+    end=None,
 ) -> pd.DataFrame:
     """
     Load all market price data for a group and add returns.
+    `start` / `end` (optional) restrict the daily partitions that are read.
     Returns a long DataFrame with columns:
         time (UTC),
         zone (e.g. 'DE', 'NL', 'BE'),
         price,
         return.
     """
-    df = load_group_long(filter_group_name, root=root)
+    df = load_group_long(filter_group_name, root=root, start=start, end=end)
     if df is None or df.empty:
         return pd.DataFrame(columns=["time", "zone", "price", "return"])
 
-    df = df.copy()
-    df["time"] = pd.to_datetime(df["time"], utc=True)
+    # load_group_long already returns a fresh frame with UTC times: no copy /
+    # re-parse needed, and one sort serves both the output order and pct_change
+    df = long_to_prices(df)
+    df["return"] = df.groupby("zone")["price"].pct_change()
+    return df
 
-    # Map label -> compact zone code
-    label_to_zone = {
-        "Market price: DE": "DE",
-        "Market price: Belgium": "BE",
-        "Market price: Netherlands": "NL",
-    }
-
-    df["zone"] = df["series"].map(label_to_zone).fillna(df["series"])
-    df = df.rename(columns={"value": "price"})
-    df = df[["time", "zone", "price"]].sort_values(["zone", "time"])
-
-    # Add returns per zone
-    df["return"] = (
-        df.sort_values(["zone", "time"])
-          .groupby("zone")["price"]
-          .pct_change()
-    )
 
-    return df
+def load_prices_for_window(
+    window_key: str = "max",
+    filter_group_name: str = "market_price",
+    root: Path = PROJECT_ROOT,
+) -> pd.DataFrame:
+    """
+    load_prices_with_returns cut to one window (as filter_by_window cuts it),
+    reading only the partitions in the window plus one day, so the first row
+    of the window keeps its return.
+    """
+    _, end = group_time_bounds(filter_group_name, root=root)
+    if end is None:
+        return pd.DataFrame(columns=["time", "zone", "price", "return"])
+    if WINDOWS.get(window_key) is None:
+        return load_prices_with_returns(filter_group_name, root=root)
+
+    start = end - pd.Timedelta(WINDOWS[window_key])
+    df = load_prices_with_returns(filter_group_name, root=root, start=start - pd.Timedelta(days=1), end=end)
+    return df[df["time"].between(start, end)]
+
+
+def long_to_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """load_group_long output -> time, zone, price sorted by (zone, time)."""
+    zone = df["series"].map(LABEL_TO_ZONE).fillna(df["series"])
+    out = pd.DataFrame({"time": df["time"], "zone": zone, "price": df["value"]})
+    return out.sort_values(["zone", "time"])
+
+
+@instrumented()
+def load_prices_window(
+    window_key: str = "max",
+    max_points: int | None = None,
+    filter_group_name: str = "market_price",
+    root: Path = PROJECT_ROOT,
+) -> pd.DataFrame:
+    """
+    Prices for one window, for charts: reads only the partitions in the window
+    and, with `max_points`, the coarsest time-pyramid level that still gives
+    that many points per zone (price = bucket mean, plus min / max).
+    Returns a long DataFrame: time, zone, price, return (+ min, max).
+    """
+    df = load_group_window(filter_group_name, window_key, max_points=max_points, root=root)
+    if df.empty:
+        return pd.DataFrame(columns=["time", "zone", "price", "return"])
+
+    df["zone"] = df["series"].map(LABEL_TO_ZONE).fillna(df["series"])
+    df = df.drop(columns=["series"]).rename(columns={"value": "price"})
+    return add_returns(df)
 
 
 def add_returns(df: pd.DataFrame) -> pd.DataFrame:
@@ -0,0 +1,92 @@
+# analysis/model_cache.py
+# %%
+
+import hashlib
+import json
+import pickle
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from power.fetch_power.io_s3 import write_atomic
+
+"""
+Persistent cache of fitted SARIMAX models.
+
+One entry per model specification (feature-store version, window, target,
+order, exog set, Fourier orders):
+
+    data/models/sarimax/<spec_key>/meta.json     params, data key, sample bounds
+    data/models/sarimax/<spec_key>/result.pkl    rendered result of the last fit
+
+A request on exactly the same data returns result.pkl as is; a request on
+newer data (the window moved forward) starts the optimizer from the cached
+parameters instead of the statsmodels defaults.
+"""
+
+MODEL_CACHE_ROOT = PROJECT_ROOT / "data" / "models" / "sarimax"
+
+
+def spec_key(spec: dict) -> str:
+    """Stable hash of a model specification dict (JSON-serializable values)."""
+    blob = json.dumps(spec, sort_keys=True, default=str).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def _entry_dir(spec: dict, cache_root: Path = MODEL_CACHE_ROOT) -> Path:
+    return Path(cache_root) / spec_key(spec)
+
+
+def load_cached_model(spec: dict, cache_root: Path = MODEL_CACHE_ROOT) -> dict | None:
+    """
+    {"spec", "data_key", "params" (pd.Series), "start", "end", "nobs"} for
+    the spec, or None if it was never fitted.
+    """
+    path = _entry_dir(spec, cache_root) / "meta.json"
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        meta = json.load(f)
+    meta["params"] = pd.Series(meta["params"], dtype="float64")
+    return meta
+
+
+def load_cached_result(spec: dict, cache_root: Path = MODEL_CACHE_ROOT) -> dict | None:
+    """The result dict of the last fit for the spec (see sarimax_service)."""
+    path = _entry_dir(spec, cache_root) / "result.pkl"
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # unreadable (e.g. pandas version change) -> treat as a miss
+        return None
+
+
+def save_cached_model(
+    spec: dict,
+    data_key: str,
+    params: pd.Series,
+    index: pd.DatetimeIndex,
+    result: dict,
+    cache_root: Path = MODEL_CACHE_ROOT,
+) -> None:
+    entry = _entry_dir(spec, cache_root)
+    meta = {
+        "spec": spec,
+        "data_key": data_key,
+        "params": {str(k): float(v) for k, v in params.items()},
+        "start": index[0].isoformat(),
+        "end": index[-1].isoformat(),
+        "nobs": int(len(index)),
+        "fitted_at": pd.Timestamp.now(tz="UTC").isoformat(),
+    }
+    # result first: a meta.json always has a matching (or newer) result.pkl
+    write_atomic(entry / "result.pkl", pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    write_atomic(entry / "meta.json", json.dumps(meta).encode())
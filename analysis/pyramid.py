@@ -0,0 +1,167 @@
+# analysis/pyramid.py
+# %%
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import load_filter_history
+from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.state import ensure_utc
+from analysis.instrumentation import instrumented
+
+"""
+Time pyramid: pre-aggregated hour / day / week levels for every filter.
+
+Each level stores one row per bucket with mean, min, max, first, last, count
+under data/pyramid/level=<level>/region=DE/filter=<id>/data.parquet.
+The ingest jobs refresh the buckets touched by newly written quarter-hours,
+and readers pick the coarsest level that still gives the requested number of
+points, so a "1Y" or "max" chart loads a few thousand rows instead of the
+full 15-min history.
+"""
+
+PYRAMID_ROOT = PROJECT_ROOT / "data" / "pyramid"
+
+RAW_STEP = pd.Timedelta(minutes=15)
+
+# finest -> coarsest
+LEVELS = {
+    "hour": pd.Timedelta(hours=1),
+    "day": pd.Timedelta(days=1),
+    "week": pd.Timedelta(days=7),
+}
+
+AGG_COLUMNS = ["mean", "min", "max", "first", "last", "count"]
+
+# default point budget per series for dashboard time-series charts
+DEFAULT_MAX_POINTS = 2000
+
+
+def pyramid_path(level: str, region: str, filter_id: str, pyramid_root: Path = PYRAMID_ROOT) -> Path:
+    return Path(pyramid_root) / f"level={level}" / f"region={region}" / f"filter={filter_id}" / "data.parquet"
+
+
+def bucket_start(times: pd.Series, level: str) -> pd.Series:
+    """Start of the hour / day / ISO week (Monday 00:00 UTC) containing each timestamp."""
+    times = pd.to_datetime(times, utc=True)
+    if level == "hour":
+        return times.dt.floor("h")
+    day = times.dt.floor("D")
+    if level == "day":
+        return day
+    if level == "week":
+        return day - pd.to_timedelta(day.dt.dayofweek, unit="D")
+    raise ValueError(f"Unknown pyramid level {level!r}")
+
+
+def aggregate_level(df: pd.DataFrame, level: str) -> pd.DataFrame:
+    """
+    Aggregate a raw (time_utc, value) frame into one level.
+    Returns columns: time (bucket start), mean, min, max, first, last, count
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["time"] + AGG_COLUMNS)
+
+    tmp = df[["time_utc", "value"]].sort_values("time_utc")
+    buckets = bucket_start(tmp["time_utc"], level)
+    out = (
+        tmp["value"]
+        .groupby(buckets.values)
+        .agg(["mean", "min", "max", "first", "last", "count"])
+    )
+    out.index.name = "time"
+    out = out.reset_index()
+    out["time"] = pd.to_datetime(out["time"], utc=True)
+    return out
+
+
+def update_pyramid(
+    filter_id: str,
+    since=None,
+    root: Path = PROJECT_ROOT,
+    region: str = "DE",
+    pyramid_root: Path = PYRAMID_ROOT,
+) -> dict[str, int]:
+    """
+    Refresh every level of one filter from `since` onwards.
+    Raw data is re-read from the start of the week containing `since`, so
+    partially filled buckets at the edge are recomputed in full.
+    `since=None` (or a missing level file) rebuilds from the full history.
+    Returns {level: number of buckets written}.
+    """
+    key = str(filter_id)
+    existing = {
+        level: read_parquet_if_exists(pyramid_path(level, region, key, pyramid_root))
+        for level in LEVELS
+    }
+
+    start = None
+    if since is not None and all(df is not None for df in existing.values()):
+        start = bucket_start(pd.Series([ensure_utc(since)]), "week").iloc[0]
+
+    raw = load_filter_history(key, region=region, root=root, start=start)
+    if raw is None or raw.empty:
+        return {}
+
+    written = {}
+    for level in LEVELS:
+        fresh = aggregate_level(raw, level)
+        old = existing[level]
+        if start is not None and old is not None and not old.empty:
+            old = old[pd.to_datetime(old["time"], utc=True) < fresh["time"].min()]
+            fresh = pd.concat([old, fresh], ignore_index=True)
+
+        fresh = fresh.sort_values("time").reset_index(drop=True)
+        write_atomic(pyramid_path(level, region, key, pyramid_root), to_parquet_bytes(fresh))
+        written[level] = len(fresh)
+    return written
+
+
+def choose_level(start, end, max_points: int | None) -> str | None:
+    """
+    Coarsest pyramid level that still yields at least `max_points` buckets
+    over [start, end]. None means raw 15-min data (the span is short enough,
+    or no target was given).
+    """
+    if max_points is None or start is None or end is None:
+        return None
+
+    span = ensure_utc(end) - ensure_utc(start)
+    if span / RAW_STEP <= max_points:
+        return None
+
+    for level in reversed(list(LEVELS)):
+        if span / LEVELS[level] >= max_points:
+            return level
+    return None
+
+
+@instrumented()
+def load_pyramid_level(
+    filter_id: str,
+    level: str,
+    start=None,
+    end=None,
+    region: str = "DE",
+    pyramid_root: Path = PYRAMID_ROOT,
+) -> pd.DataFrame:
+    """Read one level of one filter, optionally restricted to [start, end]."""
+    path = pyramid_path(level, region, str(filter_id), pyramid_root)
+    if not path.exists():
+        return pd.DataFrame(columns=["time"] + AGG_COLUMNS)
+
+    filters = []
+    if start is not None:
+        filters.append(("time", ">=", ensure_utc(start)))
+    if end is not None:
+        filters.append(("time", "<=", ensure_utc(end)))
+    df = pd.read_parquet(path, filters=filters or None)
+    df["time"] = pd.to_datetime(df["time"], utc=True)
+    return df
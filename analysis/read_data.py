@@ -2,7 +2,7 @@
 # %%
 from pathlib import Path
 import pandas as pd
-import sys 
+import sys
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent #__file__ is the path to the current file, .parent means we're targeting the file before
 if str(PROJECT_ROOT) not in sys.path:
@@ -11,24 +11,72 @@ if str(PROJECT_ROOT) not in sys.path:
 from power.fetch_power.parquet_convert import return_path, read_parquet_if_exists, drop_by_timecol
 from power.fetch_power.io_s3 import list_paths
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.state import ensure_utc
+from analysis.instrumentation import instrumented
 
 DATA_ROOT = PROJECT_ROOT / "data"
 REGION_CODE = "DE"
 
-def load_filter_history(filter_id: str, region: str = 'DE', root = PROJECT_ROOT) -> pd.DataFrame:
-    """Load all daily Parquet files for one filter_id into a single DataFrame."""
-    DATA_ROOT =  root / "data"
-    REGION_CODE = region
-    prefix = DATA_ROOT / f"region={REGION_CODE}" / f"filter={filter_id}"
+def list_partition_days(filter_id: str, region: str = 'DE', root = PROJECT_ROOT, data_root: Path | None = None) -> list[str]:
+    """Sorted list of the YYYY-MM-DD partitions stored for one filter_id.
+    `data_root` overrides root / "data" (e.g. for derived series stored under data/indicators)."""
+    if data_root is None:
+        data_root = root / "data"
+    prefix = data_root / f"region={region}" / f"filter={filter_id}"
 
     # list_paths(prefix) returns all paths under that prefix (as strings)
-    parts = sorted(
+    # the partition folder is the parent of data.parquet (works for / and \ separators)
+    return sorted(
         {
-            p.split("\\date=", 1)[1].split("\\", 1)[0] for p in list_paths(prefix) if "\\date=" in p
+            Path(p).parent.name.split("date=", 1)[1]
+            for p in list_paths(prefix)
+            if Path(p).parent.name.startswith("date=")
         }
-        
     )
 
+
+@instrumented()
+def load_filter_history(
+    filter_id: str,
+    region: str = 'DE',
+    root = PROJECT_ROOT,
+    start=None,
+    end=None,
+    data_root: Path | None = None,
+    days: list[str] | None = None,
+) -> pd.DataFrame:
+    """Load all daily Parquet files for one filter_id into a single DataFrame.
+
+    Optional `start` / `end` prune the daily partitions that are read (so
+    incremental jobs only open the last few days) and trim rows to [start, end].
+    `data_root` overrides root / "data" for derived series laid out the same way.
+    `days` are the partition days if the caller already listed them (chunked
+    readers call this many times per filter; the listing walks every partition).
+
+    With DATA_SERVICE_PORT set, lake series are served from the shared data
+    service (analysis/data_service.py) and only read from disk as a fallback.
+    """
+    if data_root is None and Path(root) == PROJECT_ROOT:
+        from analysis.data_service import fetch_from_service
+
+        served = fetch_from_service(filter_id, region=region, start=start, end=end)
+        if served is not None:
+            return served
+
+    DATA_ROOT =  root / "data" if data_root is None else Path(data_root)
+    REGION_CODE = region
+
+    parts = days if days is not None else list_partition_days(filter_id, region=REGION_CODE, data_root=DATA_ROOT)
+
+    start_ts = ensure_utc(start) if start is not None else None
+    end_ts = ensure_utc(end) if end is not None else None
+    if start_ts is not None:
+        start_day = start_ts.strftime("%Y-%m-%d")
+        parts = [day for day in parts if day >= start_day]
+    if end_ts is not None:
+        end_day = end_ts.strftime("%Y-%m-%d")
+        parts = [day for day in parts if day <= end_day]
+
     dfs = []
     for day in parts:
         path = return_path(root = DATA_ROOT, region = REGION_CODE, filter_id=filter_id, day=day)
@@ -49,6 +97,10 @@ def load_filter_history(filter_id: str, region: str = 'DE', root = PROJECT_ROOT)
     # all of the above is included in the function droop_by_timecol
     if "time_utc" in merged.columns:
         merged = drop_by_timecol(merged)
+        if start_ts is not None:
+            merged = merged[merged["time_utc"] >= start_ts]
+        if end_ts is not None:
+            merged = merged[merged["time_utc"] <= end_ts]
+        merged = merged.reset_index(drop=True)
 
     return merged
-
@@ -0,0 +1,136 @@
+# analysis/rolling_corr.py
+# %%
+
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.spread_cube import pair_name
+
+"""
+Rolling correlations for every zone pair in one vectorized pass.
+
+Input is a wide frame (time x zone) on the 15-min grid. For all pairs at
+once, the windowed sums of x, y, x^2, y^2, xy and the count of rows where
+both zones have a value are differences of cumulative sums, so any window
+length costs O(n * pairs) regardless of its size. Columns are centered on
+their mean first to keep the cumulative sums small.
+
+The exponentially weighted variant uses the same moments through one
+DataFrame.ewm() call over all pair columns.
+
+Output columns are pair names "A-B" (A < B), like the spread cube.
+"""
+
+
+def zone_pairs(zones: list[str]) -> list[tuple[str, str]]:
+    return list(itertools.combinations(sorted(zones), 2))
+
+
+def _pair_arrays(wide: pd.DataFrame) -> tuple[list[tuple[str, str]], np.ndarray, np.ndarray, np.ndarray]:
+    """(pairs, x, y, mask): (n, P) arrays, x / y centered and zeroed where either side is missing."""
+    pairs = zone_pairs(list(wide.columns))
+    values = wide.to_numpy(dtype=np.float64)
+    values = values - np.nanmean(values, axis=0)
+
+    col = {z: i for i, z in enumerate(wide.columns)}
+    ia = [col[a] for a, _ in pairs]
+    ib = [col[b] for _, b in pairs]
+    x, y = values[:, ia], values[:, ib]
+    mask = np.isfinite(x) & np.isfinite(y)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    return pairs, x, y, mask.astype(np.float64)
+
+
+def _window_sum(a: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sums over `window` rows via one cumulative sum (first rows: partial window)."""
+    c = np.cumsum(a, axis=0)
+    out = c.copy()
+    out[window:] -= c[:-window]
+    return out
+
+
+def _corr_from_moments(n, sx, sy, sxx, syy, sxy) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        corr = cov / np.sqrt(vx * vy)
+    # rounding can push |corr| a hair above 1
+    return np.clip(corr, -1.0, 1.0)
+
+
+def rolling_corr_all_pairs(
+    wide: pd.DataFrame,
+    window: int,
+    min_periods: int | None = None,
+) -> pd.DataFrame:
+    """
+    Rolling correlation of every zone pair over the last `window` rows of
+    `wide` (time x zone). Rows where a pair has fewer than `min_periods`
+    joint observations (default window // 2) are NaN.
+    """
+    if wide.shape[1] < 2 or wide.empty:
+        return pd.DataFrame(index=wide.index)
+    if min_periods is None:
+        min_periods = max(window // 2, 1)
+
+    pairs, x, y, mask = _pair_arrays(wide.sort_index())
+    n = _window_sum(mask, window)
+    corr = _corr_from_moments(
+        n,
+        _window_sum(x, window),
+        _window_sum(y, window),
+        _window_sum(x * x, window),
+        _window_sum(y * y, window),
+        _window_sum(x * y, window),
+    )
+    corr[n < max(min_periods, 2)] = np.nan
+    return pd.DataFrame(corr, index=wide.sort_index().index, columns=[pair_name(a, b) for a, b in pairs])
+
+
+def ew_corr_all_pairs(
+    wide: pd.DataFrame,
+    halflife: float,
+    min_periods: int = 2,
+) -> pd.DataFrame:
+    """
+    Exponentially weighted correlation of every zone pair (halflife in rows).
+    Weights only run over rows where both zones have a value.
+    """
+    if wide.shape[1] < 2 or wide.empty:
+        return pd.DataFrame(index=wide.index)
+
+    wide = wide.sort_index()
+    pairs, x, y, mask = _pair_arrays(wide)
+    P = len(pairs)
+
+    # one ewm() over all moment columns; NaN rows are skipped (ignore_na)
+    moments = np.concatenate([x, y, x * x, y * y, x * y], axis=1)
+    moments[np.tile(mask, 5) == 0] = np.nan
+    ew = pd.DataFrame(moments).ewm(halflife=halflife, min_periods=min_periods, ignore_na=True).mean().to_numpy()
+    mx, my, mxx, myy, mxy = (ew[:, k * P : (k + 1) * P] for k in range(5))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = (mxy - mx * my) / np.sqrt((mxx - mx * mx) * (myy - my * my))
+    corr = np.clip(corr, -1.0, 1.0)
+    return pd.DataFrame(corr, index=wide.index, columns=[pair_name(a, b) for a, b in pairs])
+
+
+def corr_matrix_at(pair_corr: pd.Series, zones: list[str]) -> pd.DataFrame:
+    """Square zone x zone matrix from one row of pair correlations."""
+    mat = pd.DataFrame(np.eye(len(zones)), index=zones, columns=zones)
+    for a, b in zone_pairs(zones):
+        name = pair_name(a, b)
+        if name in pair_corr.index:
+            mat.loc[a, b] = mat.loc[b, a] = pair_corr[name]
+    mat.index.name = "zone"
+    return mat
@@ -0,0 +1,373 @@
+# analysis/sarimax_grid.py
+# %%
+
+import hashlib
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.sarimax_service import build_design
+
+"""
+Parallel SARIMAX grid search.
+
+Candidates = orders x exog subsets x lag depths x Fourier orders. AIC / BIC
+are only comparable on the same observations, so every candidate is fitted
+on one common sample: the rows valid for the widest design (deepest lag,
+union of the exogs), which are valid for every candidate. The search runs in
+two rounds on a process pool:
+
+1. screening: every candidate is fitted on the most recent
+   `screen_frac` of the common sample (one timestamp cut for all) with a
+   small iteration cap and no covariance matrix (cov_type="none"), which is
+   enough to rank them by AIC;
+2. final: the best `keep_frac` of the candidates are refitted on the full
+   common sample, warm-started from their screening parameters.
+
+A time budget stops submitting new fits, cancels queued ones and terminates
+the workers of fits still running at the deadline, so the call returns on
+time. A memory budget caps the number of concurrent fits (and skips
+candidates that would not fit on their own). Without max_workers the pool
+uses the cores that are free (the search usually runs inside a JobQueue
+worker, next to other jobs). The result is an AIC/BIC leaderboard DataFrame.
+"""
+
+SCREEN_FRAC = 0.25
+SCREEN_MAXITER = 15
+FINAL_MAXITER = 50
+KEEP_FRAC = 0.25
+MIN_KEEP = 3
+
+DEFAULT_TIME_BUDGET_S = 120.0
+DEFAULT_MEMORY_BUDGET_MB = 2048.0
+
+
+def grid_candidates(
+    orders: list[tuple[int, int, int]],
+    exog_sets: list[list[str]],
+    lags: list[int],
+    fourier_orders: list[tuple[int, ...]],
+) -> list[dict]:
+    """Cartesian product of the grid axes as a list of candidate dicts."""
+    return [
+        {
+            "order": tuple(int(o) for o in order),
+            "exogs": list(exogs),
+            "max_lag": int(lag),
+            "fourier": tuple(int(k) for k in fourier),
+        }
+        for order, exogs, lag, fourier in itertools.product(orders, exog_sets, lags, fourier_orders)
+    ]
+
+
+def leave_one_out_sets(exogs: list[str]) -> list[list[str]]:
+    """The full exog set plus every subset with one variable removed."""
+    sets = [list(exogs)]
+    if len(exogs) > 1:
+        sets += [[c for c in exogs if c != drop] for drop in exogs]
+    return sets
+
+
+def estimate_fit_mb(nobs: int, candidate: dict) -> float:
+    """
+    Rough peak memory of one fit: the Kalman filter keeps per-observation
+    state means / covariances (k_states^2) plus the exog design matrix.
+    """
+    p, d, q = candidate["order"]
+    k_states = max(p, q + 1) + d
+    k_exog = len(candidate["exogs"]) * (candidate["max_lag"] + 1) + 2 * sum(candidate["fourier"])
+    per_obs = 8 * (6 * k_states * k_states + 4 * k_states + 3 * k_exog)
+    return nobs * per_obs / 1e6 + 50.0  # + interpreter / statsmodels baseline
+
+
+def free_cores() -> int:
+    """Cores available to this process minus the ones already busy (1-min load average)."""
+    try:
+        n_cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        n_cores = os.cpu_count() or 2
+    try:
+        busy = int(round(os.getloadavg()[0]))
+    except (AttributeError, OSError):  # no load average (Windows): leave one core for the caller
+        busy = 1
+    return max(n_cores - busy, 1)
+
+
+def common_sample(df: pd.DataFrame, target: str, candidates: list[dict]) -> pd.Index:
+    """Index of the rows every candidate's design has (deepest lag, union of the exogs)."""
+    exogs = list(dict.fromkeys(c for cand in candidates for c in cand["exogs"]))
+    max_lag = max((cand["max_lag"] for cand in candidates), default=0)
+    y, _ = build_design(df, target, exogs, max_lag)
+    return y.index
+
+
+def _stop_pool(pool: ProcessPoolExecutor, abandoned: bool) -> None:
+    """Close the pool; with `abandoned` fits still running, kill their workers instead of waiting."""
+    if not abandoned:
+        pool.shutdown(wait=True)
+        return
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for proc in processes:
+        if proc.is_alive():
+            proc.terminate()
+    for proc in processes:
+        proc.join(timeout=5)
+
+
+def _fit_candidate(
+    df: pd.DataFrame,
+    target: str,
+    candidate: dict,
+    index: pd.Index,
+    maxiter: int,
+    start_params: np.ndarray | None = None,
+) -> dict:
+    """Fit one candidate on the rows `index` in a worker; never raises (errors go into "status")."""
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    t0 = time.perf_counter()
+    out = {"candidate": candidate, "aic": np.nan, "bic": np.nan, "nobs": 0, "params": None}
+    try:
+        y, X = build_design(df, target, candidate["exogs"], candidate["max_lag"], candidate["fourier"])
+        y, X = y.loc[index], X.loc[index]
+
+        model = SARIMAX(
+            endog=y,
+            exog=X,
+            order=candidate["order"],
+            trend="c",
+            enforce_stationarity=False,
+            enforce_invertibility=False,
+        )
+        res = model.fit(start_params=start_params, disp=False, maxiter=maxiter, cov_type="none")
+        out.update(
+            aic=float(res.aic),
+            bic=float(res.bic),
+            nobs=int(res.nobs),
+            params=np.asarray(res.params),
+            converged=bool(res.mle_retvals.get("converged", False)) if res.mle_retvals else False,
+            status="ok",
+        )
+    except Exception as e:
+        out["status"] = f"failed: {type(e).__name__}: {e}"
+    out["seconds"] = time.perf_counter() - t0
+    return out
+
+
+def _run_round(
+    pool: ProcessPoolExecutor,
+    df: pd.DataFrame,
+    target: str,
+    jobs: list[tuple[int, dict, np.ndarray | None]],
+    index: pd.Index,
+    maxiter: int,
+    deadline: float,
+    max_in_flight: int,
+    on_done=None,
+) -> dict[int, dict]:
+    """
+    Run (id, candidate, start_params) jobs with at most max_in_flight fits in
+    the pool at once; stops submitting at the deadline and cancels the rest.
+    """
+    cand_by_id = {cid: cand for cid, cand, _ in jobs}
+    pending = list(jobs)
+    in_flight = {}
+    results = {}
+    while pending or in_flight:
+        while pending and len(in_flight) < max_in_flight and time.monotonic() < deadline:
+            cid, cand, start = pending.pop(0)
+            fut = pool.submit(_fit_candidate, df, target, cand, index, maxiter, start)
+            in_flight[fut] = cid
+        if not in_flight:
+            break
+
+        timeout = max(deadline - time.monotonic(), 0.0)
+        done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            cid = in_flight.pop(fut)
+            results[cid] = fut.result()
+            if on_done is not None:
+                on_done()
+
+        if time.monotonic() >= deadline:
+            # over budget: keep what finished, drop the rest (the workers of
+            # fits still running are terminated when the pool is stopped)
+            for fut, cid in in_flight.items():
+                fut.cancel()
+                results[cid] = {"candidate": cand_by_id[cid], "status": "skipped: time budget"}
+            for cid, cand, _ in pending:
+                results[cid] = {"candidate": cand, "status": "skipped: time budget"}
+            break
+    return results
+
+
+def run_grid_search(
+    df: pd.DataFrame,
+    target: str,
+    candidates: list[dict],
+    time_budget_s: float = DEFAULT_TIME_BUDGET_S,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+    max_workers: int | None = None,
+    screen_frac: float = SCREEN_FRAC,
+    keep_frac: float = KEEP_FRAC,
+    progress=None,
+) -> pd.DataFrame:
+    """
+    Screen all candidates, refit the best ones on the full sample and return
+    the leaderboard (sorted by final AIC, then screening AIC).
+    Columns: rank, order, exogs, max_lag, fourier, aic, bic, nobs,
+    screen_aic, round, seconds, status
+    """
+    deadline = time.monotonic() + time_budget_s
+
+    # one sample for all candidates, one timestamp cut for the screening slice
+    sample = common_sample(df, target, candidates)
+    screen_sample = sample[-max(int(len(sample) * screen_frac), 96):]
+    nobs = len(sample)
+
+    if max_workers is None:
+        max_workers = free_cores()
+
+    rows = {cid: {"candidate": cand} for cid, cand in enumerate(candidates)}
+    runnable = []
+    for cid, cand in enumerate(candidates):
+        if estimate_fit_mb(nobs, cand) > memory_budget_mb:
+            rows[cid]["status"] = "skipped: memory budget"
+        else:
+            runnable.append((cid, cand, None))
+
+    # concurrency bounded by the memory budget (final round = full sample, the larger one)
+    worst_mb = max((estimate_fit_mb(nobs, cand) for _, cand, _ in runnable), default=1.0)
+    n_workers = int(max(1, min(max_workers, memory_budget_mb // worst_mb)))
+
+    n_final = max(MIN_KEEP, int(np.ceil(len(runnable) * keep_frac)))
+    if progress is not None:
+        progress.update(
+            {"stage": "screening", "done": 0, "total": len(runnable) + min(n_final, len(runnable)), "workers": n_workers}
+        )
+
+    def _tick():
+        if progress is not None:
+            progress["done"] = progress.get("done", 0) + 1
+
+    # spawn: safe inside Streamlit and inside a JobQueue worker. Not a `with`
+    # block: leaving it would wait for fits still running past the deadline.
+    pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context("spawn"))
+    try:
+        screened = _run_round(
+            pool, df, target, runnable, screen_sample, SCREEN_MAXITER, deadline, n_workers, _tick
+        )
+        for cid, res in screened.items():
+            rows[cid]["screen"] = res
+            rows[cid]["status"] = res.get("status", "skipped")
+
+        ok = sorted(
+            (cid for cid, res in screened.items() if res.get("status") == "ok" and np.isfinite(res["aic"])),
+            key=lambda cid: screened[cid]["aic"],
+        )
+        survivors = ok[:n_final]
+        for cid in ok[n_final:]:
+            rows[cid]["status"] = "stopped after screening"
+
+        if progress is not None:
+            progress.update({"stage": "final fits", "total": progress.get("done", 0) + len(survivors)})
+
+        final = _run_round(
+            pool,
+            df,
+            target,
+            [(cid, candidates[cid], screened[cid]["params"]) for cid in survivors],
+            sample,
+            FINAL_MAXITER,
+            deadline,
+            n_workers,
+            _tick,
+        )
+        for cid, res in final.items():
+            rows[cid]["final"] = res
+            rows[cid]["status"] = res.get("status", "skipped")
+    finally:
+        _stop_pool(pool, abandoned=time.monotonic() >= deadline)
+
+    return _leaderboard(rows)
+
+
+def _leaderboard(rows: dict[int, dict]) -> pd.DataFrame:
+    records = []
+    for row in rows.values():
+        cand = row["candidate"]
+        screen = row.get("screen", {})
+        final = row.get("final")
+        best = final if final is not None and final.get("status") == "ok" else None
+        records.append(
+            {
+                "order": str(cand["order"]),
+                "exogs": ", ".join(cand["exogs"]),
+                "max_lag": cand["max_lag"],
+                "fourier": str(cand["fourier"]),
+                "aic": best["aic"] if best else np.nan,
+                "bic": best["bic"] if best else np.nan,
+                "nobs": best["nobs"] if best else np.nan,
+                "screen_aic": screen.get("aic", np.nan),
+                "round": "final" if best else ("screening" if screen.get("status") == "ok" else "-"),
+                "seconds": (screen.get("seconds") or 0.0) + ((final or {}).get("seconds") or 0.0),
+                "status": row.get("status", "skipped"),
+            }
+        )
+
+    board = pd.DataFrame.from_records(records)
+    if board.empty:
+        return board
+    # AIC / BIC rank fits of the same observations only
+    assert board["nobs"].dropna().nunique() <= 1, "final fits differ in nobs"
+    board = board.sort_values(["aic", "screen_aic"], na_position="last").reset_index(drop=True)
+    board.insert(0, "rank", np.where(board["aic"].notna(), np.arange(1, len(board) + 1), np.nan))
+    return board
+
+
+def grid_request_key(df: pd.DataFrame, target: str, candidates: list[dict], **budgets) -> str:
+    """Stable hash of a grid-search request (data, target, candidates, budgets)."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    h.update(repr((target, candidates, sorted(budgets.items()))).encode())
+    return "sarimax-grid-" + h.hexdigest()
+
+
+def submit_grid_search(
+    queue,
+    df: pd.DataFrame,
+    target: str,
+    candidates: list[dict],
+    time_budget_s: float = DEFAULT_TIME_BUDGET_S,
+    memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+) -> str:
+    """Run the search as one JobQueue job (it opens its own pool); returns the job key."""
+    key = grid_request_key(
+        df, target, candidates, time_budget_s=time_budget_s, memory_budget_mb=memory_budget_mb
+    )
+    return queue.submit(
+        key,
+        run_grid_search,
+        df,
+        target,
+        candidates,
+        time_budget_s=time_budget_s,
+        memory_budget_mb=memory_budget_mb,
+    )
@@ -0,0 +1,234 @@
+# analysis/sarimax_service.py
+# %%
+
+import hashlib
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.de_features import add_lags
+from analysis.seasonality import fourier_basis
+from analysis.model_cache import MODEL_CACHE_ROOT, load_cached_model, load_cached_result, save_cached_model
+
+"""
+SARIMAX fits as background jobs.
+
+The page builds (y, X, order) as before, then submits `fit_sarimax_job`
+to a JobQueue (analysis/job_queue.py) under `fit_request_key(...)`, so the
+same (data, order, exog) request from any session maps to one fit. The job
+reports optimizer iterations through its progress dict and returns a plain,
+picklable dict with everything the page renders.
+
+With a model `spec` (see model_spec), fits are also persisted in the model
+cache (analysis/model_cache.py): the same spec on the same data is returned
+without fitting, and on newer data the optimizer is warm-started from the
+cached parameters (or, with reoptimize=False, the cached parameters are
+only re-filtered over the new sample).
+"""
+
+MAXITER = 50  # statsmodels MLEModel.fit default
+
+
+def fit_request_key(
+    y: pd.Series,
+    X: pd.DataFrame,
+    order: tuple[int, int, int],
+    forecast_steps: int = 0,
+) -> str:
+    """Stable hash of the fit request: data (values + index), exog columns, order, horizon."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    h.update(repr((list(X.columns), tuple(int(o) for o in order), int(forecast_steps))).encode())
+    return "sarimax-" + h.hexdigest()
+
+
+def build_design(
+    df: pd.DataFrame,
+    target: str,
+    exogs: list[str],
+    max_lag: int = 0,
+    fourier: tuple[int, ...] = (0, 0, 0),
+) -> tuple[pd.Series, pd.DataFrame]:
+    """
+    (y, X) for one specification: exogs plus their lags 1..max_lag, then
+    (daily, weekly[, yearly]) Fourier orders of the timestamp-anchored
+    seasonality basis, NaN rows dropped.
+    """
+    df_model = df[[target] + list(exogs)].copy()
+    if max_lag > 0:
+        df_model = add_lags(df_model, list(exogs), max_lag)
+
+    # Drop rows with NaNs introduced by lags
+    df_model = df_model.dropna()
+    y = df_model[target]
+    X = df_model.drop(columns=[target])
+
+    terms = fourier_basis(y.index, *fourier)
+    if not terms.empty:
+        # float64 like the other regressors (statsmodels works in float64)
+        X = X.join(terms.astype(np.float64))
+
+    # Ensure alignment and no NaNs
+    data = pd.concat([y, X], axis=1).dropna()
+    return data[target], data.drop(columns=[target])
+
+
+def model_spec(
+    feature_version: int,
+    window_days: int,
+    target: str,
+    order: tuple[int, int, int],
+    exogs: list[str],
+    max_lag: int,
+    fourier: tuple[int, ...],
+) -> dict:
+    """Identity of a model in the cache: everything but the data itself."""
+    return {
+        "feature_version": int(feature_version),
+        "window_days": int(window_days),
+        "target": target,
+        "order": [int(o) for o in order],
+        "exogs": sorted(exogs),
+        "max_lag": int(max_lag),
+        "fourier": [int(k) for k in fourier],
+    }
+
+
+def _forecast_index(index: pd.DatetimeIndex, steps: int) -> pd.DatetimeIndex:
+    freq = pd.infer_freq(index) or "15min"
+    start = index[-1] + pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+    return pd.date_range(start=start, periods=steps, freq=freq)
+
+
+def summarize_results(res, y: pd.Series, X: pd.DataFrame, forecast_steps: int = 0) -> dict:
+    """Picklable summary of a SARIMAXResults for the page."""
+    out = {
+        "aic": float(res.aic),
+        "bic": float(res.bic),
+        "summary": res.summary().as_text(),
+        "params": res.params,
+        "exog_names": list(X.columns),
+        "fitted": pd.Series(np.asarray(res.fittedvalues), index=y.index),
+        "actual": y,
+        "forecast": None,
+        "forecast_error": None,
+        "nobs": int(res.nobs),
+    }
+
+    # Simple forecast (flat exog assumption)
+    if forecast_steps > 0:
+        exog_future = pd.concat([X.iloc[-1:]] * forecast_steps, ignore_index=True)
+        try:
+            mean = res.get_forecast(steps=forecast_steps, exog=exog_future).predicted_mean
+            out["forecast"] = pd.Series(np.asarray(mean), index=_forecast_index(y.index, forecast_steps))
+        except Exception as e:
+            out["forecast_error"] = str(e)
+    return out
+
+
+def _warm_start_params(cached: dict | None, param_names: list[str]) -> np.ndarray | None:
+    """Cached parameters in the model's order, if they cover exactly the same names."""
+    if cached is None:
+        return None
+    params = cached["params"]
+    if sorted(params.index) != sorted(param_names):
+        return None
+    return params.reindex(param_names).to_numpy(dtype=np.float64)
+
+
+def fit_sarimax_job(
+    y: pd.Series,
+    X: pd.DataFrame,
+    order: tuple[int, int, int],
+    forecast_steps: int = 0,
+    spec: dict | None = None,
+    reoptimize: bool = True,
+    cache_root: Path = MODEL_CACHE_ROOT,
+    progress=None,
+) -> dict:
+    """Worker-side SARIMAX fit (runs in a JobQueue process)."""
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+
+    if progress is not None:
+        progress.update({"stage": "checking model cache", "iteration": 0, "maxiter": MAXITER})
+
+    data_key = fit_request_key(y, X, order, forecast_steps)
+    cached = None
+    if spec is not None:
+        hit = load_cached_result(spec, cache_root)
+        # a filtered-only entry does not answer a request to re-optimize
+        if (
+            hit is not None
+            and hit.get("data_key") == data_key
+            and (not reoptimize or hit.get("fit_mode") != "filtered")
+        ):
+            return {**hit, "fit_mode": "cached"}
+        cached = load_cached_model(spec, cache_root)
+
+    if progress is not None:
+        progress["stage"] = "building model"
+
+    model = SARIMAX(
+        endog=y,
+        exog=X,
+        order=tuple(int(o) for o in order),
+        trend="c",
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+    )
+
+    def _callback(_params):
+        if progress is not None:
+            progress["iteration"] = progress.get("iteration", 0) + 1
+
+    start_params = _warm_start_params(cached, list(model.param_names))
+    if start_params is not None and not reoptimize:
+        # keep the cached parameters, just run the filter over the new sample
+        if progress is not None:
+            progress["stage"] = "filtering with cached parameters"
+        res = model.smooth(start_params)
+        fit_mode = "filtered"
+    else:
+        if progress is not None:
+            progress["stage"] = "fitting (warm start)" if start_params is not None else "fitting"
+        res = model.fit(start_params=start_params, disp=False, maxiter=MAXITER, callback=_callback)
+        fit_mode = "warm" if start_params is not None else "cold"
+
+    if progress is not None:
+        progress["stage"] = "summarizing"
+    out = summarize_results(res, y, X, forecast_steps)
+    out["data_key"] = data_key
+    out["fit_mode"] = fit_mode
+
+    if spec is not None:
+        save_cached_model(spec, data_key, res.params, y.index, out, cache_root)
+    return out
+
+
+def submit_sarimax_fit(
+    queue,
+    y: pd.Series,
+    X: pd.DataFrame,
+    order: tuple[int, int, int],
+    forecast_steps: int = 0,
+    spec: dict | None = None,
+    reoptimize: bool = True,
+) -> str:
+    """Submit (or join an identical running) fit; returns the job key."""
+    key = fit_request_key(y, X, order, forecast_steps)
+    if not reoptimize:
+        key += "-filtered"
+    return queue.submit(
+        key, fit_sarimax_job, y, X, tuple(order), forecast_steps, spec=spec, reoptimize=reoptimize
+    )
@@ -0,0 +1,132 @@
+# analysis/seasonality.py
+# %%
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+"""
+Fourier seasonality basis on the absolute UTC 15-min grid.
+
+The phase of every term is taken from the timestamp itself (quarter-hours
+since 1970-01-01 UTC), not from the row position, so samples with gaps
+(dropped NaN rows, missing days) keep the right daily / weekly / yearly
+phase and two models see the same values for the same quarter-hour.
+
+The basis (MAX_ORDERS terms of every period, float32) is computed once per
+calendar year of the grid and kept in memory; fourier_basis() slices the
+requested columns for any index by position.
+"""
+
+STEP = pd.Timedelta(minutes=15)
+EPOCH = pd.Timestamp("1970-01-01", tz="UTC")
+
+# period length in quarter-hours
+PERIODS = {
+    "daily": 96,
+    "weekly": 96 * 7,
+    "yearly": int(96 * 365.25),
+}
+MAX_ORDERS = {"daily": 6, "weekly": 4, "yearly": 4}
+
+_YEAR_BLOCKS: dict[int, np.ndarray] = {}
+
+
+def basis_columns() -> list[str]:
+    """Column order of the cached blocks: sin/cos per period and order."""
+    cols = []
+    for name, period in PERIODS.items():
+        for k in range(1, MAX_ORDERS[name] + 1):
+            cols += [f"sin_{period}_{k}", f"cos_{period}_{k}"]
+    return cols
+
+
+_COLUMNS = basis_columns()
+_COLUMN_POS = {c: i for i, c in enumerate(_COLUMNS)}
+
+
+def quarter_hours_since_epoch(index: pd.DatetimeIndex) -> np.ndarray:
+    """Whole quarter-hours between 1970-01-01 UTC and each (UTC) timestamp."""
+    return np.asarray((pd.DatetimeIndex(index) - EPOCH) // STEP, dtype=np.int64)
+
+
+def _compute(t: np.ndarray) -> np.ndarray:
+    """(n, len(_COLUMNS)) float32 basis for quarter-hour counters t (int or fractional)."""
+    out = np.empty((len(t), len(_COLUMNS)), dtype=np.float32)
+    j = 0
+    for name, period in PERIODS.items():
+        # reduce modulo the period first: exact phase, no large-argument loss
+        phase = 2 * np.pi * np.mod(t, period) / period
+        for k in range(1, MAX_ORDERS[name] + 1):
+            out[:, j] = np.sin(k * phase)
+            out[:, j + 1] = np.cos(k * phase)
+            j += 2
+    return out
+
+
+def _year_block(year: int) -> tuple[int, np.ndarray]:
+    """(first quarter-hour counter of the year, cached basis block of the year)."""
+    t0 = int((pd.Timestamp(f"{year}-01-01", tz="UTC") - EPOCH) // STEP)
+    if year not in _YEAR_BLOCKS:
+        t1 = int((pd.Timestamp(f"{year + 1}-01-01", tz="UTC") - EPOCH) // STEP)
+        _YEAR_BLOCKS[year] = _compute(np.arange(t0, t1, dtype=np.int64))
+    return t0, _YEAR_BLOCKS[year]
+
+
+def fourier_columns(daily: int = 0, weekly: int = 0, yearly: int = 0) -> list[str]:
+    orders = {"daily": daily, "weekly": weekly, "yearly": yearly}
+    cols = []
+    for name, period in PERIODS.items():
+        order = int(orders[name])
+        if order > MAX_ORDERS[name]:
+            raise ValueError(f"{name} Fourier order {order} > {MAX_ORDERS[name]}")
+        for k in range(1, order + 1):
+            cols += [f"sin_{period}_{k}", f"cos_{period}_{k}"]
+    return cols
+
+
+def fourier_basis(
+    index: pd.DatetimeIndex,
+    daily: int = 0,
+    weekly: int = 0,
+    yearly: int = 0,
+) -> pd.DataFrame:
+    """
+    float32 sin/cos terms (columns sin_<period>_<k>, cos_<period>_<k>) for
+    every timestamp of `index`, sliced from the cached yearly blocks.
+    Timestamps off the 15-min grid are computed directly.
+    """
+    cols = fourier_columns(daily, weekly, yearly)
+    index = pd.DatetimeIndex(index)
+    if not cols or len(index) == 0:
+        return pd.DataFrame(index=index)
+
+    col_pos = np.array([_COLUMN_POS[c] for c in cols])
+    utc = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    t = quarter_hours_since_epoch(utc)
+    on_grid = np.asarray(utc == utc.floor(STEP))
+
+    out = np.empty((len(index), len(cols)), dtype=np.float32)
+    years = utc.year.to_numpy()
+    for year in np.unique(years[on_grid]):
+        rows = np.flatnonzero(on_grid & (years == year))
+        t0, block = _year_block(int(year))
+        pos = t[rows] - t0
+        if np.all(np.diff(pos) == 1):
+            # sorted, gap-free, no duplicates: plain slice of the cached block
+            out[rows] = block[pos[0] : pos[-1] + 1, col_pos]
+        else:
+            out[rows] = block[np.ix_(pos, col_pos)]
+
+    if not on_grid.all():
+        rows = np.flatnonzero(~on_grid)
+        exact = np.asarray((utc[rows] - EPOCH) / STEP, dtype=np.float64)  # fractional quarter-hours
+        out[rows] = _compute(exact)[:, col_pos]
+
+    return pd.DataFrame(out, index=index, columns=cols)
@@ -0,0 +1,160 @@
+# analysis/snapshot.py
+# %%
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import load_filter_history, list_partition_days
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
+from power.fetch_power.smard_filters import FILTER_GROUPS
+
+"""
+Latest-values snapshot per region for the overview page.
+
+data/snapshot/region=<R>/latest.parquet holds the last SNAPSHOT_QUARTERS
+quarter-hours of every filter (kind="series") plus a few derived KPIs at the
+latest quarter-hour where their inputs are published (kind="kpi"). The
+ingest jobs replace the rows of the filters they wrote and recompute the
+KPIs; the file is rewritten atomically, so the page reads one small parquet
+file instead of whole histories.
+"""
+
+SNAPSHOT_ROOT = PROJECT_ROOT / "data" / "snapshot"
+SNAPSHOT_QUARTERS = 96  # last day, enough for today's intraday profile
+STEP = pd.Timedelta(minutes=15)
+
+SNAPSHOT_COLUMNS = ["key", "kind", "group", "label", "time_utc", "value"]
+
+GROUP_BY_FILTER_ID = {fid: group for group, filters in FILTER_GROUPS.items() for fid in filters}
+
+WIND_SOLAR_FILTER_IDS = ["1225", "4067", "4068"]
+RENEWABLE_FILTER_IDS = ["1225", "1226", "1228", "4066", "4067", "4068"]
+LOAD_FILTER_ID = "410"
+RESIDUAL_LOAD_FILTER_ID = "4359"
+
+KPI_LABELS = {
+    "total_generation": "Total generation (MW)",
+    "residual_load": "Residual load (MW)",
+    "res_share": "Renewables share of generation",
+}
+
+
+def snapshot_path(region: str = "DE", root: Path = SNAPSHOT_ROOT) -> Path:
+    return Path(root) / f"region={region}" / "latest.parquet"
+
+
+def _latest_rows(filter_id: str, region: str, root: Path, n: int) -> pd.DataFrame:
+    """Last `n` quarter-hours of one filter, reading only the newest partitions."""
+    data_root = Path(root) / "data"
+    days = list_partition_days(filter_id, region=region, data_root=data_root)
+    if not days:
+        return pd.DataFrame()
+    # partitions hold at most one day: n quarter-hours span at most n // 96 + 2 of them
+    first_day = days[max(len(days) - (n // 96 + 2), 0)]
+    # straight from disk (never the data service): this runs right after the ingest wrote
+    df = load_filter_history(filter_id, region=region, start=first_day, data_root=data_root)
+    if df.empty or "value" not in df.columns:
+        return pd.DataFrame()
+    df = df.dropna(subset=["value"])
+    cutoff = pd.to_datetime(df["time_utc"], utc=True).max() - (n - 1) * STEP
+    return df[pd.to_datetime(df["time_utc"], utc=True) >= cutoff]
+
+
+def compute_kpis(series: pd.DataFrame) -> pd.DataFrame:
+    """KPI rows from the series rows of a snapshot."""
+    if series.empty:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    wide = series.pivot_table(index="time_utc", columns="key", values="value", aggfunc="last").sort_index()
+
+    gen_ids = [fid for fid in FILTER_GROUPS["generation"] if fid in wide.columns]
+    kpis = {}
+    if gen_ids:
+        # series silent for more than a day (e.g. nuclear since 2023) are out of the mix;
+        # of the others take the latest quarter-hour they all published (they arrive with different lags)
+        last = wide[gen_ids].apply(pd.Series.last_valid_index)
+        newest = last.max()
+        fresh = [fid for fid in gen_ids if last[fid] >= newest - pd.Timedelta(days=1)]
+        complete = wide.loc[wide.index > newest - pd.Timedelta(days=1), fresh].dropna()
+        if not complete.empty:
+            t = complete.index[-1]
+            total = complete.iloc[-1].sum()
+            kpis["total_generation"] = (t, total)
+            renewables = [fid for fid in RENEWABLE_FILTER_IDS if fid in fresh]
+            if total > 0 and renewables:
+                kpis["res_share"] = (t, complete.iloc[-1][renewables].sum() / total)
+
+    if RESIDUAL_LOAD_FILTER_ID in wide.columns and wide[RESIDUAL_LOAD_FILTER_ID].notna().any():
+        col = wide[RESIDUAL_LOAD_FILTER_ID].dropna()
+        kpis["residual_load"] = (col.index[-1], col.iloc[-1])
+    elif LOAD_FILTER_ID in wide.columns:
+        # fallback residual load ≈ total load − wind − solar (as in de_features)
+        ws = [fid for fid in WIND_SOLAR_FILTER_IDS if fid in wide.columns]
+        residual = (wide[LOAD_FILTER_ID] - wide[ws].sum(axis=1, min_count=len(ws))).dropna() if ws else pd.Series(dtype=float)
+        if not residual.empty:
+            kpis["residual_load"] = (residual.index[-1], residual.iloc[-1])
+
+    return pd.DataFrame(
+        [
+            {"key": name, "kind": "kpi", "group": "kpi", "label": KPI_LABELS[name], "time_utc": t, "value": float(v)}
+            for name, (t, v) in kpis.items()
+        ],
+        columns=SNAPSHOT_COLUMNS,
+    )
+
+
+def load_snapshot(region: str = "DE", root: Path = SNAPSHOT_ROOT) -> pd.DataFrame:
+    df = read_parquet_if_exists(snapshot_path(region, root))
+    if df is None:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    return df
+
+
+def update_snapshot(
+    filter_ids,
+    region: str = "DE",
+    n: int = SNAPSHOT_QUARTERS,
+    root: Path = PROJECT_ROOT,
+    snapshot_root: Path = SNAPSHOT_ROOT,
+) -> pd.DataFrame:
+    """
+    Replace the series rows of `filter_ids` with their last `n` quarter-hours
+    from the lake, recompute the KPIs and rewrite the snapshot. Returns it.
+    """
+    filter_ids = [str(fid) for fid in filter_ids]
+    snap = load_snapshot(region, snapshot_root)
+    series = snap[(snap["kind"] == "series") & ~snap["key"].isin(filter_ids)]
+
+    frames = [series] if not series.empty else []
+    for filter_id in filter_ids:
+        rows = _latest_rows(filter_id, region, root, n)
+        if rows.empty:
+            continue
+        group = GROUP_BY_FILTER_ID.get(filter_id, "")
+        frames.append(
+            pd.DataFrame(
+                {
+                    "key": filter_id,
+                    "kind": "series",
+                    "group": group,
+                    "label": FILTER_GROUPS.get(group, {}).get(filter_id, filter_id),
+                    "time_utc": pd.DatetimeIndex(pd.to_datetime(rows["time_utc"], utc=True)),
+                    "value": rows["value"].to_numpy(dtype=np.float64),
+                }
+            )
+        )
+
+    series = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    series["time_utc"] = pd.to_datetime(series["time_utc"], utc=True)
+    snap = pd.concat([series, compute_kpis(series)], ignore_index=True)[SNAPSHOT_COLUMNS]
+    snap["time_utc"] = pd.to_datetime(snap["time_utc"], utc=True)
+    snap["value"] = snap["value"].astype(np.float64)
+    write_atomic(snapshot_path(region, snapshot_root), to_parquet_bytes(snap))
+    return snap
@@ -0,0 +1,245 @@
+# analysis/spread_cube.py
+# %%
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.market_price import load_prices_with_returns, filter_by_window
+from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.state import ensure_utc
+from analysis.instrumentation import instrumented
+
+"""
+Materialized spread cube.
+
+Instead of pivoting the long price frame and subtracting one reference zone on
+every selectbox change, the stats pipeline stores
+
+    spread "A-B" = price(A) - price(B)
+
+for every zone pair A < B on the common 15-min time grid (float32, one column
+per pair) plus hour-of-day spread aggregates per window. "B-A" is simply the
+negated "A-B" column, so changing the reference zone is a column lookup.
+"""
+
+SPREAD_CUBE_PATH = PROJECT_ROOT / "data" / "stats" / "spread_cube.parquet"
+SPREAD_HOURLY_PATH = PROJECT_ROOT / "data" / "stats" / "spread_hourly.parquet"
+
+HOURLY_WINDOWS = ["7D", "30D", "90D", "1Y"]  # deep-dive windows
+
+# re-derive the last few hours on each update (late / corrected prices)
+OVERLAP_HOURS = 2
+
+
+def pair_name(zone_a: str, zone_b: str) -> str:
+    return f"{zone_a}-{zone_b}"
+
+
+def cube_zones(cube: pd.DataFrame) -> list[str]:
+    """Zones present in a cube, recovered from its pair columns."""
+    zones = set()
+    for col in cube.columns:
+        if col == "time":
+            continue
+        a, b = col.split("-", 1)
+        zones.update([a, b])
+    return sorted(zones)
+
+
+def build_spread_cube(prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Wide DataFrame: time + one float32 column per zone pair "A-B" (A < B).
+    `prices` is the long frame from load_prices_with_returns (time, zone, price).
+    """
+    if prices.empty:
+        return pd.DataFrame(columns=["time"])
+
+    wide = (
+        prices
+        .pivot_table(index="time", columns="zone", values="price", aggfunc="last")
+        .sort_index()
+    )
+    zones = sorted(wide.columns)
+    wide = wide[zones]
+
+    values = wide.to_numpy(dtype=np.float64)
+    i_idx, j_idx = np.triu_indices(len(zones), k=1)
+    spreads = (values[:, i_idx] - values[:, j_idx]).astype(np.float32)
+
+    cube = pd.DataFrame(
+        spreads,
+        index=wide.index,
+        columns=[pair_name(zones[i], zones[j]) for i, j in zip(i_idx, j_idx)],
+    )
+    cube.index.name = "time"
+    return cube.reset_index()
+
+
+def compute_hourly_spread_stats(
+    cube: pd.DataFrame,
+    windows: list[str] = HOURLY_WINDOWS,
+) -> pd.DataFrame:
+    """
+    Hour-of-day aggregates per pair and window.
+    Returns long DataFrame: window, pair, hour, mean, median, count
+    """
+    cols = ["window", "pair", "hour", "mean", "median", "count"]
+    if cube.empty or len(cube.columns) <= 1:
+        return pd.DataFrame(columns=cols)
+
+    frames = []
+    for w in windows:
+        cube_w = filter_by_window(cube, w)
+        if cube_w.empty:
+            continue
+        long = cube_w.melt(id_vars="time", var_name="pair", value_name="spread").dropna()
+        long["hour"] = long["time"].dt.hour
+        stats = (
+            long.groupby(["pair", "hour"])["spread"]
+            .agg(["mean", "median", "count"])
+            .reset_index()
+        )
+        stats.insert(0, "window", w)
+        frames.append(stats)
+
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    return pd.concat(frames, ignore_index=True)[cols]
+
+
+def update_spread_cube(
+    root: Path = PROJECT_ROOT,
+    cube_path: Path = SPREAD_CUBE_PATH,
+    hourly_path: Path = SPREAD_HOURLY_PATH,
+    end=None,
+    rebuild: bool = False,
+) -> pd.DataFrame:
+    """
+    Extend the stored cube with prices newer than its last timestamp
+    (minus OVERLAP_HOURS), then refresh the hour-of-day aggregates.
+    A full rebuild happens on `rebuild=True`, when no cube exists yet, or
+    when the set of zones changed.
+    """
+    cube_old = None if rebuild else read_parquet_if_exists(Path(cube_path))
+
+    start = None
+    if cube_old is not None and not cube_old.empty:
+        start = pd.to_datetime(cube_old["time"], utc=True).max() - pd.Timedelta(hours=OVERLAP_HOURS)
+
+    prices = load_prices_with_returns(root=root, start=start, end=end)
+    cube_new = build_spread_cube(prices)
+
+    if start is not None and cube_zones(cube_new) and cube_zones(cube_new) != cube_zones(cube_old):
+        # new / removed zone: pair columns change -> rebuild from scratch
+        return update_spread_cube(root, cube_path, hourly_path, end=end, rebuild=True)
+
+    if start is not None:
+        cube_old = cube_old[cube_old["time"] < cube_new["time"].min()] if not cube_new.empty else cube_old
+        cube = pd.concat([cube_old, cube_new], ignore_index=True)
+    else:
+        cube = cube_new
+
+    if cube.empty:
+        return cube
+
+    cube = cube.sort_values("time").drop_duplicates("time", keep="last").reset_index(drop=True)
+    write_atomic(cube_path, to_parquet_bytes(cube))
+
+    hourly = compute_hourly_spread_stats(cube)
+    write_atomic(hourly_path, to_parquet_bytes(hourly))
+    return cube
+
+
+@instrumented()
+def load_spread_cube(
+    cube_path: Path = SPREAD_CUBE_PATH,
+    start=None,
+) -> pd.DataFrame:
+    """Read the stored cube (optionally only rows >= start); empty if not built yet."""
+    path = Path(cube_path)
+    if not path.exists():
+        return pd.DataFrame(columns=["time"])
+    filters = [("time", ">=", ensure_utc(start))] if start is not None else None
+    cube = pd.read_parquet(path, filters=filters)
+    cube["time"] = pd.to_datetime(cube["time"], utc=True)
+    return cube
+
+
+def load_hourly_spread_stats(hourly_path: Path = SPREAD_HOURLY_PATH) -> pd.DataFrame:
+    """Read the stored hour-of-day spread aggregates; empty if not built yet."""
+    df = read_parquet_if_exists(Path(hourly_path))
+    if df is None:
+        return pd.DataFrame(columns=["window", "pair", "hour", "mean", "median", "count"])
+    return df
+
+
+def spreads_vs(
+    cube: pd.DataFrame,
+    ref_zone: str,
+    zones: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Spreads vs reference zone from the cube, same shape as compute_spreads:
+    long DataFrame with time, zone, spread (zone != ref_zone).
+    """
+    available = cube_zones(cube)
+    if ref_zone not in available:
+        raise ValueError(f"Reference zone {ref_zone!r} not in spread cube.")
+
+    if zones is None:
+        zones = available
+
+    data = {}
+    for z in zones:
+        if z == ref_zone or z not in available:
+            continue
+        col = pair_name(z, ref_zone)
+        if col in cube.columns:
+            data[z] = cube[col]
+        else:
+            data[z] = -cube[pair_name(ref_zone, z)]
+
+    if not data:
+        return pd.DataFrame(columns=["time", "zone", "spread"])
+
+    wide = pd.DataFrame(data)
+    wide.insert(0, "time", cube["time"])
+    return (
+        wide
+        .melt(id_vars="time", var_name="zone", value_name="spread")
+        .sort_values(["zone", "time"])
+        .reset_index(drop=True)
+    )
+
+
+def hourly_spreads_vs(
+    hourly: pd.DataFrame,
+    zone: str,
+    ref_zone: str,
+    window: str,
+) -> pd.DataFrame:
+    """
+    Precomputed hour-of-day stats for spread(zone) - spread(ref_zone) in `window`.
+    Returns hour, mean, median, count (empty if not available).
+    """
+    cols = ["hour", "mean", "median", "count"]
+    if hourly is None or hourly.empty:
+        return pd.DataFrame(columns=cols)
+
+    hourly_w = hourly[hourly["window"] == window]
+    direct = hourly_w[hourly_w["pair"] == pair_name(zone, ref_zone)]
+    if not direct.empty:
+        return direct[cols].sort_values("hour").reset_index(drop=True)
+
+    flipped = hourly_w[hourly_w["pair"] == pair_name(ref_zone, zone)][cols].copy()
+    flipped["mean"] = -flipped["mean"]
+    flipped["median"] = -flipped["median"]
+    return flipped.sort_values("hour").reset_index(drop=True)
@@ -0,0 +1,518 @@
+# analysis/streaming_indicators.py
+# %%
+
+import json
+import math
+import os
+import sys
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import load_filter_history
+from analysis.market_price import ZONE_BY_FILTER_ID
+from power.fetch_power.parquet_convert import merge_incoming_data
+from analysis.instrumentation import instrumented
+
+"""
+Streaming versions of add_technical_indicators / add_rolling_volatility.
+
+Instead of recomputing EMAs and rolling windows from the start of the
+dashboard window on every render, the ingest job keeps one IndicatorState per
+zone (EMA values, ring buffers for the rolling windows, RSI gain/loss windows),
+advances it in O(1) per new quarter-hour and writes the indicator series to
+data/indicators/region=DE/filter=<id>/date=<YYYY-MM-DD>/data.parquet,
+i.e. right next to the raw prices and with the same layout.
+
+Re-fetched overlap rows can revise prices the state has already consumed. So
+each state also keeps a checkpoint (its state INDICATOR_REWIND_HOURS ago) and
+the prices it consumed since. A revision rewinds to the checkpoint and
+replays, and the rebuilt tail is rewritten. A revision older than the
+checkpoint rebuilds the zone from the lake.
+
+Periods and min_periods match add_technical_indicators / add_rolling_volatility.
+"""
+
+INDICATOR_ROOT = PROJECT_ROOT / "data" / "indicators"
+INDICATOR_STATE_PATH = PROJECT_ROOT / "state" / "indicator_state.json"
+# how far back revised prices can be replayed without a full rebuild;
+# must exceed the ingest overlap (incremental.OVERLAP_HOURS)
+INDICATOR_REWIND_HOURS = int(os.environ.get("INDICATOR_REWIND_HOURS", "24"))
+
+# rolling means of losses drift by ~1e-15 when they should be exactly 0 (prices
+# have two decimals, so a real average loss is >= 0.01 / rsi_period)
+RSI_ZERO_TOL = 1e-9
+
+INDICATOR_COLUMNS = [
+    "price",
+    "return",
+    "ma_short",
+    "ma_long",
+    "rsi",
+    "macd",
+    "macd_signal",
+    "bb_upper",
+    "bb_lower",
+    "rolling_std",
+]
+
+
+def _is_valid(x) -> bool:
+    return x is not None and math.isfinite(x)
+
+
+class RollingWindow:
+    """
+    Fixed-size ring buffer with running sum / sum of squares.
+    Mirrors pandas .rolling(size, min_periods): the window spans `size` rows,
+    missing (NaN / inf) values take a slot but are not counted.
+    """
+
+    def __init__(self, size: int, values=None):
+        self.size = int(size)
+        self.buf = deque(maxlen=self.size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.count = 0
+        self._pushes = 0
+        for v in values or []:
+            self.push(v)
+
+    def push(self, x) -> None:
+        if len(self.buf) == self.size:
+            old = self.buf[0]
+            if _is_valid(old):
+                self.total -= old
+                self.total_sq -= old * old
+                self.count -= 1
+        x = float(x) if _is_valid(x) else None
+        self.buf.append(x)
+        if x is not None:
+            self.total += x
+            self.total_sq += x * x
+            self.count += 1
+
+        # running sums drift with add/subtract; re-sum once per full window (amortised O(1))
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._resum()
+
+    def _resum(self) -> None:
+        valid = [v for v in self.buf if v is not None]
+        self.total = float(sum(valid))
+        self.total_sq = float(sum(v * v for v in valid))
+        self.count = len(valid)
+        self._pushes = 0
+
+    def mean(self, min_periods: int) -> float:
+        if self.count < max(min_periods, 1):
+            return np.nan
+        return self.total / self.count
+
+    def std(self, min_periods: int) -> float:
+        """Sample std (ddof=1), like pandas rolling().std()."""
+        if self.count < max(min_periods, 2):
+            return np.nan
+        var = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def to_list(self) -> list:
+        return list(self.buf)
+
+
+class IndicatorState:
+    """
+    Per-zone streaming state for MA / RSI / MACD / Bollinger / rolling volatility.
+    `update(time, price)` advances everything by one sample and returns the
+    indicator row for that timestamp.
+    """
+
+    def __init__(
+        self,
+        ma_short: int = 24,
+        ma_long: int = 96,
+        rsi_period: int = 14,
+        macd_fast: int = 12,
+        macd_slow: int = 26,
+        macd_signal: int = 9,
+        vol_periods: int = 96,
+    ):
+        self.params = {
+            "ma_short": ma_short,
+            "ma_long": ma_long,
+            "rsi_period": rsi_period,
+            "macd_fast": macd_fast,
+            "macd_slow": macd_slow,
+            "macd_signal": macd_signal,
+            "vol_periods": vol_periods,
+        }
+        self.last_time: pd.Timestamp | None = None
+        self.last_price: float | None = None
+        self.ema_fast: float | None = None
+        self.ema_slow: float | None = None
+        self.ema_signal: float | None = None
+        # weight of the previous EMA value; decays over missing prices
+        self.wt_fast = 1.0
+        self.wt_slow = 1.0
+        self.wt_signal = 1.0
+        self.win_short = RollingWindow(ma_short)
+        self.win_long = RollingWindow(ma_long)
+        self.win_gain = RollingWindow(rsi_period)
+        self.win_loss = RollingWindow(rsi_period)
+        self.win_ret = RollingWindow(vol_periods)
+        # rewind point for revised prices: the state (as a dict) before `recent`,
+        # None = before the first row, and the (time, price) rows consumed since
+        self.checkpoint: dict | None = None
+        self.recent: list[tuple[pd.Timestamp, float]] | None = []
+
+    @staticmethod
+    def _ema(prev: float | None, old_wt: float, x: float, span: int) -> tuple[float | None, float]:
+        """
+        One step of pandas ewm(span=..., adjust=False) (ignore_na=False):
+        y_0 = x_0, y_t = (w (1 - a) y_{t-1} + a x_t) / (w (1 - a) + a), where the
+        weight w of the old value is 1 and decays by (1 - a) per missing x.
+        A missing x keeps y. Returns (y, w).
+        """
+        if math.isnan(x):
+            if prev is None:
+                return None, old_wt
+            return prev, old_wt * (1.0 - 2.0 / (span + 1.0))
+        if prev is None:
+            return x, 1.0
+        alpha = 2.0 / (span + 1.0)
+        old_wt *= 1.0 - alpha
+        if prev != x:  # pandas skips the update on equal values (no rounding on flat series)
+            prev = (old_wt * prev + alpha * x) / (old_wt + alpha)
+        return prev, 1.0
+
+    def update(self, time, price) -> dict:
+        p = self.params
+        price = float(price) if price is not None and not pd.isna(price) else np.nan
+        has_price = not math.isnan(price)
+        # like diff() / pct_change(): a missing previous row gives a missing delta
+        has_prev = self.last_price is not None
+
+        # returns + rolling volatility
+        if has_price and has_prev:
+            if self.last_price != 0:
+                ret = price / self.last_price - 1.0
+            else:  # x / 0 like pandas: +-inf, and 0 / 0 is NaN
+                ret = math.copysign(np.inf, price) if price != 0 else np.nan
+        else:
+            ret = np.nan
+        self.win_ret.push(ret)
+
+        # moving averages + Bollinger band width
+        self.win_short.push(price)
+        self.win_long.push(price)
+        ma_short = self.win_short.mean(p["ma_short"] // 2)
+        ma_long = self.win_long.mean(p["ma_long"] // 2)
+        std_long = self.win_long.std(p["ma_long"] // 2)
+
+        # RSI (simple rolling mean of gains / losses, like the batch version)
+        delta = price - self.last_price if has_price and has_prev else np.nan
+        self.win_gain.push(max(delta, 0.0) if not math.isnan(delta) else np.nan)
+        self.win_loss.push(max(-delta, 0.0) if not math.isnan(delta) else np.nan)
+        avg_gain = self.win_gain.mean(p["rsi_period"])
+        avg_loss = self.win_loss.mean(p["rsi_period"])
+        if math.isnan(avg_gain) or math.isnan(avg_loss) or avg_loss <= RSI_ZERO_TOL:
+            rsi = np.nan
+        else:
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        # MACD: a missing price keeps the EMAs but decays their weight (as pandas
+        # does); macd itself stays defined, so the signal EMA keeps moving
+        self.ema_fast, self.wt_fast = self._ema(self.ema_fast, self.wt_fast, price, p["macd_fast"])
+        self.ema_slow, self.wt_slow = self._ema(self.ema_slow, self.wt_slow, price, p["macd_slow"])
+        if self.ema_fast is None:
+            macd, signal = np.nan, np.nan
+        else:
+            macd = self.ema_fast - self.ema_slow
+            self.ema_signal, self.wt_signal = self._ema(self.ema_signal, self.wt_signal, macd, p["macd_signal"])
+            signal = self.ema_signal
+
+        self.last_time = pd.Timestamp(time)
+        self.last_price = price if has_price else None
+        self.recent.append((self.last_time, price))
+
+        return {
+            "time_utc": self.last_time,
+            "price": price,
+            "return": ret,
+            "ma_short": ma_short,
+            "ma_long": ma_long,
+            "rsi": rsi,
+            "macd": macd,
+            "macd_signal": signal,
+            "bb_upper": ma_long + 2 * std_long,
+            "bb_lower": ma_long - 2 * std_long,
+            "rolling_std": self.win_ret.std(p["vol_periods"] // 2),
+        }
+
+    def checkpoint_time(self) -> pd.Timestamp | None:
+        if self.checkpoint is None or not self.checkpoint.get("last_time"):
+            return None
+        return pd.Timestamp(self.checkpoint["last_time"])
+
+    def rewound(self) -> "IndicatorState":
+        """Fresh state as of the checkpoint (recent rows not yet consumed)."""
+        if self.checkpoint is None:
+            return IndicatorState(**self.params)
+        state = IndicatorState.from_dict(self.checkpoint)
+        state.checkpoint, state.recent = self.checkpoint, []
+        return state
+
+    def advance_checkpoint(self, rewind: pd.Timedelta) -> None:
+        """Move the checkpoint up to last_time - rewind, dropping the rows it absorbs."""
+        if self.last_time is None:
+            return
+        cutoff = self.last_time - rewind
+        n_old = sum(1 for t, _ in self.recent if t <= cutoff)
+        if not n_old:
+            return
+        state = self.rewound()
+        for t, v in self.recent[:n_old]:
+            state.update(t, v)
+        self.checkpoint = state._core_dict()
+        self.recent = self.recent[n_old:]
+
+    def _core_dict(self) -> dict:
+        return {
+            "params": self.params,
+            "last_time": self.last_time.isoformat() if self.last_time is not None else None,
+            "last_price": self.last_price,
+            "ema_fast": self.ema_fast,
+            "ema_slow": self.ema_slow,
+            "ema_signal": self.ema_signal,
+            "wt_fast": self.wt_fast,
+            "wt_slow": self.wt_slow,
+            "wt_signal": self.wt_signal,
+            "win_short": self.win_short.to_list(),
+            "win_long": self.win_long.to_list(),
+            "win_gain": self.win_gain.to_list(),
+            "win_loss": self.win_loss.to_list(),
+            "win_ret": self.win_ret.to_list(),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            **self._core_dict(),
+            "checkpoint": self.checkpoint,
+            "recent": [[t.isoformat(), None if math.isnan(v) else v] for t, v in self.recent],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        state = cls(**data["params"])
+        state.last_time = pd.Timestamp(data["last_time"]) if data.get("last_time") else None
+        state.last_price = data.get("last_price")
+        state.ema_fast = data.get("ema_fast")
+        state.ema_slow = data.get("ema_slow")
+        state.ema_signal = data.get("ema_signal")
+        state.wt_fast = data.get("wt_fast", 1.0)
+        state.wt_slow = data.get("wt_slow", 1.0)
+        state.wt_signal = data.get("wt_signal", 1.0)
+        state.win_short = RollingWindow(state.params["ma_short"], data.get("win_short"))
+        state.win_long = RollingWindow(state.params["ma_long"], data.get("win_long"))
+        state.win_gain = RollingWindow(state.params["rsi_period"], data.get("win_gain"))
+        state.win_loss = RollingWindow(state.params["rsi_period"], data.get("win_loss"))
+        state.win_ret = RollingWindow(state.params["vol_periods"], data.get("win_ret"))
+        if "recent" in data:
+            state.checkpoint = data.get("checkpoint")
+            state.recent = [(pd.Timestamp(t), np.nan if v is None else float(v)) for t, v in data["recent"]]
+        else:
+            state.recent = None  # written before checkpoints: rebuilt from the lake on next use
+        return state
+
+
+def load_indicator_states(path: str | Path = INDICATOR_STATE_PATH) -> dict[str, IndicatorState]:
+    """Load { zone: IndicatorState } from JSON; {} if the file does not exist yet."""
+    file_path = Path(path)
+    if not file_path.exists():
+        return {}
+    with open(file_path, "r") as f:
+        data = json.load(f)
+    return {zone: IndicatorState.from_dict(d) for zone, d in data.items()}
+
+
+def save_indicator_states(path: str | Path, states: dict[str, IndicatorState]) -> None:
+    file_path = Path(path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # ring buffers hold None for missing values, so this is plain JSON (no NaN)
+    serializable = {zone: state.to_dict() for zone, state in states.items()}
+    with open(file_path, "w") as f:
+        json.dump(serializable, f)
+
+
+def _first_change(seen: pd.Series, times: pd.Series, values: np.ndarray) -> pd.Timestamp | None:
+    """Earliest of (times, values) whose price differs from / is missing in `seen` (time -> price)."""
+    old = pd.Series(values, index=pd.DatetimeIndex(times), dtype=float)
+    prev = seen.reindex(old.index)
+    same = (prev == old) | (prev.isna() & old.isna() & old.index.isin(seen.index))
+    return old.index[~same.to_numpy()].min() if not same.all() else None
+
+
+def _revised_since(
+    state: IndicatorState,
+    times: pd.Series,
+    values: np.ndarray,
+    key: str,
+    region: str,
+    indicator_root: Path,
+) -> pd.Timestamp | None:
+    """
+    Earliest row of (times, values) that revises or inserts a price the state
+    already consumed: rows after the checkpoint are checked against the
+    state's recent prices, older ones against the prices stored next to the
+    indicators.
+    """
+    consumed = (times <= state.last_time).to_numpy()
+    checkpoint_time = state.checkpoint_time()
+    before = consumed & (times <= checkpoint_time).to_numpy() if checkpoint_time is not None else np.zeros(len(times), bool)
+    after = consumed & ~before
+
+    changes = []
+    if after.any():
+        seen = pd.Series(
+            [v for _, v in state.recent], index=pd.DatetimeIndex([t for t, _ in state.recent]), dtype=float
+        )
+        changes.append(_first_change(seen, times[after], values[after]))
+    if before.any():
+        stored = load_filter_history(
+            key, region=region, start=times[before].min(), end=checkpoint_time, data_root=indicator_root
+        )
+        seen = pd.Series(dtype=float)
+        if not stored.empty:
+            seen = pd.Series(stored["price"].to_numpy(dtype=float), index=pd.DatetimeIndex(stored["time_utc"]))
+        changes.append(_first_change(seen, times[before], values[before]))
+    changes = [c for c in changes if c is not None]
+    return min(changes) if changes else None
+
+
+def advance_indicators(
+    states: dict[str, IndicatorState],
+    filter_id: str,
+    df_new: pd.DataFrame,
+    root: Path = PROJECT_ROOT,
+    region: str = "DE",
+    indicator_root: Path = INDICATOR_ROOT,
+    rewind_hours: int = INDICATOR_REWIND_HOURS,
+) -> pd.DataFrame:
+    """
+    Advance the zone's state with rows of df_new (time_utc, value) that are
+    newer than the last processed timestamp, then merge the resulting indicator
+    rows into the indicator lake.
+
+    Overlap rows that revise already processed prices rewind the state to its
+    checkpoint and replay from there with the revised values; the indicator
+    rows from the first revision on are rewritten. Revisions older than the
+    checkpoint, and zones without a state yet, replay the full price history
+    from the lake (which already holds the merged rows).
+    Returns the indicator rows written (possibly empty).
+    """
+    key = str(filter_id)
+    zone = ZONE_BY_FILTER_ID.get(key, key)
+    empty = pd.DataFrame(columns=["time_utc"] + INDICATOR_COLUMNS)
+
+    state = states.get(zone)
+    rebuild = state is None or state.recent is None
+    if df_new is None or df_new.empty:
+        df_new = pd.DataFrame(columns=["time_utc", "value"])
+    df_new = df_new.sort_values("time_utc").drop_duplicates("time_utc", keep="last")
+    times = pd.to_datetime(df_new["time_utc"], utc=True).reset_index(drop=True)
+    values = df_new["value"].to_numpy(dtype=float)
+
+    since = None
+    if not rebuild and state.last_time is not None:
+        since = _revised_since(state, times, values, key, region, indicator_root)
+        checkpoint_time = state.checkpoint_time()
+        if since is not None and checkpoint_time is not None and since <= checkpoint_time:
+            rebuild = True
+
+    if rebuild:
+        state = IndicatorState() if state is None else IndicatorState(**state.params)
+        df_all = load_filter_history(key, region=region, root=root)
+        if df_all is None or df_all.empty:
+            states[zone] = state
+            return empty
+        times = pd.to_datetime(df_all["time_utc"], utc=True).reset_index(drop=True)
+        values = df_all["value"].to_numpy(dtype=float)
+    elif since is not None:
+        # rewind: consumed prices after the checkpoint, overridden / extended by df_new
+        replay = pd.Series([v for _, v in state.recent], index=pd.DatetimeIndex([t for t, _ in state.recent]), dtype=float)
+        fresh = pd.Series(values, index=pd.DatetimeIndex(times), dtype=float)
+        checkpoint_time = state.checkpoint_time()
+        if checkpoint_time is not None:
+            fresh = fresh[fresh.index > checkpoint_time]
+        replay = fresh.combine_first(replay).sort_index()
+        state = state.rewound()
+        times, values = pd.Series(replay.index), replay.to_numpy()
+    elif state.last_time is not None:
+        newer = (times > state.last_time).to_numpy()
+        times, values = times[newer], values[newer]
+    states[zone] = state
+
+    if len(times) == 0:
+        return empty
+
+    rewind = pd.Timedelta(hours=rewind_hours)
+    cutoff = times.iloc[-1] - rewind
+    rows = []
+    for t, v in zip(times, values):
+        if t > cutoff and state.recent and state.last_time <= cutoff:
+            # passing the new rewind point: checkpoint here instead of replaying later
+            state.checkpoint, state.recent = state._core_dict(), []
+        rows.append(state.update(t, v))
+    out = pd.DataFrame(rows, columns=["time_utc"] + INDICATOR_COLUMNS)
+    if since is not None and not rebuild:
+        out = out[out["time_utc"] >= since].reset_index(drop=True)
+    state.advance_checkpoint(rewind)
+
+    merge_incoming_data(indicator_root, region, key, out)
+    return out
+
+
+@instrumented()
+def load_indicator_long(
+    filter_ids=None,
+    root: Path = PROJECT_ROOT,
+    region: str = "DE",
+    start=None,
+    end=None,
+) -> pd.DataFrame:
+    """
+    Read stored indicator series back as a long DataFrame:
+        time, zone, price, return, ma_short, ma_long, rsi, macd, macd_signal,
+        bb_upper, bb_lower, rolling_std
+    """
+    if filter_ids is None:
+        filter_ids = list(ZONE_BY_FILTER_ID.keys())
+
+    frames = []
+    for filter_id in filter_ids:
+        df = load_filter_history(
+            filter_id,
+            region=region,
+            root=root,
+            start=start,
+            end=end,
+            data_root=root / "data" / "indicators",
+        )
+        if df is None or df.empty:
+            continue
+        df = df.rename(columns={"time_utc": "time"})
+        df.insert(1, "zone", ZONE_BY_FILTER_ID.get(str(filter_id), str(filter_id)))
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=["time", "zone"] + INDICATOR_COLUMNS)
+
+    out = pd.concat(frames, ignore_index=True)
+    out["time"] = pd.to_datetime(out["time"], utc=True)
+    return out.sort_values(["zone", "time"]).reset_index(drop=True)
@@ -0,0 +1,246 @@
+# analysis/streaming_stats.py
+# %%
+
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import list_partition_days
+from analysis.group_series import load_group_long, group_time_bounds
+from analysis.market_price import WINDOWS, long_to_prices, add_rolling_volatility
+from analysis.instrumentation import instrumented
+from power.fetch_power.smard_filters import FILTER_GROUPS
+
+"""
+Out-of-core versions of load_prices_with_returns / compute_multi_window_stats.
+
+Instead of one long frame with every zone's full history, the lake is read
+in time-ordered chunks of STREAM_CHUNK_DAYS daily partitions (all zones of
+the group per chunk), so memory stays at one chunk whatever the history:
+
+- iter_price_chunks()       time, zone, price, return per chunk; the last
+                            price of every zone is carried into the next
+                            chunk, so returns match load_prices_with_returns
+- stream_with_lookback()    applies a finite-window function (rolling std,
+                            moving averages) per chunk with the last
+                            `lookback` rows of each zone prepended
+- ReturnMoments             count / mean / 2nd / 3rd central moments per zone,
+                            merged chunk by chunk (Pebay's pairwise update)
+- stream_multi_window_stats()  same output as compute_multi_window_stats
+
+EWM-based indicators (MACD) have unbounded memory: their streaming form is
+the per-zone IndicatorState in streaming_indicators.py.
+"""
+
+STREAM_CHUNK_DAYS = int(os.environ.get("STREAM_CHUNK_DAYS", "30"))
+
+STATS_COLUMNS = ["zone", "mean", "std", "skew", "window", "as_of"]
+
+
+def iter_price_chunks(
+    filter_group_name: str = "market_price",
+    root: Path = PROJECT_ROOT,
+    start=None,
+    end=None,
+    chunk_days: int = STREAM_CHUNK_DAYS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the group's prices in [start, end] as long frames (time, zone,
+    price, return; sorted by zone, time), `chunk_days` daily partitions at a
+    time. As with load_prices_with_returns(start=...), the first row at
+    `start` has no return.
+    """
+    # list every filter's partitions once, not once per chunk
+    days = {fid: list_partition_days(fid, root=root) for fid in FILTER_GROUPS[filter_group_name]}
+    start_ts = pd.to_datetime(start, utc=True) if start is not None else None
+    end_ts = pd.to_datetime(end, utc=True) if end is not None else None
+    all_days = sorted(set().union(*days.values()))
+    if start_ts is not None:
+        all_days = [d for d in all_days if d >= start_ts.strftime("%Y-%m-%d")]
+    if end_ts is not None:
+        all_days = [d for d in all_days if d <= end_ts.strftime("%Y-%m-%d")]
+
+    carry = pd.Series(dtype=float)  # zone -> price of its last row so far
+    for i in range(0, len(all_days), chunk_days):
+        chunk = all_days[i:i + chunk_days]
+        chunk_start = pd.Timestamp(chunk[0], tz="UTC")
+        chunk_end = pd.Timestamp(chunk[-1], tz="UTC") + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+        if start_ts is not None:
+            chunk_start = max(chunk_start, start_ts)
+        if end_ts is not None:
+            chunk_end = min(chunk_end, end_ts)
+        df = load_group_long(filter_group_name, root=root, start=chunk_start, end=chunk_end, partition_days=days)
+        if df.empty:
+            continue
+
+        df = long_to_prices(df)
+        prev = df.groupby("zone")["price"].shift()
+        opens = ~df["zone"].duplicated()
+        prev[opens] = df.loc[opens, "zone"].map(carry)
+        df["return"] = df["price"] / prev - 1
+
+        last_rows = df.drop_duplicates("zone", keep="last")
+        carry = pd.Series(last_rows["price"].to_numpy(), index=last_rows["zone"].to_numpy()).combine_first(carry)
+        yield df
+
+
+def stream_with_lookback(
+    chunks: Iterator[pd.DataFrame],
+    fn: Callable[[pd.DataFrame], pd.DataFrame],
+    lookback: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Apply `fn` (per-zone, depends on at most `lookback` earlier rows of the
+    zone, e.g. a rolling window of lookback + 1) chunk by chunk: each chunk is
+    extended with the previous chunks' last `lookback` rows per zone, which
+    are dropped again from fn's output.
+    """
+    tail = None
+    for df in chunks:
+        if tail is not None and not tail.empty:
+            ext = pd.concat([tail.assign(_carried=True), df.assign(_carried=False)], ignore_index=True)
+        else:
+            ext = df.assign(_carried=False).reset_index(drop=True)
+        ext = ext.sort_values(["zone", "time"], kind="stable")
+        tail = ext.groupby("zone").tail(lookback).drop(columns="_carried") if lookback > 0 else None
+        out = fn(ext)
+        yield out[~out["_carried"]].drop(columns="_carried")
+
+
+def stream_rolling_volatility(chunks: Iterator[pd.DataFrame], periods: int = 96) -> Iterator[pd.DataFrame]:
+    """add_rolling_volatility over a chunk stream (carries periods - 1 rows per zone)."""
+    return stream_with_lookback(chunks, lambda df: add_rolling_volatility(df, periods=periods), periods - 1)
+
+
+class ReturnMoments:
+    """
+    Mergeable mean / std / skew of returns per zone, matching
+    compute_return_stats (pandas sample std and adjusted skew; NaN returns
+    are skipped, +-inf make mean +-inf and std / skew NaN as in pandas).
+    """
+
+    def __init__(self):
+        # zone -> [n finite, mean, M2, M3, n +inf, n -inf]
+        self.state: dict[str, list[float]] = {}
+
+    def update(self, zones: pd.Series, returns: pd.Series) -> None:
+        values = returns.to_numpy(dtype=float)
+        keep = ~np.isnan(values)
+        if not keep.any():
+            return
+        zones, values = zones.to_numpy()[keep], values[keep]
+        for zone in pd.unique(zones):
+            x = values[zones == zone]
+            finite = x[np.isfinite(x)]
+            n = len(finite)
+            if n:
+                mean = finite.mean()
+                dev = finite - mean
+                part = [n, mean, float((dev**2).sum()), float((dev**3).sum())]
+            else:
+                part = [0, 0.0, 0.0, 0.0]
+            part += [int((x == np.inf).sum()), int((x == -np.inf).sum())]
+            self._merge(zone, part)
+
+    def _merge(self, zone: str, b: list[float]) -> None:
+        a = self.state.get(zone)
+        if a is None or a[0] == 0:
+            self.state[zone] = b[:4] + [b[4] + (a[4] if a else 0), b[5] + (a[5] if a else 0)]
+            return
+        na, ma, m2a, m3a = a[:4]
+        nb, mb, m2b, m3b = b[:4]
+        if nb:
+            n = na + nb
+            delta = mb - ma
+            a[0] = n
+            a[1] = ma + delta * nb / n
+            a[2] = m2a + m2b + delta**2 * na * nb / n
+            a[3] = m3a + m3b + delta**3 * na * nb * (na - nb) / n**2 + 3 * delta * (na * m2b - nb * m2a) / n
+        a[4] += b[4]
+        a[5] += b[5]
+
+    def result(self) -> pd.DataFrame:
+        """DataFrame indexed by zone (sorted) with columns mean, std, skew."""
+        rows = {}
+        for zone in sorted(self.state):
+            n, mean, m2, m3, pos, neg = self.state[zone]
+            std = math.sqrt(m2 / (n - 1)) if n >= 2 else np.nan
+            if n < 3:
+                skew = np.nan
+            elif m2 / n == 0:
+                skew = 0.0
+            else:
+                skew = math.sqrt(n * (n - 1)) / (n - 2) * (m3 / n) / (m2 / n) ** 1.5
+            if pos or neg:
+                mean = np.nan if pos and neg else (np.inf if pos else -np.inf)
+                std = skew = np.nan
+            rows[zone] = {"mean": mean, "std": std, "skew": skew}
+        out = pd.DataFrame.from_dict(rows, orient="index", columns=["mean", "std", "skew"])
+        out.index.name = "zone"
+        return out
+
+
+def _last_time(filter_group_name: str, root: Path, end) -> pd.Timestamp | None:
+    """Latest stored timestamp <= end (reads the last day before `end` only)."""
+    first, last = group_time_bounds(filter_group_name, root=root)
+    if last is None:
+        return None
+    hi = last if end is None else min(last, pd.to_datetime(end, utc=True))
+    df = load_group_long(filter_group_name, root=root, start=hi - pd.Timedelta(days=1), end=hi)
+    return df["time"].max() if not df.empty else hi
+
+
+@instrumented()
+def stream_multi_window_stats(
+    windows: list[str],
+    filter_group_name: str = "market_price",
+    root: Path = PROJECT_ROOT,
+    start=None,
+    end=None,
+    chunk_days: int = STREAM_CHUNK_DAYS,
+) -> pd.DataFrame:
+    """
+    compute_multi_window_stats(prices, windows) for the prices of [start, end],
+    without loading them at once. Windows end at the last timestamp <= end;
+    without "max" only the longest window (plus one day for the first
+    return) is read. The number of rows streamed is in out.attrs["rows"].
+    """
+    as_of = _last_time(filter_group_name, root, end)
+    if as_of is None:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+
+    lower = {w: None if WINDOWS.get(w) is None else as_of - pd.Timedelta(WINDOWS[w]) for w in windows}
+    if all(lo is not None for lo in lower.values()):
+        read_from = (min(lower.values()) - pd.Timedelta(days=1)).floor("D")
+        start = read_from if start is None else max(pd.to_datetime(start, utc=True), read_from)
+
+    moments = {w: ReturnMoments() for w in windows}
+    rows = 0
+    for df in iter_price_chunks(filter_group_name, root=root, start=start, end=as_of, chunk_days=chunk_days):
+        rows += len(df)
+        for w, lo in lower.items():
+            sel = df if lo is None else df[df["time"] >= lo]
+            if not sel.empty:
+                moments[w].update(sel["zone"], sel["return"])
+
+    frames = []
+    for w in windows:
+        stats = moments[w].result()
+        if stats.empty:
+            continue
+        stats["window"] = w
+        stats["as_of"] = as_of
+        frames.append(stats.reset_index())
+
+    out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=STATS_COLUMNS)
+    out.attrs["rows"] = rows
+    return out
@@ -5,13 +5,22 @@ from pathlib import Path
 
 from power.fetch_power.smard_fetch import smard_range
 from power.fetch_power.parquet_convert import merge_incoming_data
-from power.fetch_power.state import save_hwm_map, floor_to_quarter, load_hwm_map
+from power.fetch_power.state import save_hwm_map, floor_to_quarter, load_hwm_map, bump_data_versions
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.run_metrics import RunMetrics, timed
+from analysis.streaming_indicators import (
+    load_indicator_states,
+    save_indicator_states,
+    advance_indicators,
+)
+from analysis.pyramid import update_pyramid
+from analysis.snapshot import update_snapshot
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_ROOT = PROJECT_ROOT / "data"
 STATE_ROOT = PROJECT_ROOT / "state"
 HWM_PATH = STATE_ROOT / "high_watermark.json"
+DATA_VERSIONS_PATH = STATE_ROOT / "data_versions.json"
 
 #the four lines above gets the data, state and high_watermark. path + file of interest everytime   
 
@@ -35,9 +44,18 @@ def main(start, end, filter_group_name = None,
     filters = FILTER_GROUPS[filter_group_name]
     hwm_map = load_hwm_map(hmw_path)
     end_ts = floor_to_quarter(pd.to_datetime(end, utc=True))
+    touched_filters = []
+    changed_filters = []  # partitions actually rewritten -> derived stores + cache versions
+    # revised / gap-filled prices are replayed into the indicators (rewind or
+    # rebuild from the lake); the state lives next to the HWM file, as in incremental.py
+    indicator_state_path = Path(hmw_path).parent / "indicator_state.json"
+    indicator_states = load_indicator_states(indicator_state_path) if filter_group_name == "market_price" else None
+    # per-filter fetch / write counters + run totals -> metrics/ingest_runs.jsonl
+    metrics = RunMetrics("backfill", filter_group=filter_group_name, region=region_code, start=str(start), end=end_ts.isoformat())
 
     for filter_id, desc in filters.items():
         print(f"backfilling filter {filter_id} ({desc})")
+        stats = metrics.filter(filter_id)
 
         df = smard_range(
             filter_id=filter_id,
@@ -46,6 +64,7 @@ def main(start, end, filter_group_name = None,
             start=start,
             end=end_ts,
             verify=verify,
+            stats=stats,
         )
 
         if df.empty:
@@ -53,15 +72,50 @@ def main(start, end, filter_group_name = None,
             continue
 
         # merge_write_partitions = Merge df_new into existing daily Parquet files under root, dedupe by time_utc.
-        merge_incoming_data(data_root, region_code, filter_id, df) 
+        merge_incoming_data(data_root, region_code, filter_id, df, stats=stats) 
 
         key = str(filter_id)
+        if stats.get("partitions_written", 0) > 0:
+            if indicator_states is not None:
+                with timed(stats, "indicator_seconds"):
+                    ind = advance_indicators(
+                        indicator_states,
+                        filter_id,
+                        df,
+                        root=data_root.parent,
+                        region=region_code,
+                        indicator_root=data_root / "indicators",
+                    )
+                print(f"  advanced indicators by {len(ind)} points")
+
+            # refresh hour / day / week aggregates for the backfilled range
+            with timed(stats, "pyramid_seconds"):
+                update_pyramid(
+                    filter_id,
+                    since=df["time_utc"].min(),
+                    root=data_root.parent,
+                    region=region_code,
+                    pyramid_root=data_root / "pyramid",
+                )
+            changed_filters.append(key)
+
         hwm_map[key] = end_ts
+        touched_filters.append(key)
         print(f"  HWM[{key}] -> {end_ts.isoformat()}")
 
 
-    save_hwm_map(HWM_PATH, hwm_map) # save_hwm grabs a python object and turns it into a json file 
-    print("backfill done")
+    save_hwm_map(hmw_path, hwm_map) # save_hwm grabs a python object and turns it into a json file 
+    if changed_filters:
+        if indicator_states is not None:
+            save_indicator_states(indicator_state_path, indicator_states)
+        with metrics.step("snapshot"):
+            update_snapshot(changed_filters, region=region_code, root=data_root.parent, snapshot_root=data_root / "snapshot")
+        bump_data_versions(DATA_VERSIONS_PATH, changed_filters)
+    run = metrics.finish(watermarks={str(fid): hwm_map.get(str(fid)) for fid in filters})
+    print(
+        f"backfill done: {run['http_requests']} requests, {run['bytes_downloaded'] / 1e6:.1f} MB, "
+        f"{run['rows_decoded']} rows, {run['partitions_written']} partitions in {run['duration_seconds']:.1f}s"
+    )
 
 if __name__ == "__main__":
     import os
@@ -0,0 +1,159 @@
+# benchmarks/fetch_benchmark.py
+# %%
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# job run records of the harness go to their own file, not the production ingest log
+os.environ.setdefault("RUN_METRICS_PATH", str(PROJECT_ROOT / "metrics" / "fetch_bench_runs.jsonl"))
+
+import backfill
+import incremental
+from benchmarks.smard_stub import SmardStub, serve_stub
+from power.fetch_power import smard_fetch
+from power.fetch_power.run_metrics import RUN_METRICS_PATH, load_run_metrics
+from power.fetch_power.smard_fetch import smard_range
+from power.fetch_power.state import last_full_quarter, save_hwm_map
+
+"""
+Fetch throughput harness against the local SMARD stand-in (smard_stub.py).
+
+    python benchmarks/fetch_benchmark.py
+    FETCH_SCENARIOS=flaky FETCH_WORKERS=1,8 FETCH_DAYS=365 python benchmarks/fetch_benchmark.py
+
+For every scenario (stub latency / error / throttling profile) it runs
+smard_range over FETCH_DAYS for each worker count, then backfill.main and
+incremental.main for the market_price group into a temporary lake and state
+dir (the real data/ and state/ are never touched). One result row per run
+(seconds, requests, retries, MB, rows) is appended to FETCH_BENCH_RESULTS_PATH.
+"""
+
+FETCH_BENCH_RESULTS_PATH = Path(
+    os.environ.get("FETCH_BENCH_RESULTS_PATH", PROJECT_ROOT / "metrics" / "fetch_benchmarks.jsonl")
+)
+BACKOFF = float(os.environ.get("FETCH_BACKOFF", "0.05"))
+
+SCENARIOS = {
+    "clean": {"latency": 0.05, "jitter": 0.02},
+    "flaky": {"latency": 0.05, "jitter": 0.02, "error_rate": 0.05},
+    "throttled": {"latency": 0.05, "jitter": 0.02, "rate_limit": 20},
+    "slow_server": {"latency": 0.25, "jitter": 0.1, "max_concurrent": 2},
+}
+
+
+@contextlib.contextmanager
+def _jobs_pointed_at(base: str, workers: int, state_root: Path):
+    """Point smard_range defaults at the stub and the jobs' side-state files at state_root."""
+    saved = {
+        (smard_fetch, "SMARD_BASE_URL"): base,
+        (smard_fetch, "SMARD_MAX_WORKERS"): workers,
+        (smard_fetch, "SMARD_BACKOFF"): BACKOFF,
+        (incremental, "DATA_VERSIONS_PATH"): state_root / "data_versions.json",
+        (backfill, "DATA_VERSIONS_PATH"): state_root / "data_versions.json",
+    }
+    originals = {key: getattr(*key) for key in saved}
+    for (module, name), value in saved.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for (module, name), value in originals.items():
+            setattr(module, name, value)
+
+
+def _last_run(job: str) -> dict:
+    runs = load_run_metrics(RUN_METRICS_PATH, record="run")
+    runs = runs[runs["job"] == job]
+    return runs.iloc[-1].to_dict() if not runs.empty else {}
+
+
+def bench_smard_range(base: str, workers: int, days: int, filter_id: str = "4169") -> dict:
+    end = last_full_quarter()
+    stats = {}
+    t0 = time.perf_counter()
+    df = smard_range(filter_id, start=end - pd.Timedelta(days=days), end=end, base=base,
+                     stats=stats, max_workers=workers, backoff=BACKOFF)
+    return {"run": "smard_range", "seconds": time.perf_counter() - t0, **stats, "rows": len(df)}
+
+
+def bench_jobs(base: str, workers: int, days: int) -> list[dict]:
+    """backfill.main over `days`, then incremental.main from a watermark one day back."""
+    tmp = Path(tempfile.mkdtemp(prefix="fetch_bench_"))
+    data_root, hwm_path = tmp / "data", tmp / "state" / "high_watermark.json"
+    end = last_full_quarter()
+    results = []
+    try:
+        with _jobs_pointed_at(base, workers, tmp / "state"), contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            backfill.main(end - pd.Timedelta(days=days), end, "market_price", data_root=data_root, hmw_path=hwm_path)
+            results.append({"run": "backfill", "seconds": time.perf_counter() - t0})
+
+            save_hwm_map(hwm_path, {fid: end - pd.Timedelta(days=1) for fid in backfill.FILTER_GROUPS["market_price"]})
+            t0 = time.perf_counter()
+            incremental.main("market_price", data_root=data_root, hmw_path=hwm_path)
+            results.append({"run": "incremental", "seconds": time.perf_counter() - t0})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for res in results:
+        run = _last_run(res["run"])
+        res.update({
+            key: run.get(key)
+            for key in ("http_requests", "http_retries", "bytes_downloaded", "fetch_seconds",
+                        "rows_decoded", "partitions_written", "partitions_skipped")
+        })
+    return results
+
+
+def run_fetch_benchmarks(
+    scenarios=None,
+    workers=(1, 2, 4, 8),
+    days: int = 90,
+    log_path: Path | None = FETCH_BENCH_RESULTS_PATH,
+) -> pd.DataFrame:
+    rows = []
+    started = pd.Timestamp.now(tz="UTC").isoformat()
+    for name in scenarios or list(SCENARIOS):
+        for n_workers in workers:
+            # a fresh stub per run: token bucket, error RNG and counters start over
+            stub = SmardStub(first=last_full_quarter() - pd.Timedelta(days=days + 14), **SCENARIOS[name])
+            with serve_stub(stub) as base:
+                stub._synthetic_week.cache_clear()
+                results = [bench_smard_range(base, n_workers, days)] + bench_jobs(base, n_workers, days)
+            for res in results:
+                res = {"started": started, "scenario": name, "workers": n_workers, "days": days, **res,
+                       "stub_throttled": stub.counters["throttled"], "stub_errors": stub.counters["errors"]}
+                mb = (res.get("bytes_downloaded") or 0) / 1e6
+                print(f"{name:<12} workers={n_workers:<2} {res['run']:<12} {res['seconds']:7.2f}s  "
+                      f"{res.get('http_requests')} req ({res.get('http_retries')} retries)  {mb:.1f} MB")
+                rows.append(res)
+
+    if log_path is not None:
+        log_path = Path(log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            for rec in rows:
+                f.write(json.dumps(rec, default=str) + "\n")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    scenarios = os.environ.get("FETCH_SCENARIOS")
+    run_fetch_benchmarks(
+        scenarios=scenarios.split(",") if scenarios else None,
+        workers=tuple(int(w) for w in os.environ.get("FETCH_WORKERS", "1,2,4,8").split(",")),
+        days=int(os.environ.get("FETCH_DAYS", "90")),
+    )
@@ -0,0 +1,271 @@
+# benchmarks/run_benchmarks.py
+# %%
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.synthetic_lake import BENCH_LAKE_ROOT, generate_lake
+from analysis.read_data import load_filter_history, list_partition_days
+from analysis.group_series import load_group_long
+from analysis.market_price import (
+    load_prices_with_returns,
+    load_prices_window,
+    compute_multi_window_stats,
+    add_technical_indicators,
+)
+from analysis.streaming_stats import stream_multi_window_stats
+from analysis.de_features import build_de_features
+from analysis.pyramid import update_pyramid
+from analysis.streaming_indicators import advance_indicators
+from power.fetch_power.parquet_convert import merge_incoming_data, return_path
+from power.fetch_power.smard_filters import FILTER_GROUPS
+
+"""
+Offline benchmark suite on a synthetic lake (benchmarks/synthetic_lake.py).
+
+    BENCH_YEARS=2 python benchmarks/run_benchmarks.py          # run, append results
+    BENCH_CASES=load_full,stats_multi_window python benchmarks/run_benchmarks.py
+    BENCH_COMPARE=<commit>,<commit> python benchmarks/run_benchmarks.py
+
+Every case is timed BENCH_REPEAT times (setup excluded; min and median kept)
+and run once more under tracemalloc for its peak memory (Python allocations:
+Arrow buffers of the parquet reader are not traced). Results are appended
+to BENCH_RESULTS_PATH (JSONL) with the git commit and the lake size, so runs
+on the same lake can be compared across commits with compare_results().
+The lake is generated on first use and reused while its size matches.
+"""
+
+BENCH_RESULTS_PATH = Path(os.environ.get("BENCH_RESULTS_PATH", PROJECT_ROOT / "metrics" / "benchmarks.jsonl"))
+PRICE_FILTER_ID = "4169"
+STATS_WINDOWS = ["1D", "3D", "7D", "30D", "1Y"]
+
+
+def _git_commit() -> tuple[str | None, bool]:
+    """(short HEAD, working tree dirty) or (None, False) outside a git checkout."""
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip()
+        return head, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def prepare_lake(root: Path = BENCH_LAKE_ROOT, years: float = 1.0, regions=("DE",)) -> dict:
+    """Generate the lake (+ price pyramid) unless one of this size already exists."""
+    root = Path(root)
+    info_path = root / "lake.json"
+    if info_path.exists():
+        info = json.loads(info_path.read_text())
+        if info.get("years") == years and info.get("regions") == len(regions):
+            return info
+        shutil.rmtree(root / "data", ignore_errors=True)
+
+    t0 = time.perf_counter()
+    info = generate_lake(root=root, years=years, regions=regions)
+    for filter_id in FILTER_GROUPS["market_price"]:
+        update_pyramid(filter_id, root=root, pyramid_root=root / "data" / "pyramid")
+    info["generate_seconds"] = time.perf_counter() - t0
+    info_path.write_text(json.dumps(info))
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Cases: name -> (setup(root) -> ctx, run(root, ctx) -> result). Setup is not timed.
+# ---------------------------------------------------------------------------
+
+def _price_chunk(root: Path, days: int) -> pd.DataFrame:
+    end = pd.to_datetime(list_partition_days(PRICE_FILTER_ID, root=root)[-1], utc=True) + pd.Timedelta(hours=23, minutes=45)
+    return load_filter_history(PRICE_FILTER_ID, root=root, start=end - pd.Timedelta(days=days), end=end)
+
+
+def _setup_ingest(root):
+    return {"df": _price_chunk(root, 30), "dst": Path(tempfile.mkdtemp(prefix="bench_ingest_"))}
+
+
+def _run_ingest(root, ctx):
+    # 30 days into an empty lake: one new partition per day
+    return merge_incoming_data(ctx["dst"], "DE", PRICE_FILTER_ID, ctx["df"])
+
+
+def _setup_merge(root):
+    # incremental-style overlap: the last 26h re-fetched with revised last values,
+    # merged into a copy of the partitions they touch
+    df = _price_chunk(root, 1).tail(104).copy()
+    df.loc[df.index[-8:], "value"] += 1.0
+    dst = Path(tempfile.mkdtemp(prefix="bench_merge_"))
+    for day in pd.to_datetime(df["time_utc"], utc=True).dt.strftime("%Y-%m-%d").unique():
+        src = return_path(root / "data", "DE", PRICE_FILTER_ID, day)
+        if src.exists():
+            target = return_path(dst, "DE", PRICE_FILTER_ID, day)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(src, target)
+    return {"df": df, "dst": dst}
+
+
+def _setup_prices(root):
+    return {"prices": load_prices_with_returns(root=root)}
+
+
+def _setup_indicators(root):
+    return {"dst": Path(tempfile.mkdtemp(prefix="bench_indicators_"))}
+
+
+CASES = {
+    "ingest_30d": (_setup_ingest, _run_ingest),
+    "merge_overlap": (_setup_merge, lambda root, ctx: merge_incoming_data(ctx["dst"], "DE", PRICE_FILTER_ID, ctx["df"])),
+    "load_full": (None, lambda root, ctx: load_filter_history(PRICE_FILTER_ID, root=root)),
+    "load_window_7d": (None, lambda root, ctx: _price_chunk(root, 7)),
+    "load_group_generation": (None, lambda root, ctx: load_group_long("generation", root=root)),
+    "prices_with_returns": (None, lambda root, ctx: load_prices_with_returns(root=root)),
+    "page_prices_30d": (None, lambda root, ctx: load_prices_window("30D", max_points=2_000, root=root)),
+    "page_prices_max": (None, lambda root, ctx: load_prices_window("max", max_points=2_000, root=root)),
+    "stats_multi_window": (_setup_prices, lambda root, ctx: compute_multi_window_stats(ctx["prices"], STATS_WINDOWS)),
+    # load + stats in one pass, vs prices_with_returns + stats_multi_window
+    "stats_streaming_max": (None, lambda root, ctx: stream_multi_window_stats(STATS_WINDOWS + ["max"], root=root)),
+    "features_de": (None, lambda root, ctx: build_de_features(root=root)),
+    "indicators_batch": (_setup_prices, lambda root, ctx: add_technical_indicators(ctx["prices"])),
+    "indicators_streaming": (
+        _setup_indicators,
+        lambda root, ctx: advance_indicators({}, PRICE_FILTER_ID, None, root=root, indicator_root=ctx["dst"]),
+    ),
+}
+
+
+def _cleanup(ctx):
+    if isinstance(ctx, dict) and "dst" in ctx:
+        shutil.rmtree(ctx["dst"], ignore_errors=True)
+
+
+def run_case(name: str, root: Path, repeat: int = 3) -> dict:
+    setup, run = CASES[name]
+    seconds, rows = [], None
+    for _ in range(repeat):
+        ctx = setup(root) if setup is not None else None
+        t0 = time.perf_counter()
+        out = run(root, ctx)
+        seconds.append(time.perf_counter() - t0)
+        _cleanup(ctx)
+        try:
+            rows = len(out)
+        except TypeError:
+            pass
+
+    # one extra run for the peak: tracemalloc slows allocations, so it is not timed
+    ctx = setup(root) if setup is not None else None
+    tracemalloc.start()
+    try:
+        run(root, ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        _cleanup(ctx)
+
+    return {
+        "case": name,
+        "repeat": repeat,
+        "seconds_min": min(seconds),
+        "seconds_median": statistics.median(seconds),
+        "peak_mb": peak / 2**20,
+        "rows": rows,
+    }
+
+
+def run_suite(
+    root: Path = BENCH_LAKE_ROOT,
+    years: float = 1.0,
+    regions=("DE",),
+    cases=None,
+    repeat: int = 3,
+    log_path: Path | None = BENCH_RESULTS_PATH,
+) -> pd.DataFrame:
+    """Run `cases` (default: all) on the lake and append the results to `log_path`."""
+    lake = prepare_lake(root, years=years, regions=regions)
+    commit, dirty = _git_commit()
+    run_info = {
+        "commit": commit,
+        "dirty": dirty,
+        "started": pd.Timestamp.now(tz="UTC").isoformat(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "lake_years": lake["years"],
+        "lake_filters": lake["filters"],
+        "lake_regions": lake["regions"],
+        "lake_rows": lake["rows"],
+    }
+
+    results = []
+    for name in cases or list(CASES):
+        res = run_case(name, Path(root), repeat=repeat)
+        print(f"{name:<24} {res['seconds_median']:8.3f}s  (min {res['seconds_min']:.3f}s)  peak {res['peak_mb']:8.1f} MB")
+        results.append({**run_info, **res})
+
+    if log_path is not None:
+        log_path = Path(log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            for rec in results:
+                f.write(json.dumps(rec) + "\n")
+    return pd.DataFrame(results)
+
+
+def load_results(path: Path = BENCH_RESULTS_PATH) -> pd.DataFrame:
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_json(path, lines=True, dtype={"commit": str})
+
+
+def compare_results(base: str, head: str, path: Path = BENCH_RESULTS_PATH) -> pd.DataFrame:
+    """
+    Per case: latest median time / peak of `base` vs `head` (commit prefixes)
+    on the same lake size, with head / base ratios (< 1 is faster / smaller).
+    """
+    df = load_results(path)
+    if df.empty:
+        return df
+
+    def _latest(commit: str) -> pd.DataFrame:
+        sel = df[df["commit"].astype(str).str.startswith(commit)]
+        return sel.sort_values("started").groupby(["case", "lake_years", "lake_regions"]).tail(1)
+
+    cols = ["case", "lake_years", "lake_regions", "seconds_median", "peak_mb"]
+    out = _latest(base)[cols].merge(
+        _latest(head)[cols], on=["case", "lake_years", "lake_regions"], suffixes=("_base", "_head")
+    )
+    out["time_ratio"] = out["seconds_median_head"] / out["seconds_median_base"]
+    out["peak_ratio"] = out["peak_mb_head"] / out["peak_mb_base"]
+    return out.sort_values("case").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    compare = os.environ.get("BENCH_COMPARE")
+    if compare:
+        base, head = compare.split(",")
+        print(compare_results(base, head).to_string(index=False))
+    else:
+        cases = os.environ.get("BENCH_CASES")
+        run_suite(
+            root=BENCH_LAKE_ROOT,
+            years=float(os.environ.get("BENCH_YEARS", "1")),
+            regions=tuple(os.environ.get("BENCH_REGIONS", "DE").split(",")),
+            cases=cases.split(",") if cases else None,
+            repeat=int(os.environ.get("BENCH_REPEAT", "3")),
+        )
@@ -0,0 +1,237 @@
+# benchmarks/smard_stub.py
+# %%
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import load_filter_history, list_partition_days
+from benchmarks.synthetic_lake import synthetic_series, smard_values
+from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.state import last_full_quarter
+
+"""
+Local stand-in for the SMARD chart_data API, for load-testing the fetch code
+without network access.
+
+    stub = SmardStub(latency=0.05, error_rate=0.02, rate_limit=50)
+    with serve_stub(stub) as base:
+        df = smard_range("4169", start=..., end=..., base=base)
+
+It serves the two files smard_range reads:
+
+    /<filter>/<region>/index_<resolution>.json                   {"timestamps": [...]}
+    /<filter>/<region>/<filter>_<region>_<resolution>_<ms>.json  {"series": [[ms, value], ...]}
+
+with weekly chunks starting Monday 00:00 Europe/Berlin (as SMARD does) and
+values after the last full quarter-hour published as null. Data comes from
+synthetic_series() (source="synthetic") or from a recorded lake (source = a
+project root with data/region=.../filter=...). "quarterhour" and "hour" are
+served.
+
+Knobs: `latency` + uniform `jitter` seconds per response, `error_rate`
+(fraction answered 500), `rate_limit` (requests / second, token bucket; over
+the limit -> 429 with Retry-After) and `max_concurrent` (requests handled at
+once; the rest queue). `stub.counters` counts what was served.
+"""
+
+SMARD_STUB_PORT = int(os.environ.get("SMARD_STUB_PORT", "0"))  # 0 = any free port
+
+RESOLUTIONS = {"quarterhour": "15min", "hour": "1h"}
+KNOWN_FILTERS = {fid for filters in FILTER_GROUPS.values() for fid in filters}
+
+_INDEX_RE = re.compile(r"^/(?P<filter>\w+)/(?P<region>[\w-]+)/index_(?P<resolution>\w+)\.json$")
+_CHUNK_RE = re.compile(r"^/(?P<filter>\w+)/(?P<region>[\w-]+)/(?P=filter)_(?P=region)_(?P<resolution>\w+)_(?P<ms>\d+)\.json$")
+
+
+def _week_starts(first, last) -> pd.DatetimeIndex:
+    """Mondays 00:00 Europe/Berlin (in UTC) from the week containing `first` to `last`."""
+    first = pd.Timestamp(first).tz_convert("Europe/Berlin").normalize()
+    first -= pd.Timedelta(days=first.dayofweek)
+    weeks = pd.date_range(first, pd.Timestamp(last).tz_convert("Europe/Berlin"), freq="W-MON")
+    return weeks.union(pd.DatetimeIndex([first])).tz_convert("UTC")
+
+
+class SmardStub:
+    def __init__(
+        self,
+        source="synthetic",
+        first="2024-01-01",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: float | None = None,
+        max_concurrent: int | None = None,
+        retry_after: int = 1,
+        seed: int = 0,
+    ):
+        self.source = source
+        self.first = pd.to_datetime(first, utc=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._bucket_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._tokens = rate_limit or 0.0
+        self._refilled = time.monotonic()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0, "not_found": 0, "bytes": 0}
+
+    # ---- data ----
+
+    def chunk_starts(self, filter_id: str, region: str) -> pd.DatetimeIndex:
+        if self.source == "synthetic":
+            return _week_starts(self.first, last_full_quarter())
+        days = list_partition_days(filter_id, region=region, root=Path(self.source))
+        if not days:
+            return pd.DatetimeIndex([], tz="UTC")
+        return _week_starts(pd.to_datetime(days[0], utc=True), pd.to_datetime(days[-1], utc=True))
+
+    @lru_cache(maxsize=128)
+    def _synthetic_week(self, region: str, week_ms: int) -> pd.DataFrame:
+        start = pd.to_datetime(week_ms, unit="ms", utc=True)
+        seed = self.seed + zlib.crc32(f"{region}/{week_ms}".encode())
+        return synthetic_series(start, start + pd.Timedelta(days=7) - pd.Timedelta(minutes=15), seed=seed)
+
+    def chunk(self, filter_id: str, region: str, resolution: str, week_ms: int) -> list:
+        start = pd.to_datetime(week_ms, unit="ms", utc=True)
+        end = start + pd.Timedelta(days=7) - pd.Timedelta(minutes=15)
+        if self.source == "synthetic":
+            wide = self._synthetic_week(region, week_ms)
+            values = pd.Series(smard_values(wide, filter_id), index=wide.index)
+        else:
+            df = load_filter_history(filter_id, region=region, root=Path(self.source), start=start, end=end)
+            if df.empty:
+                values = pd.Series(dtype=float)
+            else:
+                values = pd.Series(df["value"].to_numpy(), index=pd.DatetimeIndex(pd.to_datetime(df["time_utc"], utc=True)))
+        grid = pd.date_range(start, end, freq="15min")
+        values = values.reindex(grid)
+        values[grid > last_full_quarter()] = np.nan  # not published yet
+        if resolution == "hour":
+            values = values.resample("1h").mean()
+        ms = values.index.as_unit("ms").asi8
+        return [[int(t), None if np.isnan(v) else round(float(v), 3)] for t, v in zip(ms, values.to_numpy())]
+
+    # ---- request handling ----
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._count_lock:
+            self.counters[key] += n
+
+    def _take_token(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self._bucket_lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def respond(self, path: str) -> tuple[int, dict, bytes]:
+        """(status, headers, body) for one GET path."""
+        self._count("requests")
+        if not self._take_token():
+            self._count("throttled")
+            return 429, {"Retry-After": str(self.retry_after)}, b"rate limited"
+
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            time.sleep(self.latency + self._rng.uniform(0, self.jitter))
+            if self._rng.random() < self.error_rate:
+                self._count("errors")
+                return 500, {}, b"injected error"
+
+            m_index, m_chunk = _INDEX_RE.match(path), _CHUNK_RE.match(path)
+            m = m_index or m_chunk
+            if m is None or m["resolution"] not in RESOLUTIONS or (
+                self.source == "synthetic" and m["filter"] not in KNOWN_FILTERS
+            ):
+                self._count("not_found")
+                return 404, {}, b"not found"
+
+            if m_index:
+                stamps = self.chunk_starts(m["filter"], m["region"]).as_unit("ms").asi8
+                payload = {"timestamps": [int(s) for s in stamps]}
+            else:
+                series = self.chunk(m["filter"], m["region"], m["resolution"], int(m["ms"]))
+                payload = {"meta_data": {"version": 1, "created": int(time.time() * 1000)}, "series": series}
+            body = json.dumps(payload).encode()
+            self._count("ok")
+            self._count("bytes", len(body))
+            return 200, {"Content-Type": "application/json"}, body
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    stub: SmardStub = None
+
+    def do_GET(self):
+        status, headers, body = self.stub.respond(self.path.split("?", 1)[0])
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_stub(stub: SmardStub, host: str = "127.0.0.1", port: int = SMARD_STUB_PORT):
+    """Run `stub` on a background thread; yields the base URL to pass as smard_range(base=...)."""
+    handler = type("StubHandler", (_Handler,), {"stub": stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    stub = SmardStub(
+        source=os.environ.get("SMARD_STUB_SOURCE", "synthetic"),
+        latency=float(os.environ.get("SMARD_STUB_LATENCY", "0.05")),
+        jitter=float(os.environ.get("SMARD_STUB_JITTER", "0.02")),
+        error_rate=float(os.environ.get("SMARD_STUB_ERROR_RATE", "0")),
+        rate_limit=float(os.environ["SMARD_STUB_RATE_LIMIT"]) if "SMARD_STUB_RATE_LIMIT" in os.environ else None,
+    )
+    with serve_stub(stub, port=SMARD_STUB_PORT or 8765) as base:
+        print(f"SMARD stand-in on {base} (export SMARD_BASE_URL={base})")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,184 @@
+# benchmarks/synthetic_lake.py
+# %%
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from power.fetch_power.io_s3 import write_atomic
+from power.fetch_power.parquet_convert import return_path, to_parquet_bytes
+from power.fetch_power.smard_filters import FILTER_GROUPS
+
+"""
+Synthetic SMARD lake for offline benchmarks.
+
+Writes root/data/region=<R>/filter=<id>/date=YYYY-MM-DD/data.parquet
+(time_utc, value) exactly like the ingest jobs, for `years` of quarter-hours
+x the chosen filters x regions. The series are shaped like the real ones:
+
+- load with daily / weekly / seasonal profile, PV from a day-length bell curve
+  times cloudiness, wind as a slow AR(1) capacity factor (windier in winter)
+- conventional plants fill the residual load, nuclear stops on 2023-04-15
+- prices follow the residual load with fuel-season drift, spikes and negative
+  prices on sunny low-load hours; other zones are DE plus a correlated spread
+- forecasts are the actuals plus noise
+
+Generation / consumption are MWh per quarter-hour (as SMARD publishes them),
+prices €/MWh. The same seed gives the same lake.
+"""
+
+BENCH_LAKE_ROOT = Path(os.environ.get("BENCH_LAKE_ROOT", PROJECT_ROOT / "benchmarks" / "lake"))
+
+NUCLEAR_PHASE_OUT = pd.Timestamp("2023-04-15", tz="UTC")
+
+# zone spread vs DE: (mean offset €/MWh, noise std)
+ZONE_SPREADS = {"4996": (2.0, 12.0), "256": (1.0, 8.0)}
+
+
+def _ar1(rng: np.random.Generator, n: int, phi: float, sigma: float) -> np.ndarray:
+    return lfilter([1.0], [1.0, -phi], rng.normal(0.0, sigma, n))
+
+
+def synthetic_series(start, end, seed: int = 0) -> pd.DataFrame:
+    """
+    All synthetic SMARD series over [start, end] as a wide frame: index time_utc,
+    one column per filter id (MW for quantities, €/MWh for prices).
+    """
+    rng = np.random.default_rng(seed)
+    t = pd.date_range(pd.to_datetime(start, utc=True), pd.to_datetime(end, utc=True), freq="15min", name="time_utc")
+    n = len(t)
+    hour = (t.hour + t.minute / 60).to_numpy()
+    doy = t.dayofyear.to_numpy()
+    weekend = np.asarray(t.dayofweek >= 5)
+    winter = np.cos(2 * np.pi * (doy - 15) / 365.25)  # +1 mid-January, -1 mid-July
+
+    # load: morning / evening peaks, weekend dip, winter high
+    daily = 0.78 + 0.14 * np.exp(-((hour - 9) ** 2) / 8) + 0.16 * np.exp(-((hour - 18.5) ** 2) / 6)
+    load = 58_000 * daily * np.where(weekend, 0.85, 1.0) * (1 + 0.08 * winter) * (1 + 0.02 * rng.standard_normal(n))
+
+    # PV: bell curve over the day length, times slowly varying cloudiness
+    day_length = 12 - 4 * winter
+    sun = np.clip(np.cos((hour - 12.5) / (day_length / 2) * np.pi / 2), 0, None) ** 1.5
+    sun[np.abs(hour - 12.5) > day_length / 2] = 0
+    clouds = 1 / (1 + np.exp(-_ar1(rng, n, 0.995, 0.15) - 1))
+    solar = 55_000 * sun * clouds * (1 - 0.35 * np.clip(winter, 0, None))
+
+    # wind: AR(1) capacity factor, windier in winter
+    wind_cf = 1 / (1 + np.exp(-(_ar1(rng, n, 0.998, 0.06) + 0.6 * winter - 1.2)))
+    onshore = 60_000 * wind_cf
+    offshore = 8_500 * np.clip(wind_cf * 1.3 + 0.02 * rng.standard_normal(n), 0, 1)
+
+    hydro = 1_800 + 400 * winter + 100 * rng.standard_normal(n)
+    biomass = np.full(n, 4_400.0) + 150 * rng.standard_normal(n)
+    other_res = np.full(n, 180.0) + 20 * rng.standard_normal(n)
+    nuclear = np.where(t < NUCLEAR_PHASE_OUT, 4_000 + 50 * rng.standard_normal(n), np.nan)
+
+    residual = load - solar - onshore - offshore
+    thermal = np.clip(residual - hydro - biomass - other_res - np.nan_to_num(nuclear), 0, None)
+    lignite = np.clip(0.45 * thermal, 2_000, 15_000)
+    hard_coal = np.clip(0.25 * (thermal - lignite), 0, 12_000)
+    gas = np.clip(thermal - lignite - hard_coal, 0, None)
+    other_conv = 1_200 + 200 * rng.standard_normal(n)
+
+    # price: merit order on the residual load, fuel season, spikes, negative hours
+    fuel = 1 + 0.25 * winter + 0.15 * np.sin(2 * np.pi * np.arange(n) / (96 * 365.25 * 3))
+    price = fuel * (25 + 0.0022 * np.clip(residual, 0, None)) + 0.0015 * np.clip(residual, None, 0)
+    price += 6 * _ar1(rng, n, 0.97, 0.25) + 3 * rng.standard_normal(n)
+    spikes = rng.random(n) < 0.001
+    price[spikes] += rng.exponential(250, spikes.sum())
+    price = np.clip(price, -500, 4_000).round(2)
+
+    pumped_gen = np.clip((price - np.quantile(price, 0.8)) * 40, 0, 6_000)
+    pumped_cons = np.clip((np.quantile(price, 0.25) - price) * 40, 0, 6_000)
+
+    wide = pd.DataFrame(
+        {
+            # generation
+            "1223": lignite, "1224": nuclear, "1225": offshore, "1226": hydro,
+            "1227": other_conv, "1228": other_res, "4066": biomass, "4067": onshore,
+            "4068": solar, "4069": hard_coal, "4070": pumped_gen, "4071": gas,
+            # consumption
+            "410": load, "4359": residual, "4387": pumped_cons,
+            # forecasts (day-ahead: actual + error)
+            "3791": offshore * (1 + 0.08 * rng.standard_normal(n)),
+            "123": onshore * (1 + 0.10 * _ar1(rng, n, 0.9, 0.45)),
+            "125": solar * (1 + 0.12 * rng.standard_normal(n)),
+            "715": (hydro + biomass + other_res) * (1 + 0.03 * rng.standard_normal(n)),
+            # prices
+            "4169": price,
+        },
+        index=t,
+    )
+    wide["5097"] = wide["3791"] + wide["123"] + wide["125"]
+    wide["122"] = wide["5097"] + wide["715"] + (lignite + hard_coal + gas) * (1 + 0.05 * rng.standard_normal(n))
+    for fid, (offset, sigma) in ZONE_SPREADS.items():
+        wide[fid] = (price + offset + sigma * _ar1(rng, n, 0.9, 0.45)).round(2)
+
+    quantities = [c for c in wide.columns if c not in {"4169", *ZONE_SPREADS}]
+    wide[quantities] = wide[quantities].clip(lower=0)
+    return wide
+
+
+def smard_values(wide: pd.DataFrame, filter_id: str) -> np.ndarray:
+    """One column of synthetic_series() in SMARD units (MWh per quarter-hour, €/MWh)."""
+    values = wide[filter_id].to_numpy()
+    return values if filter_id in {"4169", *ZONE_SPREADS} else values / 4
+
+
+def generate_lake(
+    root: Path = BENCH_LAKE_ROOT,
+    years: float = 1.0,
+    groups=("market_price", "generation", "forecast", "consumption"),
+    regions=("DE",),
+    end="2025-12-31 23:45",
+    seed: int = 0,
+) -> dict:
+    """
+    Write a synthetic lake under root / "data" (replacing the partitions it
+    covers). Returns {"root", "years", "filters", "regions", "partitions", "rows"}.
+    """
+    root = Path(root)
+    end_ts = pd.to_datetime(end, utc=True)
+    start_ts = (end_ts - pd.Timedelta(days=round(365.25 * years))).floor("D")
+    filter_ids = [fid for group in groups for fid in FILTER_GROUPS[group]]
+
+    partitions, rows = 0, 0
+    for i, region in enumerate(regions):
+        wide = synthetic_series(start_ts, end_ts, seed=seed + i)
+        days = wide.index.strftime("%Y-%m-%d")
+        for filter_id in filter_ids:
+            df = pd.DataFrame({"time_utc": wide.index, "value": smard_values(wide, filter_id)}).dropna()
+            for day, df_day in df.groupby(days[df.index], sort=True):
+                write_atomic(
+                    return_path(root / "data", region, filter_id, day),
+                    to_parquet_bytes(df_day.reset_index(drop=True)),
+                )
+                partitions += 1
+            rows += len(df)
+
+    return {
+        "root": str(root),
+        "years": years,
+        "filters": len(filter_ids),
+        "regions": len(regions),
+        "partitions": partitions,
+        "rows": rows,
+    }
+
+
+if __name__ == "__main__":
+    info = generate_lake(
+        root=BENCH_LAKE_ROOT,
+        years=float(os.environ.get("BENCH_YEARS", "1")),
+        regions=tuple(os.environ.get("BENCH_REGIONS", "DE").split(",")),
+        seed=int(os.environ.get("BENCH_SEED", "0")),
+    )
+    print(f"wrote {info['partitions']} partitions / {info['rows']} rows to {info['root']}")
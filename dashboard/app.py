@@ -2,12 +2,14 @@
 #%%
 import streamlit as st
 
+from app_pages.overview_page import render_overview_page
 from app_pages.market_prices_page import render_market_prices_page
 from app_pages.generation_page import render_generation_page
 from app_pages.forecast_page import render_forecast_page
 from app_pages.consumption_page import render_consumption_page
 from app_pages.correlation_page import render_correlation_page
 from app_pages.sarimax_page import render_sarimax_page
+from analysis.instrumentation import DASHBOARD_PROFILE, set_enabled, start_run, section, finish_run
 
 
 def main():
@@ -15,6 +17,7 @@ def main():
     page = st.sidebar.radio(
         "Page",
         [
+            "Overview",
             "Market Prices",
             "Generation",
             "Forecast",
@@ -24,7 +27,34 @@ def main():
         ],
     )
 
-    if page == "Market Prices":
+    # per-section timings of this session's runs only (peak memory needs DASHBOARD_PROFILE=1)
+    debug = st.sidebar.checkbox("Debug: section timings", value=DASHBOARD_PROFILE)
+    set_enabled(debug)
+    if debug:
+        start_run(page)
+
+    with section(f"page: {page}"):
+        render_page(page)
+
+    if debug:
+        timings = finish_run()
+        with st.sidebar.expander("Section timings", expanded=True):
+            if timings.empty:
+                st.caption("No sections recorded.")
+            else:
+                timings["section"] = [
+                    "\u00a0\u00a0" * depth + name for depth, name in zip(timings["depth"], timings["section"])
+                ]
+                st.dataframe(
+                    timings.drop(columns="depth").round({"seconds": 3, "peak_mb": 1}),
+                    hide_index=True,
+                )
+
+
+def render_page(page: str):
+    if page == "Overview":
+        render_overview_page()
+    elif page == "Market Prices":
         render_market_prices_page()
     elif page == "Generation":
         render_generation_page()
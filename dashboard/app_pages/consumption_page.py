@@ -12,30 +12,34 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.group_series import (
-    load_group_long as load_group_series_long,
-    filter_by_window as filter_group_window,
-)
+from analysis.group_series import load_group_window
+from analysis.pyramid import DEFAULT_MAX_POINTS
+from analysis.downsample import downsample_wide
+from analysis.instrumentation import section
+from app_pages.versioned_cache import cache_on_versions
 
 
-@st.cache_data(ttl=300)
-def get_consumption_df() -> pd.DataFrame:
-    return load_group_series_long("consumption")
+@cache_on_versions("consumption", served=True)
+def get_consumption_df(window: str) -> pd.DataFrame:
+    """Raw 15-min series of one window, read from that window's partitions only."""
+    return load_group_window("consumption", window)
+
+
+@cache_on_versions("consumption")
+def get_consumption_window_df(window: str) -> pd.DataFrame:
+    """Chart-sized series: raw for short windows, time-pyramid level for long ones."""
+    return load_group_window("consumption", window, max_points=DEFAULT_MAX_POINTS)
 
 
 def render_consumption_page():
     st.title("Consumption – Load & Residual Load")
 
-    df_cons = get_consumption_df()
-    if df_cons.empty:
-        st.warning("No consumption data found.")
-        return
-
     window = st.selectbox("Time window", ["7D", "30D", "90D", "1Y", "max"], index=1)
-    df_view = filter_group_window(df_cons, window)
+    with section("consumption: load"):
+        df_view = get_consumption_df(window)
 
     if df_view.empty:
-        st.warning("No data for selected window.")
+        st.warning("No consumption data for selected window.")
         return
 
     types = sorted(df_view["series"].unique())
@@ -47,24 +51,32 @@ def render_consumption_page():
         return
 
     st.subheader("Consumption time-series")
-    pivot = (
-        df_view
-        .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
-        .sort_index()
-    )
-    st.line_chart(pivot)
+    with section("consumption: chart load"):
+        df_chart = get_consumption_window_df(window)
+    df_chart = df_chart[df_chart["series"].isin(selected_types)]
+    if df_chart.empty:
+        df_chart = df_view
+    with section("consumption: pivot", rows=len(df_chart)):
+        pivot = (
+            df_chart
+            .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
+            .sort_index()
+        )
+    with section("consumption: chart", rows=len(pivot)):
+        st.line_chart(downsample_wide(pivot))
 
     st.subheader("Average diurnal profile")
-    df_d = df_view.copy()
-    df_d["time"] = pd.to_datetime(df_d["time"], utc=True)
-    df_d["hour"] = df_d["time"].dt.hour
-
-    prof = (
-        df_d
-        .groupby(["series", "hour"])["value"]
-        .mean()
-        .reset_index()
-    )
+    with section("consumption: diurnal profile", rows=len(df_view)):
+        df_d = df_view.copy()
+        df_d["time"] = pd.to_datetime(df_d["time"], utc=True)
+        df_d["hour"] = df_d["time"].dt.hour
+
+        prof = (
+            df_d
+            .groupby(["series", "hour"])["value"]
+            .mean()
+            .reset_index()
+        )
 
     line = alt.Chart(prof).mark_line(point=True).encode(
         x=alt.X("hour:O", title="Hour of day"),
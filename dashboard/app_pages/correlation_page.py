@@ -13,24 +13,31 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from app_pages.market_prices_page import get_market_price_df
-from analysis.de_features import build_de_features
+from app_pages.market_prices_page import get_prices_df
+from analysis.de_features import build_de_features, TARGET_COLUMNS, FUNDAMENTAL_COLUMNS
+from analysis.feature_store import load_feature_store, feature_store_watermark
 from analysis.market_price import filter_by_window, WINDOWS
+from analysis.downsample import downsample_wide
+from analysis.instrumentation import section
+from analysis.rolling_corr import rolling_corr_all_pairs, ew_corr_all_pairs, corr_matrix_at
+from analysis.comoment_store import load_comoment_windows, corr_matrix, COMOMENT_WINDOWS
+from app_pages.versioned_cache import cache_on_versions, ALL_GROUPS, STATS
 
 
-def _corr_heatmap(corr: pd.DataFrame, title: str):
+def _corr_heatmap(corr: pd.DataFrame, title: str, axis_title: str = "Zone"):
     if corr.empty:
         st.info(f"No data for {title}.")
         return
 
     df_corr = (
-        corr.reset_index()
+        corr.rename_axis("zone").reset_index()
         .melt("zone", var_name="zone2", value_name="corr")
     )
+    order = list(corr.index)
 
     chart = alt.Chart(df_corr).mark_rect().encode(
-        x=alt.X("zone2:N", title="Zone"),
-        y=alt.Y("zone:N", title="Zone"),
+        x=alt.X("zone2:N", title=axis_title, sort=order),
+        y=alt.Y("zone:N", title=axis_title, sort=order),
         color=alt.Color("corr:Q", title="Correlation", scale=alt.Scale(domain=[-1, 1])),
         tooltip=["zone", "zone2", alt.Tooltip("corr:Q", format=".2f")],
     ).properties(title=title)
@@ -38,15 +45,59 @@ def _corr_heatmap(corr: pd.DataFrame, title: str):
     st.altair_chart(chart, use_container_width=True)
 
 
+@cache_on_versions(STATS, *ALL_GROUPS)
+def get_de_features(max_days: int = 365) -> pd.DataFrame:
+    """
+    Last `max_days` of the DE targets + fundamentals from the feature store,
+    falling back to build_de_features() if the store is not built yet.
+    """
+    end = feature_store_watermark()
+    if end is not None:
+        feat = load_feature_store(
+            columns=TARGET_COLUMNS + FUNDAMENTAL_COLUMNS,
+            start=end - pd.Timedelta(days=max_days),
+            end=end,
+        )
+        if not feat.empty:
+            return feat
+    return build_de_features(TARGET_COLUMNS + FUNDAMENTAL_COLUMNS)
+
+
+@cache_on_versions(STATS)
+def get_comoment_windows() -> pd.DataFrame:
+    """Feature x feature covariance / correlation matrices written by the stats pipeline."""
+    return load_comoment_windows()
+
+
+@cache_on_versions("market_price")
+def get_rolling_corr(val_col: str, window_days: int, method: str) -> pd.DataFrame:
+    """All zone-pair rolling (or EW) correlations on the 15-min grid, cached per window."""
+    prices = get_prices_df("max")
+    with section("rolling corr: pivot", rows=len(prices)):
+        wide = prices.pivot_table(index="time", columns="zone", values=val_col).sort_index()
+        if wide.empty:
+            return wide
+        wide = wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq="15min"))
+        wide = wide.replace([np.inf, -np.inf], np.nan)
+
+    steps = window_days * 96  # 96 quarter-hours per day
+    with section("rolling corr: compute", rows=len(wide)):
+        if method == "Exponential":
+            return ew_corr_all_pairs(wide, halflife=steps)
+        return rolling_corr_all_pairs(wide, window=steps, min_periods=max(steps // 2, 1))
+
+
 def render_correlation_page():
     st.title("Correlation & Analytics")
 
-    prices = get_market_price_df()
+    # recent prices: zone list / empty check (each tab loads its own window)
+    prices = get_prices_df("30D")
     if prices.empty:
         st.warning("No market price data available.")
         return
 
-    feat_de = build_de_features()
+    with section("features: load"):
+        feat_de = get_de_features()
     if feat_de.empty:
         st.warning("DE feature set is empty; DE-specific plots will be limited.")
     else:
@@ -73,20 +124,22 @@ def render_correlation_page():
             help="Window used for correlation computation.",
         )
 
-        df_w = filter_by_window(prices, window_key)
+        with section("heatmaps: load"):
+            df_w = filter_by_window(get_prices_df(window_key), window_key)
         if df_w.empty:
             st.warning("No data in selected window.")
         else:
-            price_wide = (
-                df_w
-                .pivot_table(index="time", columns="zone", values="price")
-                .dropna(how="all", axis=1)
-            )
-            ret_wide = (
-                df_w
-                .pivot_table(index="time", columns="zone", values="return")
-                .dropna(how="all", axis=1)
-            )
+            with section("heatmaps: pivot", rows=len(df_w)):
+                price_wide = (
+                    df_w
+                    .pivot_table(index="time", columns="zone", values="price")
+                    .dropna(how="all", axis=1)
+                )
+                ret_wide = (
+                    df_w
+                    .pivot_table(index="time", columns="zone", values="return")
+                    .dropna(how="all", axis=1)
+                )
 
             if not price_wide.empty:
                 corr_price = price_wide.corr()
@@ -102,61 +155,65 @@ def render_correlation_page():
     # TAB 2 – Rolling correlations
     # ============================
     with tab_roll:
-        st.subheader("Rolling correlation between two zones")
+        st.subheader("Rolling correlations – all zone pairs")
 
         zones = sorted(z for z in prices["zone"].unique() if pd.notna(z))
         if len(zones) < 2:
             st.warning("Need at least two zones for rolling correlations.")
         else:
-            col1, col2, col3 = st.columns(3)
+            col1, col2 = st.columns(2)
             with col1:
-                z1 = st.selectbox("Zone 1", zones)
-            with col2:
-                z2 = st.selectbox("Zone 2", [z for z in zones if z != z1])
-            with col3:
                 series_type = st.radio("Series", ["Price", "Returns"], horizontal=True)
+            with col2:
+                method = st.radio("Weighting", ["Rolling window", "Exponential"], horizontal=True)
 
             window_days = st.slider(
-                "Rolling window (days)",
+                "Rolling window / half-life (days)",
                 min_value=1,
                 max_value=60,
                 value=7,
                 step=1,
-                help="Window length converted to 15-min observations.",
+                help="Converted to 15-min observations.",
             )
-            steps = window_days * 96  # 96 quarter-hours per day
 
-            df_pair = prices[prices["zone"].isin([z1, z2])].copy()
-            if df_pair.empty:
-                st.warning("No data for selected zones.")
+            val_col = "price" if series_type == "Price" else "return"
+            with section("rolling corr"):
+                df_roll_all = get_rolling_corr(val_col, window_days, method)
+            if df_roll_all.empty or df_roll_all.dropna(how="all").empty:
+                st.info("Not enough data for rolling correlation.")
             else:
-                val_col = "price" if series_type == "Price" else "return"
-                wide = (
-                    df_pair
-                    .pivot_table(index="time", columns="zone", values=val_col)
-                    .sort_index()
-                    .dropna()
-                )
-                if z1 not in wide.columns or z2 not in wide.columns:
-                    st.warning("Missing data for one of the zones.")
-                else:
-                    rolling_corr = (
-                        wide[z1]
-                        .rolling(window=steps, min_periods=max(steps // 2, 1))
-                        .corr(wide[z2])
-                    )
-                    df_roll = rolling_corr.dropna().to_frame("rolling_corr")
-                    if df_roll.empty:
-                        st.info("Not enough data for rolling correlation.")
-                    else:
-                        chart = alt.Chart(
-                            df_roll.reset_index()
-                        ).mark_line().encode(
-                            x=alt.X("time:T", title="Time"),
-                            y=alt.Y("rolling_corr:Q", title=f"Rolling corr {z1}–{z2}"),
+                all_pairs = list(df_roll_all.columns)
+                shown = st.multiselect("Zone pairs", all_pairs, default=all_pairs)
+                if shown:
+                    with section("rolling corr: downsample", rows=len(df_roll_all)):
+                        df_roll = downsample_wide(df_roll_all[shown].dropna(how="all"))
+                    chart = alt.Chart(
+                        df_roll.reset_index().rename(columns={"index": "time"}).melt(
+                            "time", var_name="pair", value_name="rolling_corr"
                         )
+                    ).mark_line().encode(
+                        x=alt.X("time:T", title="Time"),
+                        y=alt.Y("rolling_corr:Q", title="Rolling correlation", scale=alt.Scale(domain=[-1, 1])),
+                        color=alt.Color("pair:N", title="Pair"),
+                    )
+                    with section("rolling corr: altair chart", rows=len(df_roll)):
                         st.altair_chart(chart, use_container_width=True)
 
+                # whole matrix at one point in time
+                days = df_roll_all.dropna(how="all").index.normalize().unique()
+                day = st.select_slider(
+                    "Correlation matrix as of",
+                    options=list(days),
+                    value=days[-1],
+                    format_func=lambda d: d.strftime("%Y-%m-%d"),
+                )
+                row = df_roll_all.loc[: day + pd.Timedelta(days=1) - pd.Timedelta(minutes=15)].dropna(how="all")
+                if not row.empty:
+                    _corr_heatmap(
+                        corr_matrix_at(row.iloc[-1], zones),
+                        f"{series_type} correlations as of {row.index[-1]:%Y-%m-%d %H:%M}",
+                    )
+
     # ============================
     # TAB 3 – Price vs fundamentals (DE)
     # ============================
@@ -167,40 +224,38 @@ def render_correlation_page():
             st.warning("DE feature set not available.")
             return
 
-        # Align window to last N days
-        window_days = st.slider(
-            "Window (days, last N days of DE data)",
-            min_value=5,
-            max_value=365,
-            value=60,
-            step=5,
+        window_key = st.selectbox(
+            "Window (last N days of DE data)",
+            list(COMOMENT_WINDOWS.keys()),
+            index=1,
         )
+        window_days = COMOMENT_WINDOWS[window_key]
+        with section("comoments: load"):
+            comoments = get_comoment_windows()
+        stored = comoments[comoments["window"] == window_key]
+
+        if not stored.empty:
+            _corr_heatmap(
+                corr_matrix(comoments, window_key),
+                f"Feature correlations, last {window_key} up to {stored['as_of'].max():%Y-%m-%d}",
+                axis_title="Feature",
+            )
+
         idx = feat_de.index
-        end = idx.max()
-        start = end - pd.Timedelta(days=window_days)
+        if not stored.empty:
+            # same closed days as the stored correlation next to the scatter
+            end = stored["as_of"].max() + pd.Timedelta(days=1) - pd.Timedelta(minutes=15)
+            start = end.floor("D") - pd.Timedelta(days=window_days - 1)
+        else:
+            end = idx.max()
+            start = end - pd.Timedelta(days=window_days)
         feat_view = feat_de.loc[(idx >= start) & (idx <= end)].copy()
 
         target_type = st.radio("Target", ["Price (price_de)", "Returns (ret_de)"], horizontal=True)
         y_col = "price_de" if target_type.startswith("Price") else "ret_de"
 
         # candidate fundamentals
-        candidates = [
-            "residual_load",
-            "load_total",
-            "gen_total",
-            "wind_gen",
-            "solar_gen",
-            "wind_share",
-            "solar_share",
-            "res_share",
-            "wind_fc",
-            "solar_fc",
-            "res_fc",
-            "error_wind",
-            "error_solar",
-            "error_res",
-        ]
-        candidates = [c for c in candidates if c in feat_view.columns]
+        candidates = [c for c in FUNDAMENTAL_COLUMNS if c in feat_view.columns]
 
         if not candidates:
             st.warning("No fundamental features found in DE feature set.")
@@ -213,10 +268,16 @@ def render_correlation_page():
             st.info("No overlapping data for selected variables.")
             return
 
-        corr = np.corrcoef(df_plot[x_col], df_plot[y_col])[0, 1]
+        pair = stored[(stored["x"] == x_col) & (stored["y"] == y_col)]
+        if not pair.empty and np.isfinite(pair["corr"].iloc[0]):
+            corr = float(pair["corr"].iloc[0])
+        else:
+            # store not built yet
+            corr = np.corrcoef(df_plot[x_col], df_plot[y_col])[0, 1]
 
         st.markdown(
-            f"**Pearson correlation between {x_col} and {y_col}:** `{corr:.3f}`"
+            f"**Pearson correlation between {x_col} and {y_col}:** `{corr:.3f}` "
+            f"({start:%Y-%m-%d} to {end:%Y-%m-%d})"
         )
 
         scatter = alt.Chart(df_plot.reset_index()).mark_circle(size=20, opacity=0.5).encode(
@@ -224,4 +285,5 @@ def render_correlation_page():
             y=alt.Y(f"{y_col}:Q", title=y_col),
             tooltip=[x_col, y_col],
         )
-        st.altair_chart(scatter, use_container_width=True)
\ No newline at end of file
+        with section("scatter: altair chart", rows=len(df_plot)):
+            st.altair_chart(scatter, use_container_width=True)
\ No newline at end of file
@@ -14,26 +14,33 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from analysis.group_series import (
-    load_group_long as load_group_series_long,
+    load_group_window,
     filter_by_window as filter_group_window,
 )
+from analysis.downsample import downsample_wide
+from analysis.instrumentation import section
+from app_pages.versioned_cache import cache_on_versions
 
 
-@st.cache_data(ttl=300)
-def get_generation_df() -> pd.DataFrame:
-    return load_group_series_long("generation")
+@cache_on_versions("generation", served=True)
+def get_generation_df(window: str) -> pd.DataFrame:
+    """Raw 15-min series of one window, read from that window's partitions only."""
+    return load_group_window("generation", window)
 
 
-@st.cache_data(ttl=300)
-def get_forecast_df() -> pd.DataFrame:
-    return load_group_series_long("forecast")
+@cache_on_versions("forecast", served=True)
+def get_forecast_df(window: str) -> pd.DataFrame:
+    return load_group_window("forecast", window)
 
 
 def render_forecast_page():
     st.title("Forecast vs Actual – By Technology")
 
-    df_gen = get_generation_df()
-    df_fc = get_forecast_df()
+    window = st.selectbox("Time window", ["7D", "30D", "90D", "1Y", "max"], index=1)
+
+    with section("forecast: load"):
+        df_gen = get_generation_df(window)
+        df_fc = get_forecast_df(window)
 
     if df_gen.empty or df_fc.empty:
         st.warning("Need both generation and forecast data.")
@@ -48,8 +55,6 @@ def render_forecast_page():
     with col2:
         gen_choice = st.selectbox("Actual generation series", gen_series)
 
-    window = st.selectbox("Time window", ["7D", "30D", "90D", "1Y", "max"], index=1)
-
     df_fc_sel = filter_group_window(df_fc[df_fc["series"] == fc_choice], window)
     df_gen_sel = filter_group_window(df_gen[df_gen["series"] == gen_choice], window)
 
@@ -57,14 +62,15 @@ def render_forecast_page():
         st.warning("No overlapping data for selection.")
         return
 
-    merged = pd.merge_asof(
-        df_gen_sel.sort_values("time"),
-        df_fc_sel.sort_values("time"),
-        on="time",
-        direction="nearest",
-        tolerance=pd.Timedelta(minutes=15),
-        suffixes=("_actual", "_forecast"),
-    ).dropna(subset=["value_actual", "value_forecast"])
+    with section("forecast: match actuals", rows=len(df_gen_sel)):
+        merged = pd.merge_asof(
+            df_gen_sel.sort_values("time"),
+            df_fc_sel.sort_values("time"),
+            on="time",
+            direction="nearest",
+            tolerance=pd.Timedelta(minutes=15),
+            suffixes=("_actual", "_forecast"),
+        ).dropna(subset=["value_actual", "value_forecast"])
 
     if merged.empty:
         st.warning("No matched forecast/actual points within 15-minute tolerance.")
@@ -72,7 +78,8 @@ def render_forecast_page():
 
     st.subheader("Forecast vs actual (time-series)")
     df_ts = merged[["time", "value_actual", "value_forecast"]].set_index("time")
-    st.line_chart(df_ts)
+    with section("forecast: chart", rows=len(df_ts)):
+        st.line_chart(downsample_wide(df_ts))
 
     merged["error"] = merged["value_actual"] - merged["value_forecast"]
 
@@ -90,7 +97,8 @@ def render_forecast_page():
         x=alt.X("error:Q", bin=alt.Bin(maxbins=50), title="Forecast error"),
         y="count():Q",
     )
-    st.altair_chart(hist_err, use_container_width=True)
+    with section("forecast: error histogram", rows=len(merged)):
+        st.altair_chart(hist_err, use_container_width=True)
 
     merged["hour"] = pd.to_datetime(merged["time"], utc=True).dt.hour
     st.markdown("**Forecast error by hour-of-day**")
@@ -98,4 +106,5 @@ def render_forecast_page():
         x="hour:O",
         y="error:Q",
     )
-    st.altair_chart(box_err_hour, use_container_width=True)
+    with section("forecast: error boxplot", rows=len(merged)):
+        st.altair_chart(box_err_hour, use_container_width=True)
@@ -12,30 +12,34 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.group_series import (
-    load_group_long as load_group_series_long,
-    filter_by_window as filter_group_window,
-)
+from analysis.group_series import load_group_window
+from analysis.pyramid import DEFAULT_MAX_POINTS
+from analysis.downsample import downsample_wide
+from analysis.instrumentation import section
+from app_pages.versioned_cache import cache_on_versions
 
 
-@st.cache_data(ttl=300)
-def get_generation_df() -> pd.DataFrame:
-    return load_group_series_long("generation")
+@cache_on_versions("generation", served=True)
+def get_generation_df(window: str) -> pd.DataFrame:
+    """Raw 15-min series of one window, read from that window's partitions only."""
+    return load_group_window("generation", window)
+
+
+@cache_on_versions("generation")
+def get_generation_window_df(window: str) -> pd.DataFrame:
+    """Chart-sized series: raw for short windows, time-pyramid level for long ones."""
+    return load_group_window("generation", window, max_points=DEFAULT_MAX_POINTS)
 
 
 def render_generation_page():
     st.title("Generation – By Technology")
 
-    df_gen = get_generation_df()
-    if df_gen.empty:
-        st.warning("No generation data found.")
-        return
-
     window = st.selectbox("Time window", ["7D", "30D", "90D", "1Y", "max"], index=1)
-    df_view = filter_group_window(df_gen, window)
+    with section("generation: load"):
+        df_view = get_generation_df(window)
 
     if df_view.empty:
-        st.warning("No data for selected window.")
+        st.warning("No generation data for selected window.")
         return
 
     techs = sorted(df_view["series"].unique())
@@ -48,22 +52,33 @@ def render_generation_page():
 
     normalize = st.checkbox("Normalize to % of total (generation mix)", value=False)
 
-    pivot = (
-        df_view
-        .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
-        .fillna(0.0)
-        .sort_index()
-    )
-
-    if normalize:
+    with section("generation: chart load"):
+        df_chart = get_generation_window_df(window)
+    df_chart = df_chart[df_chart["series"].isin(selected_techs)]
+    if df_chart.empty:
+        df_chart = df_view
+
+    with section("generation: pivot", rows=len(df_chart)):
+        pivot = (
+            df_chart
+            .pivot_table(index="time", columns="series", values="value", aggfunc="mean")
+            .fillna(0.0)
+            .sort_index()
+        )
+
+        # raw-MW stack total: the downsampling key in both modes (normalized rows all sum to 100)
         row_sum = pivot.sum(axis=1)
-        pivot = pivot.div(row_sum.where(row_sum != 0), axis=0) * 100.0
-        y_title = "% of total generation"
-    else:
-        y_title = "Generation (MW)"
+        if normalize:
+            pivot = pivot.div(row_sum.where(row_sum != 0), axis=0) * 100.0
+            y_title = "% of total generation"
+        else:
+            y_title = "Generation (MW)"
 
     st.subheader("Generation by technology (stacked area)")
-    df_plot = pivot.reset_index().melt("time", var_name="series", value_name="value")
+    with section("generation: downsample", rows=len(pivot)):
+        # keep rows on the stack total so peaks / troughs of the whole area survive
+        pivot = downsample_wide(pivot, key=row_sum)
+        df_plot = pivot.reset_index().melt("time", var_name="series", value_name="value")
 
     area = alt.Chart(df_plot).mark_area().encode(
         x=alt.X("time:T"),
@@ -71,20 +86,22 @@ def render_generation_page():
         color=alt.Color("series:N"),
         tooltip=["time:T", "series:N", "value:Q"],
     )
-    st.altair_chart(area, use_container_width=True)
+    with section("generation: area chart", rows=len(df_plot)):
+        st.altair_chart(area, use_container_width=True)
 
     st.subheader("Average diurnal profile")
 
-    df_diurnal = df_view.copy()
-    df_diurnal["time"] = pd.to_datetime(df_diurnal["time"], utc=True)
-    df_diurnal["hour"] = df_diurnal["time"].dt.hour
-
-    prof = (
-        df_diurnal
-        .groupby(["series", "hour"])["value"]
-        .mean()
-        .reset_index()
-    )
+    with section("generation: diurnal profile", rows=len(df_view)):
+        df_diurnal = df_view.copy()
+        df_diurnal["time"] = pd.to_datetime(df_diurnal["time"], utc=True)
+        df_diurnal["hour"] = df_diurnal["time"].dt.hour
+
+        prof = (
+            df_diurnal
+            .groupby(["series", "hour"])["value"]
+            .mean()
+            .reset_index()
+        )
 
     line = alt.Chart(prof).mark_line(point=True).encode(
         x=alt.X("hour:O", title="Hour of day"),
@@ -2,8 +2,8 @@
 # %%
 
 import sys
+import time
 from pathlib import Path
-from statsmodels.tsa.stattools import acf, pacf, adfuller, kpss
 import altair as alt
 import numpy as np
 import pandas as pd
@@ -14,21 +14,85 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from analysis.market_price import (
-    load_prices_with_returns,
+    load_prices_for_window,
+    load_prices_window,
     filter_by_window,
     compute_spreads,
     WINDOWS,
     add_rolling_volatility,
     add_technical_indicators,
     make_heatmap_frame,
+    ZONE_BY_FILTER_ID,
 )
+from analysis.baseline_forecast import load_baseline_forecasts
+from analysis.diagnostics import acf_pacf, diagnostics_key, submit_stationarity_tests, MAX_LAGS
+from analysis.job_queue import shared_queue
+from analysis.streaming_indicators import load_indicator_long
+from analysis.pyramid import DEFAULT_MAX_POINTS
+from analysis.downsample import downsample_wide
+from analysis.instrumentation import section
+from analysis.spread_cube import (
+    load_spread_cube,
+    load_hourly_spread_stats,
+    spreads_vs,
+    hourly_spreads_vs,
+)
+from app_pages.versioned_cache import cache_on_versions, STATS
+
+
+@cache_on_versions("market_price", served=True)
+def get_prices_df(window_key: str) -> pd.DataFrame:
+    """Prices and returns of one window, read from that window's partitions only."""
+    return load_prices_for_window(window_key)
+
+@cache_on_versions("market_price")
+def get_price_window_df(window_key: str) -> pd.DataFrame:
+    """Chart-sized prices: raw for short windows, time-pyramid level for long ones."""
+    return load_prices_window(window_key, max_points=DEFAULT_MAX_POINTS)
+
+@cache_on_versions(STATS)
+def get_baseline_df(start: pd.Timestamp) -> pd.DataFrame:
+    """Stored baseline forecasts from `start` on (including the horizon ahead)."""
+    fc = load_baseline_forecasts(start=start)
+    fc["zone"] = fc["filter_id"].map(ZONE_BY_FILTER_ID)
+    return fc
+
+POLL_SECONDS = 1.0
+
+@st.cache_data(max_entries=32)
+def get_acf_pacf(key: str, _values: np.ndarray) -> pd.DataFrame:
+    """ACF / PACF up to MAX_LAGS, cached by diagnostics_key (the values are not hashed)."""
+    return acf_pacf(_values, MAX_LAGS)
+
+@cache_on_versions("market_price")
+def get_indicator_df() -> pd.DataFrame:
+    """Indicator series maintained by the ingest job (empty if not built yet)."""
+    return load_indicator_long()
+
+@cache_on_versions(STATS)
+def get_spread_cube() -> pd.DataFrame:
+    """All-pairs spread cube maintained by the stats pipeline (empty if not built yet)."""
+    return load_spread_cube()
+
+@cache_on_versions(STATS)
+def get_hourly_spread_stats() -> pd.DataFrame:
+    return load_hourly_spread_stats()
+
+
+def get_spreads(df_window: pd.DataFrame, ref_zone: str, window_key: str) -> pd.DataFrame:
+    """
+    Spreads vs ref_zone for the window: a column lookup in the spread cube,
+    falling back to compute_spreads on the loaded prices.
+    """
+    cube = get_spread_cube()
+    if not cube.empty:
+        try:
+            return spreads_vs(filter_by_window(cube, window_key), ref_zone)
+        except ValueError:
+            pass
+    return compute_spreads(df_window, ref_zone)
 
-
-@st.cache_data(ttl=300)
-def get_market_price_df() -> pd.DataFrame:
-    return load_prices_with_returns()
-
-@st.cache_data(ttl=300)
+@cache_on_versions(STATS)
 def load_precomputed_stats() -> pd.DataFrame:
     stats_fast_path = PROJECT_ROOT / "data" / "stats" / "market_price_stats_fast.parquet"
     stats_slow_path = PROJECT_ROOT / "data" / "stats" / "market_price_stats_slow.parquet"
@@ -51,11 +115,6 @@ def load_precomputed_stats() -> pd.DataFrame:
 def render_market_prices_page():
     st.title("Market Prices – Multi-Country Overview")
 
-    df = get_market_price_df()
-    if df.empty:
-        st.warning("No market price data found.")
-        return
-
     stats_all = load_precomputed_stats()
 
     tab_overview, tab_deep = st.tabs(["Overview", "Market Prices – Deep Dive"])
@@ -72,6 +131,11 @@ def render_market_prices_page():
             index=2,
         )
 
+        df = get_prices_df(window_key)
+        if df.empty:
+            st.warning("No market price data found.")
+            return
+
         zones_raw = df["zone"].unique()
         zones = sorted(z for z in zones_raw if pd.notna(z))
 
@@ -97,30 +161,51 @@ def render_market_prices_page():
 
         # Prices
         st.subheader(f"Prices by zone ({window_key})")
-        price_pivot = (
-            df_view
-            .pivot(index="time", columns="zone", values="price")
-            .sort_index()
-        )
-        st.line_chart(price_pivot)
+        df_price_chart = get_price_window_df(window_key)
+        df_price_chart = df_price_chart[df_price_chart["zone"].isin(selected_zones)]
+        if df_price_chart.empty:
+            df_price_chart = df_view
+        with section("prices: pivot", rows=len(df_price_chart)):
+            price_pivot = (
+                df_price_chart
+                .pivot(index="time", columns="zone", values="price")
+                .sort_index()
+            )
+        with section("prices: chart"):
+            st.line_chart(downsample_wide(price_pivot))
+
+        # Baseline forecast (written by the stats job, no fitting here)
+        df_baseline = get_baseline_df(df["time"].max().floor("D") - pd.Timedelta(days=2))
+        df_baseline = df_baseline[df_baseline["zone"].isin(selected_zones)]
+        if not df_baseline.empty:
+            st.subheader("Baseline day-ahead forecast (ridge + Fourier)")
+            fc_pivot = df_baseline.pivot(index="time", columns="zone", values="forecast")
+            fc_pivot.columns = [f"{z} (baseline)" for z in fc_pivot.columns]
+            df_recent = get_prices_df("7D")
+            recent = df_recent[
+                df_recent["zone"].isin(selected_zones)
+                & (df_recent["time"] >= fc_pivot.index.min() - pd.Timedelta(days=1))
+            ].pivot(index="time", columns="zone", values="price")
+            st.line_chart(recent.join(fc_pivot, how="outer").sort_index())
 
         # Returns
         st.subheader(f"Returns by zone ({window_key})")
-        return_pivot = (
-            df_view
-            .pivot(index="time", columns="zone", values="return")
-            .sort_index()
-        )
-        return_pivot = return_pivot.dropna(how="all", axis=1)
+        with section("returns: pivot", rows=len(df_view)):
+            return_pivot = (
+                df_view
+                .pivot(index="time", columns="zone", values="return")
+                .sort_index()
+            )
+            return_pivot = return_pivot.dropna(how="all", axis=1)
         if return_pivot.empty:
             st.info("Not enough data points to compute returns in this window.")
         else:
-            st.line_chart(return_pivot)
+            st.line_chart(downsample_wide(return_pivot))
 
         # Spreads vs reference
         st.subheader(f"Spreads vs {ref_zone} ({window_key})")
         try:
-            df_spreads = compute_spreads(df_view, ref_zone)
+            df_spreads = get_spreads(df_view, ref_zone, window_key)
             keep_zones = [z for z in selected_zones if z != ref_zone]
             df_spreads = df_spreads[df_spreads["zone"].isin(keep_zones)]
             if df_spreads.empty:
@@ -131,7 +216,7 @@ def render_market_prices_page():
                     .pivot(index="time", columns="zone", values="spread")
                     .sort_index()
                 )
-                st.line_chart(spread_pivot)
+                st.line_chart(downsample_wide(spread_pivot))
         except ValueError as e:
             st.info(str(e))
 
@@ -198,7 +283,8 @@ def render_market_prices_page():
         )
 
         # Data for this zone + window
-        df_zone = df[df["zone"] == deep_zone].copy()
+        df_deep = get_prices_df(deep_window)
+        df_zone = df_deep[df_deep["zone"] == deep_zone].copy()
         df_zone = filter_by_window(df_zone, deep_window)
 
         if df_zone.empty:
@@ -212,17 +298,17 @@ def render_market_prices_page():
             series = df_zone[["time", "price"]].set_index("time")
             if log_scale:
                 series = np.log(series)
-            st.line_chart(series)
+            st.line_chart(downsample_wide(series))
         else:
             series = df_zone[["time", "return"]].set_index("time").dropna()
-            st.line_chart(series)
+            st.line_chart(downsample_wide(series))
 
         # Spreads vs reference
         st.subheader(f"Spreads vs {ref_zone_deep}")
 
-        df_window = filter_by_window(df, deep_window)
+        df_window = filter_by_window(df_deep, deep_window)
         try:
-            df_spreads_all = compute_spreads(df_window, ref_zone_deep)
+            df_spreads_all = get_spreads(df_window, ref_zone_deep, deep_window)
             df_spreads_zone = df_spreads_all[df_spreads_all["zone"] == deep_zone].copy()
         except ValueError:
             df_spreads_zone = pd.DataFrame(columns=["time", "zone", "spread"])
@@ -235,7 +321,7 @@ def render_market_prices_page():
                 .set_index("time")
                 .sort_index()
             )
-            st.line_chart(spread_series)
+            st.line_chart(downsample_wide(spread_series))
 
             big_spreads = df_spreads_zone[
                 df_spreads_zone["spread"].abs() >= spread_thresh
@@ -260,12 +346,16 @@ def render_market_prices_page():
             )
             st.altair_chart(box_spread_hour, use_container_width=True)
 
-            stats_hour = (
-                df_sp_hour.groupby("hour")["spread"]
-                .agg(["mean", "median", "count"])
-                .reset_index()
-                .sort_values("hour")
+            stats_hour = hourly_spreads_vs(
+                get_hourly_spread_stats(), deep_zone, ref_zone_deep, deep_window
             )
+            if stats_hour.empty:
+                stats_hour = (
+                    df_sp_hour.groupby("hour")["spread"]
+                    .agg(["mean", "median", "count"])
+                    .reset_index()
+                    .sort_values("hour")
+                )
             st.markdown("**Average / median spread by hour-of-day**")
             st.dataframe(
                 stats_hour.style.format({"mean": "{:.2f}", "median": "{:.2f}"})
@@ -319,10 +409,18 @@ def render_market_prices_page():
                 )
                 st.altair_chart(box_dow, use_container_width=True)
 
+        # Stored streaming indicators (fall back to computing on the window)
+        df_ind = get_indicator_df()
+        df_ind_zone = filter_by_window(df_ind[df_ind["zone"] == deep_zone], deep_window)
+
         # Volatility
         st.subheader("Rolling volatility")
 
-        df_zone_vol = add_rolling_volatility(df_zone, periods=96)
+        if not df_ind_zone.empty:
+            df_zone_vol = df_ind_zone
+        else:
+            with section("volatility: compute", rows=len(df_zone)):
+                df_zone_vol = add_rolling_volatility(df_zone, periods=96)
         vol_series = (
             df_zone_vol[["time", "rolling_std"]]
             .set_index("time")
@@ -332,33 +430,41 @@ def render_market_prices_page():
         if vol_series.empty:
             st.info("Not enough data for rolling volatility.")
         else:
-            st.line_chart(vol_series)
+            st.line_chart(downsample_wide(vol_series))
 
         # Technical indicators
         st.subheader("Technical indicators")
 
-        df_zone_ta = add_technical_indicators(df_zone)
+        if not df_ind_zone.empty:
+            df_zone_ta = df_ind_zone
+        else:
+            with section("indicators: compute", rows=len(df_zone)):
+                df_zone_ta = add_technical_indicators(df_zone)
         ta = df_zone_ta.set_index("time").sort_index()
 
         if {"price", "ma_short", "ma_long"} <= set(ta.columns):
             ta_ma = ta[["price", "ma_short", "ma_long"]].dropna()
-            st.line_chart(ta_ma)
+            st.line_chart(downsample_wide(ta_ma))
 
         if "rsi" in ta.columns:
             st.markdown("**RSI**")
             rsi_series = ta[["rsi"]].dropna()
-            st.line_chart(rsi_series)
+            st.line_chart(downsample_wide(rsi_series))
 
         if {"macd", "macd_signal"} <= set(ta.columns):
             st.markdown("**MACD**")
             macd_df = ta[["macd", "macd_signal"]].dropna()
-            st.line_chart(macd_df)
+            st.line_chart(downsample_wide(macd_df))
 
         # Heatmaps
         st.subheader("Heatmaps")
 
-        df_zone_heat = make_heatmap_frame(df_zone, value_col="price")
-        df_zone_heat = df_zone_heat[df_zone_heat["zone"] == deep_zone]
+        with section("heatmap: frame", rows=len(df_zone)):
+            df_zone_heat = make_heatmap_frame(df_zone, value_col="price")
+            df_zone_heat = df_zone_heat[df_zone_heat["zone"] == deep_zone]
+            df_zone_heat = (
+                df_zone_heat.groupby(["zone", "date", "hour"], as_index=False)["value"].mean()
+            )
 
         if df_zone_heat.empty:
             st.info("No data for price heatmap.")
@@ -369,13 +475,17 @@ def render_market_prices_page():
                 color=alt.Color("value:Q", title="Price"),
             )
             st.markdown("**Price heatmap**")
-            st.altair_chart(heat, use_container_width=True)
+            with section("heatmap: altair chart", rows=len(df_zone_heat)):
+                st.altair_chart(heat, use_container_width=True)
 
         if not df_spreads_zone.empty:
             df_spread_heat = df_spreads_zone.copy()
             df_spread_heat["time"] = pd.to_datetime(df_spread_heat["time"], utc=True)
             df_spread_heat["date"] = df_spread_heat["time"].dt.date
             df_spread_heat["hour"] = df_spread_heat["time"].dt.hour
+            df_spread_heat = (
+                df_spread_heat.groupby(["date", "hour"], as_index=False)["spread"].mean()
+            )
 
             heat_spread = alt.Chart(df_spread_heat).mark_rect().encode(
                 x=alt.X("date:T", title="Date"),
@@ -400,7 +510,7 @@ def render_market_prices_page():
         if ts.empty:
             st.info("Not enough data for ACF/PACF & stationarity tests.")
         else:
-            max_lags = min(300, len(ts) - 1) if len(ts) > 1 else 1
+            max_lags = min(MAX_LAGS, len(ts) - 1) if len(ts) > 1 else 1
             nlags = st.slider(
                 "Number of lags",
                 min_value=10,
@@ -409,18 +519,18 @@ def render_market_prices_page():
                 step=5,
             )
 
-            # ACF / PACF
-            acf_vals = acf(ts, nlags=nlags, fft=True)
-            pacf_vals = pacf(ts, nlags=nlags)
+            # ACF / PACF: computed once at MAX_LAGS for this data, sliced per slider value
+            watermark = df_deep.loc[df_deep["zone"] == deep_zone, "time"].max()
+            diag_key = diagnostics_key(deep_zone, deep_window, ts_col, watermark)
+            with section("acf/pacf", rows=len(ts)):
+                df_diag = get_acf_pacf(diag_key, ts.to_numpy())
+            df_diag = df_diag[df_diag["lag"] <= nlags]
 
-            df_acf = pd.DataFrame({"lag": np.arange(len(acf_vals)), "acf": acf_vals})
-            df_pacf = pd.DataFrame({"lag": np.arange(len(pacf_vals)), "pacf": pacf_vals})
-
-            acf_chart = alt.Chart(df_acf).mark_bar().encode(
+            acf_chart = alt.Chart(df_diag).mark_bar().encode(
                 x=alt.X("lag:O", title="Lag"),
                 y=alt.Y("acf:Q", title="ACF"),
             ).properties(title=f"ACF of {ts_col}")
-            pacf_chart = alt.Chart(df_pacf).mark_bar().encode(
+            pacf_chart = alt.Chart(df_diag).mark_bar().encode(
                 x=alt.X("lag:O", title="Lag"),
                 y=alt.Y("pacf:Q", title="PACF"),
             ).properties(title=f"PACF of {ts_col}")
@@ -428,35 +538,23 @@ def render_market_prices_page():
             st.altair_chart(acf_chart, use_container_width=True)
             st.altair_chart(pacf_chart, use_container_width=True)
 
-            # Stationarity tests: ADF + KPSS
+            # Stationarity tests: ADF + KPSS, in the background job queue
             st.markdown("**Stationarity tests (ADF & KPSS)**")
 
-            results_rows = []
-
-            # ADF: H0 = non-stationary (unit root)
-            try:
-                adf_stat, adf_p, _, _, adf_crit, _ = adfuller(ts.dropna(), autolag="AIC")
-                adf_verdict = "Likely stationary" if adf_p < 0.05 else "Likely non-stationary"
-            except Exception as e:
-                adf_p = np.nan
-                adf_verdict = f"Error: {e}"
-
-            results_rows.append(
-                {"Test": "ADF", "p-value": adf_p, "Verdict": adf_verdict}
-            )
-
-            # KPSS: H0 = stationary
-            try:
-                kpss_stat, kpss_p, _, kpss_crit = kpss(ts.dropna(), regression="c", nlags="auto")
-                kpss_verdict = "Likely non-stationary" if kpss_p < 0.05 else "Likely stationary"
-            except Exception as e:
-                kpss_p = np.nan
-                kpss_verdict = f"Error: {e}"
-
-            results_rows.append(
-                {"Test": "KPSS", "p-value": kpss_p, "Verdict": kpss_verdict}
-            )
-
-            df_tests = pd.DataFrame(results_rows)
-            st.dataframe(df_tests.style.format({"p-value": "{:.4f}"}))
+            queue = shared_queue()
+            status = queue.status(diag_key)
+            if status["state"] == "unknown":
+                # submit once per key: a failed job stays failed until the data (key) changes,
+                # instead of being resubmitted by every widget interaction
+                submit_stationarity_tests(queue, diag_key, ts.to_numpy())
+                status = queue.status(diag_key)
+            if status["state"] in ("queued", "running"):
+                st.info(f"Running ADF / KPSS in the background ({status['elapsed']:.0f}s)…")
+                time.sleep(POLL_SECONDS)
+                st.rerun()
+            elif status["state"] == "failed":
+                st.error(f"Stationarity tests failed: {status['error']}")
+            else:
+                df_tests = status["result"]
+                st.dataframe(df_tests.style.format({"p-value": "{:.4f}"}))
 
@@ -0,0 +1,103 @@
+# app_pages/overview_page.py
+# %%
+
+import sys
+from pathlib import Path
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.market_price import ZONE_BY_FILTER_ID
+from analysis.snapshot import load_snapshot
+from analysis.instrumentation import section
+from app_pages.versioned_cache import cache_on_versions, ALL_GROUPS
+
+REF_ZONE = "DE"
+
+
+@cache_on_versions(*ALL_GROUPS)
+def get_snapshot() -> pd.DataFrame:
+    """Latest-values table written by the ingest jobs (empty if not built yet)."""
+    return load_snapshot()
+
+
+def _kpi(kpis: pd.DataFrame, key: str):
+    row = kpis[kpis["key"] == key]
+    return (None, None) if row.empty else (row["value"].iloc[0], row["time_utc"].iloc[0])
+
+
+def render_overview_page():
+    st.title("Overview – What's going on right now?")
+
+    with section("snapshot: load"):
+        snap = get_snapshot()
+    if snap.empty:
+        st.warning("No snapshot yet; it is written by the ingest jobs (incremental.py / backfill.py).")
+        return
+
+    series = snap[snap["kind"] == "series"]
+    kpis = snap[snap["kind"] == "kpi"]
+
+    # KPI cards
+    cols = st.columns(3)
+    for col, (key, title, fmt) in zip(
+        cols,
+        [
+            ("total_generation", "Total generation", lambda v: f"{v / 1000:,.1f} GW"),
+            ("residual_load", "Residual load", lambda v: f"{v / 1000:,.1f} GW"),
+            ("res_share", "Renewables share", lambda v: f"{v:.0%}"),
+        ],
+    ):
+        value, ts = _kpi(kpis, key)
+        if value is None:
+            col.metric(title, "–")
+        else:
+            col.metric(title, fmt(value), help=f"as of {ts:%Y-%m-%d %H:%M} UTC")
+
+    prices = series[series["group"] == "market_price"].copy()
+    if prices.empty:
+        st.info("No market prices in the snapshot.")
+        return
+    prices["zone"] = prices["key"].map(ZONE_BY_FILTER_ID).fillna(prices["label"])
+
+    # Latest price by zone
+    latest = prices.sort_values("time_utc").groupby("zone").tail(1)
+    st.subheader("Latest price by zone")
+    bars = alt.Chart(latest).mark_bar().encode(
+        x=alt.X("zone:N", title="Zone", sort="-y"),
+        y=alt.Y("value:Q", title="€/MWh"),
+        color=alt.Color("value:Q", title="€/MWh", scale=alt.Scale(scheme="redyellowgreen", reverse=True)),
+        tooltip=["zone", alt.Tooltip("time_utc:T", title="time (UTC)"), alt.Tooltip("value:Q", format=".2f")],
+    )
+    with section("latest prices: altair chart", rows=len(latest)):
+        st.altair_chart(bars, use_container_width=True)
+
+    # Spreads vs the reference zone at the same quarter-hour
+    with section("spreads: pivot", rows=len(prices)):
+        wide = prices.pivot_table(index="time_utc", columns="zone", values="value").sort_index()
+    if REF_ZONE in wide.columns:
+        both = wide.dropna()
+        if not both.empty:
+            last = both.iloc[-1]
+            spreads = (last.drop(REF_ZONE) - last[REF_ZONE]).rename("spread").reset_index()
+            st.subheader(f"Spread vs {REF_ZONE} ({both.index[-1]:%Y-%m-%d %H:%M} UTC)")
+            spread_bars = alt.Chart(spreads).mark_bar().encode(
+                y=alt.Y("zone:N", title="Zone", sort="-x"),
+                x=alt.X("spread:Q", title=f"Price − {REF_ZONE} (€/MWh)"),
+                color=alt.condition(alt.datum.spread > 0, alt.value("#d62728"), alt.value("#2ca02c")),
+                tooltip=["zone", alt.Tooltip("spread:Q", format=".2f")],
+            )
+            with section("spreads: altair chart", rows=len(spreads)):
+                st.altair_chart(spread_bars, use_container_width=True)
+
+    # Intraday profile: the last day of prices
+    st.subheader("Intraday prices (last 24h)")
+    zones = sorted(wide.columns)
+    selected = st.multiselect("Zones", zones, default=zones)
+    if selected:
+        st.line_chart(wide[selected])
@@ -2,21 +2,38 @@
 #%%
 
 import sys
+import time
 from pathlib import Path
-import warnings
 
 import altair as alt
-import numpy as np
 import pandas as pd
 import streamlit as st
-from statsmodels.tools.sm_exceptions import ConvergenceWarning
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from analysis.de_features import build_de_features, add_lags
+from analysis.de_features import build_de_features, TARGET_COLUMNS, FUNDAMENTAL_COLUMNS, FEATURE_SET_VERSION
+from analysis.feature_store import load_feature_store, feature_store_watermark
+from analysis.job_queue import JobQueue, shared_queue
+from analysis.sarimax_service import build_design, submit_sarimax_fit, model_spec, MAXITER
+from analysis.backtest import submit_backtest, DAY_AHEAD_STEPS
+from analysis.sarimax_grid import (
+    grid_candidates,
+    leave_one_out_sets,
+    submit_grid_search,
+    DEFAULT_TIME_BUDGET_S,
+    DEFAULT_MEMORY_BUDGET_MB,
+)
+from analysis.instrumentation import section
+from app_pages.versioned_cache import cache_on_versions, ALL_GROUPS, STATS
+
+POLL_SECONDS = 1.0
+
+
+def get_fit_queue() -> JobQueue:
+    """One fitting pool per server process, shared by all sessions and pages."""
+    return shared_queue()
 
 
 def _filter_last_n_days(df: pd.DataFrame, days: int) -> pd.DataFrame:
@@ -28,33 +45,221 @@ def _filter_last_n_days(df: pd.DataFrame, days: int) -> pd.DataFrame:
     return df.loc[(idx >= start) & (idx <= end)].copy()
 
 
-def _fourier_terms(index: pd.DatetimeIndex, period: int, order: int) -> pd.DataFrame:
-    """Fourier terms for a given period and order (for seasonality)."""
-    if order <= 0:
-        return pd.DataFrame(index=index)
+@cache_on_versions(STATS, *ALL_GROUPS)
+def get_training_features(window_days: int) -> pd.DataFrame:
+    """
+    Targets + fundamentals for the last `window_days`, read from the feature
+    store (only those columns / months); falls back to build_de_features().
+    """
+    end = feature_store_watermark()
+    if end is not None:
+        feat = load_feature_store(
+            columns=TARGET_COLUMNS + FUNDAMENTAL_COLUMNS,
+            start=end - pd.Timedelta(days=window_days),
+            end=end,
+        )
+        if not feat.empty:
+            # store is float32; statsmodels works in float64
+            return feat.astype("float64")
+    return _filter_last_n_days(build_de_features(TARGET_COLUMNS + FUNDAMENTAL_COLUMNS), window_days)
+
+
+def _render_grid_search(
+    df_train: pd.DataFrame,
+    target_col: str,
+    selected_exogs: list[str],
+    max_lag: int,
+    fourier: tuple[int, int, int],
+) -> None:
+    """Grid over orders / exog subsets / lags / Fourier orders, ranked by AIC."""
+    st.subheader("Grid search")
 
-    t = np.arange(len(index))
-    data = {}
-    for k in range(1, order + 1):
-        data[f"sin_{period}_{k}"] = np.sin(2 * np.pi * k * t / period)
-        data[f"cos_{period}_{k}"] = np.cos(2 * np.pi * k * t / period)
-    return pd.DataFrame(data, index=index)
+    colp, cold, colq = st.columns(3)
+    with colp:
+        p_max = st.number_input("Max AR order (p)", min_value=0, max_value=5, value=2, step=1)
+    with cold:
+        default_d = [0] if target_col == "ret_de" else [1]
+        d_values = st.multiselect("Integration (d)", [0, 1, 2], default=default_d)
+    with colq:
+        q_max = st.number_input("Max MA order (q)", min_value=0, max_value=5, value=2, step=1)
 
+    col1, col2 = st.columns(2)
+    with col1:
+        drop_one = st.checkbox("Also try each exog subset with one variable removed", value=True)
+        lag_values = sorted({0, int(max_lag)})
+        st.caption(f"Lag depths tried: {lag_values}")
+    with col2:
+        fourier_values = sorted({(0, 0, 0), tuple(int(k) for k in fourier)})
+        st.caption(f"Fourier orders (daily, weekly, yearly) tried: {fourier_values}")
+
+    col3, col4 = st.columns(2)
+    with col3:
+        time_budget = st.slider("Time budget (seconds)", 10, 600, int(DEFAULT_TIME_BUDGET_S), step=10)
+    with col4:
+        memory_budget = st.slider(
+            "Memory budget (MB)", 256, 8192, int(DEFAULT_MEMORY_BUDGET_MB), step=256
+        )
 
-def render_sarimax_page():
-    st.title("SARIMAX Forecasting – DE Market Prices")
+    if not d_values:
+        st.warning("Select at least one integration order.")
+        return
 
-    feat = build_de_features()
-    if feat is None or feat.empty:
-        st.warning("DE feature set is empty; cannot build SARIMAX model.")
+    orders = [
+        (p, d, q)
+        for p in range(int(p_max) + 1)
+        for d in d_values
+        for q in range(int(q_max) + 1)
+    ]
+    exog_sets = leave_one_out_sets(selected_exogs) if drop_one else [list(selected_exogs)]
+    candidates = grid_candidates(orders, exog_sets, lag_values, fourier_values)
+    st.write(f"`{len(candidates)}` candidate models.")
+
+    queue = get_fit_queue()
+    if st.button("Run grid search"):
+        with section("grid search: submit", rows=len(df_train)):
+            st.session_state["sarimax_grid_job"] = submit_grid_search(
+                queue,
+                df_train[[target_col] + list(selected_exogs)],
+                target_col,
+                candidates,
+                time_budget_s=float(time_budget),
+                memory_budget_mb=float(memory_budget),
+            )
+
+    job_key = st.session_state.get("sarimax_grid_job")
+    if job_key is None:
+        return
+
+    status = queue.status(job_key)
+    if status["state"] in ("queued", "running"):
+        prog = status["progress"]
+        total = prog.get("total") or len(candidates)
+        st.progress(
+            min(prog.get("done", 0) / total, 1.0),
+            text=f"Grid search {status['state']} – {prog.get('stage', 'waiting for a worker')} "
+            f"({prog.get('done', 0)}/{total} fits, {prog.get('workers', '?')} workers, "
+            f"{status['elapsed']:.0f}s)",
+        )
+        time.sleep(POLL_SECONDS)
+        st.rerun()
         return
 
+    if status["state"] == "failed":
+        st.error(f"Grid search failed: {status['error']}")
+        return
+    if status["state"] != "done":
+        return
+
+    board = status["result"]
+    n_final = int(board["aic"].notna().sum()) if not board.empty else 0
+    st.success(f"Grid search finished in {status['elapsed']:.0f}s – {n_final} models fitted on the full sample.")
+    st.dataframe(
+        board.style.format(
+            {"rank": "{:.0f}", "aic": "{:.2f}", "bic": "{:.2f}", "nobs": "{:.0f}", "screen_aic": "{:.2f}", "seconds": "{:.1f}"},
+            na_rep="–",
+        ),
+        use_container_width=True,
+    )
+
+
+def _render_backtest(
+    target_col: str,
+    selected_exogs: list[str],
+    max_lag: int,
+    fourier: tuple[int, int, int],
+    order: tuple[int, int, int],
+    train_days: int,
+) -> None:
+    """Rolling-origin day-ahead backtest of the current specification."""
+    st.subheader("Rolling-origin backtest")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        n_days = st.selectbox("Backtest period (daily origins)", [30, 90, 180, 365], index=1)
+    with col2:
+        refit_label = st.selectbox("Re-estimate parameters", ["Never", "Every 7 days", "Every 30 days"], index=2)
+    with col3:
+        origin_hour = st.slider("Origin hour (UTC)", 0, 23, 0)
+    horizon = st.slider("Horizon (steps, 15-min intervals)", 4, 96 * 2, DAY_AHEAD_STEPS, step=4)
+
+    refit_every = {"Never": None, "Every 7 days": 7, "Every 30 days": 30}[refit_label]
+
+    # training window before the first origin + the backtest period + horizon
+    with section("backtest: load"):
+        df_bt = get_training_features(train_days + n_days + 2)
+    with section("backtest: design", rows=len(df_bt)):
+        y_bt, X_bt = build_design(df_bt, target_col, selected_exogs, max_lag, fourier)
+    st.write(
+        f"Parameters estimated on `{train_days}` days before each block, "
+        f"`{len(y_bt)}` observations in total."
+    )
+
+    queue = get_fit_queue()
+    if st.button("Run backtest"):
+        with section("backtest: submit", rows=len(y_bt)):
+            st.session_state["sarimax_backtest_job"] = submit_backtest(
+                queue,
+                y_bt,
+                X_bt,
+                order,
+                horizon=int(horizon),
+                n_origins=int(n_days),
+                origin_hour=int(origin_hour),
+                train_days=int(train_days),
+                refit_every_days=refit_every,
+            )
+
+    job_key = st.session_state.get("sarimax_backtest_job")
+    if job_key is None:
+        return
+
+    status = queue.status(job_key)
+    if status["state"] in ("queued", "running"):
+        prog = status["progress"]
+        total = prog.get("total") or 1
+        st.progress(
+            min(prog.get("done", 0) / total, 1.0),
+            text=f"Backtest {status['state']} – {prog.get('done', 0)}/{total} parameter blocks "
+            f"({status['elapsed']:.0f}s)",
+        )
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+        return
+
+    if status["state"] == "failed":
+        st.error(f"Backtest failed: {status['error']}")
+        return
+    if status["state"] != "done":
+        return
+
+    bt = status["result"]
+    overall = bt["overall"].iloc[0]
+    st.success(
+        f"{bt['n_origins']} origins, {bt['n_fits']} parameter fits in {bt['seconds']:.1f}s – "
+        f"MAE `{overall['mae']:.3f}`, RMSE `{overall['rmse']:.3f}`"
+    )
+
+    st.markdown("**Error by horizon step**")
+    st.line_chart(bt["by_horizon"][["mae", "rmse"]])
+
+    st.markdown("**Error by hour of day (UTC, target time)**")
+    st.bar_chart(bt["by_hour"][["mae", "rmse"]])
+
+    with st.expander("Forecasts of the last origin"):
+        fc = bt["forecasts"]
+        last = fc[fc["origin"] == fc["origin"].max()].set_index("time")[["actual", "forecast"]]
+        st.line_chart(last)
+
+
+def render_sarimax_page():
+    st.title("SARIMAX Forecasting – DE Market Prices")
+
     st.markdown(
         "This page fits a SARIMAX model to DE prices, using exogenous variables:\n"
         "- Generation (wind/solar/total) and their lags\n"
         "- Consumption / residual load and lags\n"
         "- Forecasts (wind/solar/RES) and forecast errors\n"
-        "- Daily & weekly seasonality via Fourier terms"
+        "- Daily, weekly & yearly seasonality via Fourier terms"
     )
 
     # ---------------------------
@@ -74,7 +279,12 @@ def render_sarimax_page():
             index=0,
         )
 
-    df_train = _filter_last_n_days(feat, window_days)
+    with section("features: load"):
+        df_train = get_training_features(window_days)
+    if df_train is None or df_train.empty:
+        st.warning("DE feature set is empty; cannot build SARIMAX model.")
+        return
+
     target_col = "ret_de" if target_type.startswith("Returns") else "price_de"
 
     if target_col not in df_train.columns:
@@ -86,23 +296,7 @@ def render_sarimax_page():
     # ---------------------------
     st.subheader("Exogenous variables (fundamentals)")
 
-    base_candidates = [
-        "residual_load",
-        "load_total",
-        "gen_total",
-        "wind_gen",
-        "solar_gen",
-        "wind_share",
-        "solar_share",
-        "res_share",
-        "wind_fc",
-        "solar_fc",
-        "res_fc",
-        "error_wind",
-        "error_solar",
-        "error_res",
-    ]
-    base_candidates = [c for c in base_candidates if c in df_train.columns]
+    base_candidates = [c for c in FUNDAMENTAL_COLUMNS if c in df_train.columns]
 
     if not base_candidates:
         st.warning("No fundamental exogenous variables available.")
@@ -130,19 +324,6 @@ def render_sarimax_page():
         help="0 = no lags, 96 = up to 1 day of lags.",
     )
 
-    df_model = df_train[[target_col] + selected_exogs].copy()
-    if max_lag > 0:
-        df_model = add_lags(df_model, selected_exogs, max_lag)
-
-    # Drop rows with NaNs introduced by lags
-    df_model = df_model.dropna()
-    if df_model.empty:
-        st.warning("No data left after applying lags and dropping NaNs.")
-        return
-
-    y = df_model[target_col]
-    X = df_model.drop(columns=[target_col])
-
     # ---------------------------
     # Fourier seasonality
     # ---------------------------
@@ -162,23 +343,27 @@ def render_sarimax_page():
         value=1,
         help="0 disables weekly Fourier terms.",
     )
+    k_yearly = st.slider(
+        "Yearly Fourier order (period = 96*365.25)",
+        min_value=0,
+        max_value=2,
+        value=0,
+        help="0 disables yearly Fourier terms; only useful with long training windows.",
+    )
 
-    idx = y.index
-    daily_terms = _fourier_terms(idx, period=96, order=k_daily)
-    weekly_terms = _fourier_terms(idx, period=96 * 7, order=k_weekly)
-
-    if not daily_terms.empty:
-        X = X.join(daily_terms)
-    if not weekly_terms.empty:
-        X = X.join(weekly_terms)
-
-    # Ensure alignment and no NaNs
-    data = pd.concat([y, X], axis=1).dropna()
-    y = data[target_col]
-    X = data.drop(columns=[target_col])
+    with section("design", rows=len(df_train)):
+        y, X = build_design(df_train, target_col, selected_exogs, max_lag, (k_daily, k_weekly, k_yearly))
+    if y.empty:
+        st.warning("No data left after applying lags and dropping NaNs.")
+        return
 
     st.write(f"Final training sample size: `{len(y)}` observations, `{X.shape[1]}` exogenous features.")
 
+    mode = st.radio("Mode", ["Single fit", "Backtest", "Grid search"], horizontal=True)
+    if mode == "Grid search":
+        _render_grid_search(df_train, target_col, selected_exogs, max_lag, (k_daily, k_weekly, k_yearly))
+        return
+
     # ---------------------------
     # SARIMAX order selection
     # ---------------------------
@@ -193,6 +378,12 @@ def render_sarimax_page():
     with colq:
         q = st.number_input("MA order (q)", min_value=0, max_value=5, value=1, step=1)
 
+    if mode == "Backtest":
+        _render_backtest(
+            target_col, selected_exogs, max_lag, (k_daily, k_weekly, k_yearly), (int(p), int(d), int(q)), window_days
+        )
+        return
+
     forecast_steps = st.slider(
         "Forecast horizon (steps, 15-min intervals)",
         min_value=0,
@@ -201,121 +392,144 @@ def render_sarimax_page():
         help="0 = no forecast, just in-sample fit; 96 = 1 day ahead.",
     )
 
+    reuse_params = st.checkbox(
+        "Reuse cached parameters (no re-optimization)",
+        value=False,
+        help="If this specification was fitted before, only re-run the filter over the "
+        "current window with the cached parameters instead of re-estimating them.",
+    )
+
+    order = (int(p), int(d), int(q))
+    spec = model_spec(
+        FEATURE_SET_VERSION,
+        window_days,
+        target_col,
+        order,
+        selected_exogs,
+        max_lag,
+        (k_daily, k_weekly, k_yearly),
+    )
+
+    queue = get_fit_queue()
+
     if st.button("Fit SARIMAX model"):
-        with st.spinner("Fitting SARIMAX (this may take a bit)..."):
-            warnings.filterwarnings("ignore", category=ConvergenceWarning)
-
-            try:
-                model = SARIMAX(
-                    endog=y,
-                    exog=X,
-                    order=(int(p), int(d), int(q)),
-                    trend="c",
-                    enforce_stationarity=False,
-                    enforce_invertibility=False,
-                )
-                res = model.fit(disp=False)
-            except Exception as e:
-                st.error(f"Model fitting failed: {e}")
-                return
-
-        st.success("Model fitted.")
-
-        # ---------------------------
-        # Summary & coefficients
-        # ---------------------------
-        st.subheader("Model diagnostics")
-
-        st.write(f"**AIC:** `{res.aic:.2f}`  –  **BIC:** `{res.bic:.2f}`")
-
-        with st.expander("Full SARIMAX summary"):
-            st.text(res.summary().as_text())
-
-        params = res.params.to_frame("coef")
-        exog_params = params.loc[[p for p in params.index if p in X.columns]]
-        if not exog_params.empty:
-            exog_params["abs_coef"] = exog_params["coef"].abs()
-            exog_params = exog_params.sort_values("abs_coef", ascending=False)
-            st.markdown("**Exogenous variable coefficients (sorted by |coef|):**")
-            st.dataframe(exog_params[["coef"]].style.format({"coef": "{:.4f}"}))
-
-        # ---------------------------
-        # In-sample fit vs actual
-        # ---------------------------
-        st.subheader("In-sample fit vs actual")
-
-        fitted = res.fittedvalues
-        df_fit = pd.DataFrame(
+        # identical (data, order, exog) requests from any session share one job
+        with section("fit: submit", rows=len(y)):
+            st.session_state["sarimax_job"] = submit_sarimax_fit(
+                queue, y, X, order, int(forecast_steps), spec=spec, reoptimize=not reuse_params
+            )
+
+    job_key = st.session_state.get("sarimax_job")
+    if job_key is None:
+        return
+
+    status = queue.status(job_key)
+
+    if status["state"] in ("queued", "running"):
+        prog = status["progress"]
+        maxiter = prog.get("maxiter") or MAXITER
+        frac = min(prog.get("iteration", 0) / maxiter, 1.0)
+        st.progress(
+            frac,
+            text=f"SARIMAX {status['state']} – {prog.get('stage', 'waiting for a worker')} "
+            f"(iteration {prog.get('iteration', 0)}/{maxiter}, {status['elapsed']:.0f}s)",
+        )
+        # poll: the fit runs in a worker process, this rerun only reads its status
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+        return
+
+    if status["state"] == "failed":
+        st.error(f"Model fitting failed: {status['error']}")
+        return
+
+    if status["state"] != "done":
+        return
+
+    res = status["result"]
+    fit_notes = {
+        "cached": "loaded from the model cache",
+        "warm": "warm-started from cached parameters",
+        "filtered": "cached parameters, re-filtered on the current window",
+        "cold": "fitted from default start parameters",
+    }
+    st.success(f"Model ready ({res['nobs']} observations, {fit_notes.get(res.get('fit_mode'), 'fitted')}).")
+
+    # ---------------------------
+    # Summary & coefficients
+    # ---------------------------
+    st.subheader("Model diagnostics")
+
+    st.write(f"**AIC:** `{res['aic']:.2f}`  –  **BIC:** `{res['bic']:.2f}`")
+
+    with st.expander("Full SARIMAX summary"):
+        st.text(res["summary"])
+
+    params = res["params"].to_frame("coef")
+    exog_params = params.loc[[p for p in params.index if p in res["exog_names"]]]
+    if not exog_params.empty:
+        exog_params["abs_coef"] = exog_params["coef"].abs()
+        exog_params = exog_params.sort_values("abs_coef", ascending=False)
+        st.markdown("**Exogenous variable coefficients (sorted by |coef|):**")
+        st.dataframe(exog_params[["coef"]].style.format({"coef": "{:.4f}"}))
+
+    # ---------------------------
+    # In-sample fit vs actual
+    # ---------------------------
+    st.subheader("In-sample fit vs actual")
+
+    df_fit = pd.DataFrame(
+        {
+            "time": res["actual"].index,
+            "actual": res["actual"].values,
+            "fitted": res["fitted"].values,
+        }
+    ).set_index("time")
+
+    # Show last N points for clarity
+    n_show = min(len(df_fit), 96 * 10)  # e.g. last ~10 days
+    df_fit_tail = df_fit.iloc[-n_show:].reset_index()
+
+    chart_fit = alt.Chart(df_fit_tail).mark_line().encode(
+        x=alt.X("time:T", title="Time"),
+        y=alt.Y("value:Q", title=target_col),
+        color="series:N",
+    ).transform_fold(
+        ["actual", "fitted"], as_=["series", "value"]
+    )
+
+    with section("fit: altair chart", rows=len(df_fit_tail)):
+        st.altair_chart(chart_fit, use_container_width=True)
+
+    # ---------------------------
+    # Simple forecast (flat exog assumption)
+    # ---------------------------
+    if res["forecast_error"] is not None:
+        st.warning(f"Forecast failed: {res['forecast_error']}")
+    elif res["forecast"] is not None:
+        st.subheader("Out-of-sample forecast (flat exog assumption)")
+
+        df_forecast = pd.DataFrame(
             {
-                "time": y.index,
-                "actual": y.values,
-                "fitted": fitted.values,
+                "time": res["forecast"].index,
+                "forecast": res["forecast"].values,
             }
-        ).set_index("time")
+        )
 
-        # Show last N points for clarity
-        n_show = min(len(df_fit), 96 * 10)  # e.g. last ~10 days
-        df_fit_tail = df_fit.iloc[-n_show:].reset_index()
+        df_plot = pd.concat(
+            [
+                df_fit_tail[["time", "actual"]].assign(series="actual"),
+                df_forecast.assign(series="forecast"),
+            ],
+            ignore_index=True,
+        )
 
-        chart_fit = alt.Chart(df_fit_tail).mark_line().encode(
+        chart_forecast = alt.Chart(df_plot).mark_line().encode(
             x=alt.X("time:T", title="Time"),
             y=alt.Y("value:Q", title=target_col),
             color="series:N",
         ).transform_fold(
-            ["actual", "fitted"], as_=["series", "value"]
+            ["actual", "forecast"], as_=["series", "value"]
         )
 
-        st.altair_chart(chart_fit, use_container_width=True)
-
-        # ---------------------------
-        # Simple forecast (flat exog assumption)
-        # ---------------------------
-        if forecast_steps > 0:
-            st.subheader("Out-of-sample forecast (flat exog assumption)")
-
-            last_exog = X.iloc[-1:]
-            exog_future = pd.concat(
-                [last_exog] * forecast_steps,
-                ignore_index=True,
-            )
-
-            try:
-                forecast_res = res.get_forecast(steps=forecast_steps, exog=exog_future)
-                forecast_mean = forecast_res.predicted_mean
-
-                freq = pd.infer_freq(y.index) or "15T"
-                start = y.index[-1] + pd.Timedelta(freq)
-                idx_forecast = pd.date_range(
-                    start=start,
-                    periods=forecast_steps,
-                    freq=freq,
-                )
-
-                df_forecast = pd.DataFrame(
-                    {
-                        "time": idx_forecast,
-                        "forecast": forecast_mean.values,
-                    }
-                )
-
-                df_plot = pd.concat(
-                    [
-                        df_fit_tail[["time", "actual"]].assign(series="actual"),
-                        df_forecast.assign(series="forecast"),
-                    ],
-                    ignore_index=True,
-                )
-
-                chart_forecast = alt.Chart(df_plot).mark_line().encode(
-                    x=alt.X("time:T", title="Time"),
-                    y=alt.Y("value:Q", title=target_col),
-                    color="series:N",
-                ).transform_fold(
-                    ["actual", "forecast"], as_=["series", "value"]
-                )
-
-                st.altair_chart(chart_forecast, use_container_width=True)
-
-            except Exception as e:
-                st.warning(f"Forecast failed: {e}")
-
+        st.altair_chart(chart_forecast, use_container_width=True)
@@ -0,0 +1,73 @@
+# app_pages/versioned_cache.py
+# %%
+
+import functools
+import sys
+from pathlib import Path
+
+import streamlit as st
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.state import load_data_versions, STATS_VERSION_KEY
+from analysis.data_service import service_available
+
+"""
+Dashboard caches keyed on data versions instead of a TTL.
+
+The ingest jobs bump the version of every filter they wrote and the stats
+pipeline bumps STATS_VERSION_KEY (state/data_versions.json). A function
+decorated with @cache_on_versions("generation") is re-run exactly when the
+version of one of the generation filters changed since its cached result,
+and served from the cache otherwise.
+
+Loaders of raw lake series are marked served=True: while the shared data
+service (analysis/data_service.py) is up they bypass st.cache_data, since
+every worker would otherwise keep (and hand to every session) its own
+pickled copy of rows the service already holds once in shared memory.
+"""
+
+DATA_VERSIONS_PATH = PROJECT_ROOT / "state" / "data_versions.json"
+
+STATS = STATS_VERSION_KEY
+ALL_GROUPS = ("market_price", "generation", "forecast", "consumption")
+
+
+def data_versions(*sources: str) -> tuple[tuple[str, int], ...]:
+    """
+    (key, version) of every source: a filter group name stands for all of
+    its filters, anything else (filter id, STATS) for itself.
+    """
+    versions = load_data_versions(DATA_VERSIONS_PATH)
+    keys = []
+    for source in sources:
+        keys += [str(fid) for fid in FILTER_GROUPS[source]] if source in FILTER_GROUPS else [str(source)]
+    return tuple((key, versions.get(key, 0)) for key in keys)
+
+
+def cache_on_versions(*sources: str, max_entries: int = 16, served: bool = False):
+    """
+    st.cache_data whose key includes data_versions(*sources). With `served`,
+    calls go straight to the function while the data service is up.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def versioned(*args, versions=None, **kwargs):
+            return func(*args, **kwargs)
+
+        cached = st.cache_data(max_entries=max_entries)(versioned)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if served and service_available():
+                return func(*args, **kwargs)
+            return cached(*args, versions=data_versions(*sources), **kwargs)
+
+        wrapper.clear = cached.clear
+        return wrapper
+
+    return decorator
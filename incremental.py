@@ -6,13 +6,22 @@ from pathlib import Path
 
 from power.fetch_power.smard_fetch import smard_range
 from power.fetch_power.parquet_convert import merge_incoming_data
-from power.fetch_power.state import load_hwm_map, save_hwm_map, last_full_quarter
+from power.fetch_power.state import load_hwm_map, save_hwm_map, last_full_quarter, bump_data_versions
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.run_metrics import RunMetrics, timed
+from analysis.streaming_indicators import (
+    load_indicator_states,
+    save_indicator_states,
+    advance_indicators,
+)
+from analysis.pyramid import update_pyramid
+from analysis.snapshot import update_snapshot
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_ROOT = PROJECT_ROOT / "data"
 STATE_ROOT = PROJECT_ROOT / "state"
 HWM_PATH = STATE_ROOT / "high_watermark.json"
+DATA_VERSIONS_PATH = STATE_ROOT / "data_versions.json"
 
 REGION_CODE = "DE"
 RESOLUTION = "quarterhour"
@@ -33,7 +42,16 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
         filter_group_name = os.environ.get("FILTER_GROUP", "market_price")
 
     filters = FILTER_GROUPS[filter_group_name]
+    # per-filter fetch / write counters + run totals -> metrics/ingest_runs.jsonl
+    metrics = RunMetrics("incremental", filter_group=filter_group_name, region=region_code)
     total_touched = 0
+    touched_filters = []  # fetched rows for their partitions -> HWM advance
+    changed_filters = []  # some partition actually rewritten -> derived stores + cache versions
+
+    # streaming indicators (EMA / RSI / rolling windows) only exist for prices;
+    # their state lives next to the HWM file, so a run on another lake has its own
+    indicator_state_path = Path(hmw_path).parent / "indicator_state.json"
+    indicator_states = load_indicator_states(indicator_state_path) if filter_group_name == "market_price" else None
 
     
     for filter_id, desc in filters.items():
@@ -42,6 +60,7 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
 
         if hwm is not None and now_final <= hwm:
             print(f"filter {filter_id} ({desc}): no new completed quarter-hour; skipping")
+            metrics.finish(watermarks={str(fid): hwm_map.get(str(fid)) for fid in filters})
             return 
     
     # BELOW we set the start and end variables 
@@ -55,6 +74,8 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
 
     for filter_id, desc in filters.items():
         print(f"incremental fetch for filter {filter_id} ({desc})")
+        key = str(filter_id)
+        stats = metrics.filter(filter_id)
 
         df = smard_range(
             filter_id=filter_id,
@@ -63,6 +84,7 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
             start=start,
             end=end,
             verify=verify,
+            stats=stats,
         )
 
         if df.empty:
@@ -70,15 +92,42 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
             continue
 
 
-        touched = merge_incoming_data(data_root, region_code, filter_id, df)
+        touched = merge_incoming_data(data_root, region_code, filter_id, df, stats=stats)
     # merge_write_partitions = Merge df_new into existing daily Parquet files under root, and removes duplicates  by time_utc.
         
         total_touched += len(touched)
-        print(f"  wrote {len(touched)} partitions")
+        print(f"  merged {len(touched)} partitions ({stats['partitions_skipped']} unchanged, not rewritten)")
+        # a re-fetch of rows already stored rewrites nothing: derived stores and caches stay valid
+        changed = stats.get("partitions_written", 0) > 0
+
+        if indicator_states is not None and changed:
+            with timed(stats, "indicator_seconds"):
+                ind = advance_indicators(
+                    indicator_states,
+                    filter_id,
+                    df,
+                    root=data_root.parent,
+                    region=region_code,
+                    indicator_root=data_root / "indicators",
+                )
+            print(f"  advanced indicators by {len(ind)} points")
+
+        if changed:
+            changed_filters.append(key)
+            with timed(stats, "pyramid_seconds"):
+                levels = update_pyramid(
+                    filter_id,
+                    since=df["time_utc"].min(),
+                    root=data_root.parent,
+                    region=region_code,
+                    pyramid_root=data_root / "pyramid",
+                )
+            print(f"  refreshed pyramid levels {levels}")
 
                 # update per-filter HWM if we wrote something
         if touched:
             hwm_map[key] = end
+            touched_filters.append(key)
             print(f"  HWM[{key}] -> {end.isoformat()}")
 
     # Only update HWM if at least one filter wrote something (optional)
@@ -86,7 +135,25 @@ def main(filter_group_name=None, resolution:str = RESOLUTION, region_code: str =
         save_hwm_map(hmw_path, hwm_map)
         print(f"HWM -> {end.isoformat()}")
     else:
-        print("no partitions written; HWM unchanged")
+        print("no rows fetched; HWM unchanged")
+
+    if changed_filters:
+        if indicator_states is not None:
+            save_indicator_states(indicator_state_path, indicator_states)
+        # latest-values table for the overview page
+        with metrics.step("snapshot"):
+            update_snapshot(changed_filters, region=region_code, root=data_root.parent, snapshot_root=data_root / "snapshot")
+        # dashboards reload exactly the filters whose partitions changed
+        bump_data_versions(DATA_VERSIONS_PATH, changed_filters)
+    else:
+        print("no partitions rewritten; derived stores and data versions unchanged")
+
+    run = metrics.finish(watermarks={str(fid): hwm_map.get(str(fid)) for fid in filters})
+    print(
+        f"run {run['run_id']}: {run['http_requests']} requests, {run['bytes_downloaded'] / 1e6:.1f} MB, "
+        f"{run['partitions_written']} partitions written in {run['duration_seconds']:.1f}s; "
+        f"watermark lag {run['watermark_lag_seconds']}s"
+    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
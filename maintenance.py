@@ -8,6 +8,7 @@ from power.fetch_power.io_s3 import list_paths
 from power.fetch_power.parquet_convert import read_parquet_if_exists, to_parquet_bytes
 from power.fetch_power.io_s3 import write_atomic
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from power.fetch_power.run_metrics import RunMetrics, add, timed
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_ROOT = PROJECT_ROOT / "data"
@@ -24,8 +25,10 @@ def main(filter_group_name=None):
         filter_group_name = os.environ.get("FILTER_GROUP", "market_price")
 
     filter_ids = FILTER_GROUPS[filter_group_name]
+    metrics = RunMetrics("maintenance", filter_group=filter_group_name, region=REGION_CODE)
     
     for filter_id in filter_ids :
+        stats = metrics.filter(filter_id)
         prefix = DATA_ROOT / f"region={REGION_CODE}" / f"filter={filter_id}"
         parts = sorted(
             {
@@ -41,11 +44,17 @@ def main(filter_group_name=None):
             path = DATA_ROOT / f"region={REGION_CODE}" / f"filter={filter_id}" / f"date={day}" / "data.parquet"
             df = read_parquet_if_exists(path)
             if df is None or df.empty:
+                add(stats, "partitions_skipped", 1)
                 continue
-            tpb = to_parquet_bytes(df)
-            write_atomic(path,tpb)
+            with timed(stats, "encode_seconds"):
+                tpb = to_parquet_bytes(df)
+            with timed(stats, "write_seconds"):
+                write_atomic(path,tpb)
+            add(stats, "partitions_written", 1)
             print(f"compacted {day}")
 
+    metrics.finish()
+
 if __name__ == "__main__":
     main()
 # %%
@@ -11,7 +11,9 @@ def return_path(root: Path, region: str, filter_id: str, day: str) -> Path:
 # this gives the path you will use to save your parquet.data : hen using the library pathlib, you use / to join the bits : (e.g. Path(file_name)/ 'name_of_the_file')
 
 def drop_by_timecol(df: pd.DataFrame):
-    out = df.sort_values("time_utc").drop_duplicates(subset=["time_utc"], keep="last")
+    # dedupe before sorting: sort_values is not stable, so sorting first could
+    # put an older duplicate after the newer one and keep it
+    out = df.drop_duplicates(subset=["time_utc"], keep="last")
     return out.sort_values("time_utc").reset_index(drop=True)
 
 """
@@ -41,11 +43,16 @@ write_atomic()
 so path is df -> parquet bytes format RAM (processed faster) -> parquet_data bytes saved in memory by next function (write_atomic())
 """""
 
-def merge_incoming_data(root: Path, region: str, filter_id: str, df: pd.DataFrame):
+def merge_incoming_data(root: Path, region: str, filter_id: str, df: pd.DataFrame, stats: dict | None = None):
     """
     Merge df_new into existing daily Parquet files under root, remove duplicates by time_utc.
+    Returns the paths of every partition df covers, as before. Those whose content
+    does not change (e.g. the overlap of an incremental run) are not rewritten, since
+    the file would come out the same. `stats` (a RunMetrics.filter() dict) collects
+    partitions_written / partitions_skipped and encode_seconds / write_seconds.
     """
     from .io_s3 import write_atomic  # we will repurpose this for local FS
+    from .run_metrics import add, timed
 
     touched = []
     df_new = df.copy()
@@ -69,8 +76,14 @@ def merge_incoming_data(root: Path, region: str, filter_id: str, df: pd.DataFram
         # else if this is the first data point fo the day, it assigns it as merged and saves it below (officially creating the file for that day)
 
         merged = drop_by_timecol(merged)
-        data_bytes = to_parquet_bytes(merged)
-        write_atomic(data_path, data_bytes) # this will overwrite the previous dataset with the new dataset and create the file (thats why we don't need to return anything)
         touched.append(str(data_path)) 
+        if df_old is not None and merged.equals(drop_by_timecol(df_old)):
+            add(stats, "partitions_skipped", 1)
+            continue
+        with timed(stats, "encode_seconds"):
+            data_bytes = to_parquet_bytes(merged)
+        with timed(stats, "write_seconds"):
+            write_atomic(data_path, data_bytes) # this will overwrite the previous dataset with the new dataset and create the file (thats why we don't need to return anything)
+        add(stats, "partitions_written", 1)
     return touched 
 # %%
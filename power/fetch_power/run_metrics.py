@@ -0,0 +1,146 @@
+#run_metrics.py
+# %%
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+"""
+Structured metrics of one ingest / stats job run, appended as JSON lines.
+
+    metrics = RunMetrics("incremental", filter_group="market_price")
+    stats = metrics.filter("4169")             # per-filter counters
+    df = smard_range(..., stats=stats)         # http_requests / _retries, bytes_downloaded, fetch_seconds, rows_decoded
+    merge_incoming_data(..., stats=stats)      # partitions_written / _skipped, encode_seconds, write_seconds
+    with metrics.step("snapshot"):             # per-run step timings
+        ...
+    metrics.finish(watermarks=hwm_map)
+
+finish() writes one record per filter (record="filter") and one run record
+(record="run") with the totals, step timings and the watermark lag (now minus
+the oldest watermark) to RUN_METRICS_PATH, all sharing the run_id. Use
+load_run_metrics() to read them back into a DataFrame. In CI the scheduled
+workflows commit metrics/ with the data, the manual ones upload it as an
+artifact.
+"""
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+RUN_METRICS_PATH = Path(os.environ.get("RUN_METRICS_PATH", PROJECT_ROOT / "metrics" / "ingest_runs.jsonl"))
+
+FILTER_COUNTERS = (
+    "http_requests",
+    "http_retries",
+    "bytes_downloaded",
+    "fetch_seconds",
+    "rows_decoded",
+    "partitions_written",
+    "partitions_skipped",
+    "encode_seconds",
+    "write_seconds",
+)
+
+
+def add(stats: dict | None, key: str, amount) -> None:
+    """stats[key] += amount; no-op when no stats dict was passed."""
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + amount
+
+
+@contextmanager
+def timed(stats: dict | None, key: str):
+    """Add the wall time of the block to stats[key] (no-op without stats)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(stats, key, time.perf_counter() - t0)
+
+
+class RunMetrics:
+    def __init__(self, job: str, **context):
+        self.job = job
+        self.context = context
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = pd.Timestamp.now(tz="UTC")
+        self._t0 = time.perf_counter()
+        self.filters: dict[str, dict] = {}
+        self.steps: dict[str, float] = {}
+        self.extra: dict = {}
+
+    def filter(self, filter_id) -> dict:
+        """Counters of one filter (created zeroed on first use)."""
+        key = str(filter_id)
+        if key not in self.filters:
+            self.filters[key] = dict.fromkeys(FILTER_COUNTERS, 0)
+        return self.filters[key]
+
+    @contextmanager
+    def step(self, name: str):
+        with timed(self.steps, name):
+            yield
+
+    def finish(self, watermarks: dict | None = None, path: Path | None = RUN_METRICS_PATH) -> dict:
+        """
+        Write the filter records and the run record; returns the run record.
+        `watermarks` maps filter_id (or a stats key) -> Timestamp after the run.
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        base = {"run_id": self.run_id, "job": self.job, **self.context}
+        watermarks = {str(k): pd.Timestamp(v) for k, v in (watermarks or {}).items() if v is not None}
+
+        records = []
+        for filter_id, counters in self.filters.items():
+            hwm = watermarks.get(filter_id)
+            records.append(
+                {
+                    **base,
+                    "record": "filter",
+                    "filter_id": filter_id,
+                    **counters,
+                    "watermark": hwm.isoformat() if hwm is not None else None,
+                    "watermark_lag_seconds": (now - hwm).total_seconds() if hwm is not None else None,
+                }
+            )
+
+        totals = dict.fromkeys(FILTER_COUNTERS, 0)
+        for counters in self.filters.values():
+            for key in FILTER_COUNTERS:
+                totals[key] += counters.get(key, 0)
+        oldest = min(watermarks.values()) if watermarks else None
+        run = {
+            **base,
+            "record": "run",
+            "started": self.started.isoformat(),
+            "finished": now.isoformat(),
+            "duration_seconds": time.perf_counter() - self._t0,
+            "n_filters": len(self.filters),
+            **totals,
+            "steps": self.steps,
+            "watermark": oldest.isoformat() if oldest is not None else None,
+            "watermark_lag_seconds": (now - oldest).total_seconds() if oldest is not None else None,
+            **self.extra,
+        }
+        records.append(run)
+
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, default=str) + "\n")
+        return run
+
+
+def load_run_metrics(path: Path = RUN_METRICS_PATH, record: str | None = None) -> pd.DataFrame:
+    """All metrics records (optionally only "filter" or "run" ones) as a DataFrame."""
+    path = Path(path)
+    if not path.exists():
+        return pd.DataFrame()
+    df = pd.read_json(path, lines=True, dtype={"filter_id": str, "run_id": str})
+    if record is not None and "record" in df.columns:
+        df = df[df["record"] == record].reset_index(drop=True)
+    return df
@@ -1,7 +1,72 @@
 #smard_fetch.py
 # %%
-import requests, pandas as pd, urllib3, bisect
+import requests, pandas as pd, urllib3, bisect, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from .run_metrics import add
+
+# SMARD_BASE_URL can point the jobs at a local stand-in (benchmarks/smard_stub.py)
+SMARD_BASE_URL = os.environ.get("SMARD_BASE_URL", "https://www.smard.de/app/chart_data")
+SMARD_RETRIES = int(os.environ.get("SMARD_RETRIES", "3"))            # extra attempts on 429 / 5xx / connection errors
+SMARD_BACKOFF = float(os.environ.get("SMARD_BACKOFF", "1.0"))        # seconds, doubled per attempt (or Retry-After)
+SMARD_MAX_WORKERS = int(os.environ.get("SMARD_MAX_WORKERS", "4"))    # chunk files fetched concurrently
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _retry_after_seconds(value, default):
+    """
+    Seconds to wait from a Retry-After header, which is either delta-seconds
+    or an HTTP-date. Falls back to `default` when missing or unparseable.
+    """
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:  # RFC 7231 dates are GMT
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _get_json(session, url, headers, verify, retries, backoff):
+    """
+    GET + decode one JSON file, retrying throttling / server / connection errors.
+    Returns (payload, bytes, attempts, seconds spent in requests).
+    """
+    nbytes, seconds = 0, 0.0
+    for attempt in range(retries + 1):
+        t0 = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=60, verify=verify)
+        except (requests.ConnectionError, requests.Timeout):
+            seconds += time.perf_counter() - t0
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2**attempt)
+            continue
+        seconds += time.perf_counter() - t0
+        nbytes += len(response.content)
+        if response.status_code in RETRY_STATUS and attempt < retries:
+            time.sleep(_retry_after_seconds(response.headers.get("Retry-After"), backoff * 2**attempt))
+            continue
+        response.raise_for_status()
+        return response.json(), nbytes, attempt + 1, seconds
+
+
+def _record(stats, nbytes, attempts, seconds):
+    add(stats, "http_requests", attempts)
+    add(stats, "http_retries", attempts - 1)
+    add(stats, "bytes_downloaded", nbytes)
+    add(stats, "fetch_seconds", seconds)
+
 
 def smard_range(
     filter_id: str = 410,
@@ -9,8 +74,12 @@ def smard_range(
     resolution: str = "quarterhour",
     start="2025-11-01",
     end="2025-11-11",
-    base="https://www.smard.de/app/chart_data",
+    base=None,
     verify=False,
+    stats: dict | None = None,
+    retries: int | None = None,
+    max_workers: int | None = None,
+    backoff: float | None = None,
 ):
     """
     Fetch SMARD time-series into a DataFrame with columns: time_utc, value.
@@ -18,9 +87,18 @@ def smard_range(
     The varibales are start/end date, region where to pull from, and the filter id : lsit of filter id's is available on the read me file
     You can have the market prices for all countries in the europe except for the UK.
     Among the data available there is market prices, energy forecast 
+    `stats` (a RunMetrics.filter() dict) collects http_requests, http_retries,
+    bytes_downloaded, fetch_seconds and rows_decoded.
+    `base`, `retries`, `max_workers` and `backoff` default to SMARD_BASE_URL,
+    SMARD_RETRIES, SMARD_MAX_WORKERS and SMARD_BACKOFF (weekly chunk files are fetched concurrently, each
+    worker thread over its own keep-alive session; 429 / 5xx / connection errors are retried with backoff).
     """
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     headers = {"User-Agent": "Mozilla/5.0"}
+    base = SMARD_BASE_URL if base is None else base
+    retries = SMARD_RETRIES if retries is None else retries
+    max_workers = SMARD_MAX_WORKERS if max_workers is None else max_workers
+    backoff = SMARD_BACKOFF if backoff is None else backoff
 
     # parse start/end (accept str or datetime); timestamps are UTC ms
     if isinstance(start, str):
@@ -33,13 +111,11 @@ def smard_range(
     start_ms = int(start.timestamp() * 1000) # here we transofrm the start and end date to match smard (unix milliseconds)
     end_ms = int(end.timestamp() * 1000)
 
+    session = requests.Session()
+
     # 1) list chunk timestamps
-    idx = requests.get(
-        f"{base}/{filter_id}/{region}/index_{resolution}.json",
-        headers=headers,
-        timeout=60,
-        verify=verify
-    ).json() 
+    idx, *counts = _get_json(session, f"{base}/{filter_id}/{region}/index_{resolution}.json", headers, verify, retries, backoff)
+    _record(stats, *counts)
 
     # requests.get() comes form the library requests and will send a request to the API (in this case teh SMARD API) and sends a GET requests (want to get some data)
     # .json() will grab the data we fetched which grabs the teh JSOn data in the python dict format
@@ -47,6 +123,7 @@ def smard_range(
 
     stamps = sorted(idx.get("timestamps", [])) #.get() is different from the one above, this one returns the item() corresponding to the key timestamp in a dictionnary (or else if dict empy return [])
     if not stamps:
+        session.close()
         return pd.DataFrame(columns=["time_utc", "value"]) 
 
     # 2) choose the chunks that cover [start, end]
@@ -59,13 +136,27 @@ def smard_range(
 
     # 3) fetch, merge, dedupe (last value wins)
     rows = []
-    for time_series in selected:
-        api_request = requests.get(
-            f"{base}/{filter_id}/{region}/{filter_id}_{region}_{resolution}_{time_series}.json",
-            headers=headers,
-            timeout=60,
-            verify=verify,
-        ).json()
+    urls = [f"{base}/{filter_id}/{region}/{filter_id}_{region}_{resolution}_{time_series}.json" for time_series in selected]
+    # map() keeps chunk order, so "last value wins" below is unchanged;
+    # stats are only updated from this thread, after the fetches.
+    # requests.Session is not thread-safe: each worker gets its own
+    local, sessions, lock = threading.local(), [session], threading.Lock()
+
+    def fetch(url):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            with lock:
+                sessions.append(local.session)
+        return _get_json(local.session, url, headers, verify, retries, backoff)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+            payloads = list(pool.map(fetch, urls))
+    finally:
+        for s in sessions:
+            s.close()
+    for api_request, *counts in payloads:
+        _record(stats, *counts)
         rows += api_request.get("series") or api_request.get("series2") or [] 
         
         # Makes a second API request and gets all of the time series data based ont eh timestamps we extracted and transformed in actual time series value before
@@ -86,5 +177,6 @@ def smard_range(
 
     # 4) precise time window filter
     m = (df["epoch_ms"] >= start_ms) & (df["epoch_ms"] <= end_ms) #subsets only the period we're interested about 
+    add(stats, "rows_decoded", int(m.sum()))
     return df.loc[m, ["time_utc", "value"]].reset_index(drop=True)
 # %%
@@ -76,6 +76,41 @@ the last date saved
 we don't use it to save parquet files
 """
 
+# version key of everything the stats pipeline derives from the lake
+STATS_VERSION_KEY = "stats"
+
+
+def load_data_versions(path: str | Path) -> dict[str, int]:
+    """
+    Per-key data versions: { filter_id_str | "stats": int, ... }.
+    Missing file -> {} (every key at version 0).
+    """
+    file_path = Path(path)
+    if not file_path.exists():
+        return {}
+    with open(file_path, "r") as f:
+        return {str(k): int(v) for k, v in json.load(f).items()}
+
+
+def bump_data_versions(path: str | Path, keys) -> dict[str, int]:
+    """
+    +1 on the version of every key (filter ids that received rows, or "stats"
+    after a stats run). Written atomically: dashboards read the file on every rerun.
+    """
+    from .io_s3 import write_atomic
+
+    versions = load_data_versions(path)
+    for key in keys:
+        versions[str(key)] = versions.get(str(key), 0) + 1
+    write_atomic(Path(path), json.dumps(versions).encode())
+    return versions
+
+"""
+Data versions only ever increase. The dashboard keys its caches on the
+versions of the filters a page reads, so a page reloads right after an ingest
+touched one of them and never otherwise.
+"""
+
 def ensure_utc(time_series):
     time_series = pd.Timestamp(time_series)
     if time_series.tzinfo is None:
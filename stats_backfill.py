@@ -8,11 +8,17 @@ from analysis.market_price import (
     load_prices_with_returns,
     compute_multi_window_stats,
 )
+from analysis.streaming_stats import stream_multi_window_stats
 
 from power.fetch_power.parquet_convert import merge_incoming_data, to_parquet_bytes
-from power.fetch_power.state import save_hwm, floor_to_quarter, load_hwm_map
+from power.fetch_power.state import save_hwm, floor_to_quarter, load_hwm_map, bump_data_versions, STATS_VERSION_KEY
 from power.fetch_power.io_s3 import write_atomic 
 from power.fetch_power.smard_filters import FILTER_GROUPS
+from analysis.spread_cube import update_spread_cube, SPREAD_CUBE_PATH
+from analysis.feature_store import update_feature_store
+from analysis.baseline_forecast import update_baseline_forecasts
+from analysis.comoment_store import update_comoment_store
+from power.fetch_power.run_metrics import RunMetrics
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_ROOT = PROJECT_ROOT / "data"
@@ -20,9 +26,12 @@ STATE_ROOT = PROJECT_ROOT / "state"
 
 DATA_HWM_PATH = STATE_ROOT / "high_watermark.json"          # raw data HWM (per filter)
 STATS_HWM_PATH = STATE_ROOT / "stats_high_watermark.json"
+DATA_VERSIONS_PATH = STATE_ROOT / "data_versions.json"
 
 STATS_SLOW_PATH = DATA_ROOT / "stats" / "market_price_stats_slow.parquet"
-SLOW_WINDOWS = ["7D", "30D", "1Y"]  # heavy windows; tweak as needed
+SLOW_WINDOWS = ["7D", "30D", "1Y", "max"]  # heavy windows; tweak as needed
+# stream the lake in chunks (bounded memory) instead of one full-history frame
+STATS_STREAMING = os.environ.get("STATS_STREAMING", "1") == "1"
 
 REGION_CODE = "DE"
 RESOLUTION = "quarterhour"
@@ -37,6 +46,8 @@ for all filters in a group, and store them under STATS_ROOT.
 def main(start, end, filter_group_name=None, resolution: str = RESOLUTION):
     if filter_group_name is None:
         filter_group_name = os.environ.get("FILTER_GROUP", "market_price")
+    # step timings + stats watermark lag -> metrics/ingest_runs.jsonl
+    metrics = RunMetrics("stats_backfill", filter_group=filter_group_name)
 
     # 1) Data HWM (per filter) -> group cutoff
     hwm_map = load_hwm_map(DATA_HWM_PATH)
@@ -64,24 +75,34 @@ def main(start, end, filter_group_name=None, resolution: str = RESOLUTION):
         end_ts = data_hwm
 
 
-    # 2) Load all prices + returns for the group
-    prices = load_prices_with_returns(filter_group_name=filter_group_name)
-    if prices.empty:
-        print("No prices data available; aborting stats backfill.")
-        return
-
-    # apply start/end filter if provided
-    prices = prices.copy()
-    if start_ts is not None:
-        prices = prices[prices["time"] >= start_ts]
-    prices = prices[prices["time"] <= end_ts]
-
-    if prices.empty:
-        print("No prices left after applying start/end; aborting.")
-        return
-
-    # 3) Compute heavy-window stats for the group (all zones together)
-    stats_slow = compute_multi_window_stats(prices, SLOW_WINDOWS)
+    if STATS_STREAMING:
+        # 2+3) Heavy-window stats straight from the lake, STREAM_CHUNK_DAYS at a time
+        with metrics.step("stats"):
+            stats_slow = stream_multi_window_stats(
+                SLOW_WINDOWS, filter_group_name=filter_group_name, start=start_ts, end=end_ts
+            )
+        metrics.extra["rows"] = stats_slow.attrs.get("rows", 0)
+    else:
+        # 2) Load all prices + returns for the group
+        with metrics.step("load_prices"):
+            prices = load_prices_with_returns(filter_group_name=filter_group_name)
+        if prices.empty:
+            print("No prices data available; aborting stats backfill.")
+            return
+
+        # apply start/end filter if provided
+        if start_ts is not None:
+            prices = prices[prices["time"] >= start_ts]
+        prices = prices[prices["time"] <= end_ts]
+
+        if prices.empty:
+            print("No prices left after applying start/end; aborting.")
+            return
+
+        # 3) Compute heavy-window stats for the group (all zones together)
+        metrics.extra["rows"] = len(prices)
+        with metrics.step("stats"):
+            stats_slow = compute_multi_window_stats(prices, SLOW_WINDOWS)
     if stats_slow.empty:
         print("No stats produced for heavy windows.")
         return
@@ -90,9 +111,32 @@ def main(start, end, filter_group_name=None, resolution: str = RESOLUTION):
     write_atomic(STATS_SLOW_PATH, data_bytes)
     print(f"Saved slow-window stats to {STATS_SLOW_PATH}")
 
-    # 4) Update stats HWM to end_ts (group-level)
+    # 4) Rebuild the spread cube (all zone pairs) + hour-of-day aggregates
+    with metrics.step("spread_cube"):
+        cube = update_spread_cube(end=end_ts, rebuild=True)
+    print(f"Spread cube: {len(cube)} rows x {max(len(cube.columns) - 1, 0)} pairs -> {SPREAD_CUBE_PATH}")
+
+    # 5) Rebuild the DE feature store
+    with metrics.step("feature_store"):
+        meta = update_feature_store(end=end_ts, rebuild=True)
+    print(f"Feature store v{meta.get('version')} -> {meta.get('watermark')}")
+
+    # 6) Refit the baseline forecaster from scratch and write its forecasts
+    with metrics.step("baseline"):
+        baseline = update_baseline_forecasts(end=end_ts, rebuild=True)
+    print(f"Baseline forecasts written for zones {sorted(baseline.get('zones', {}))}")
+
+    # 7) Rebuild the feature co-moment store
+    with metrics.step("comoments"):
+        comoments = update_comoment_store(end=end_ts, rebuild=True)
+    print(f"Co-moment windows rebuilt ({len(comoments)} rows)")
+
+    # 8) Update stats HWM to end_ts (group-level)
     save_hwm(STATS_HWM_PATH, end_ts)
     print(f"Stats HWM -> {end_ts.isoformat()}")
+    # derived tables (stats, cube, features, baseline, co-moments) changed
+    bump_data_versions(DATA_VERSIONS_PATH, [STATS_VERSION_KEY])
+    metrics.finish(watermarks={STATS_VERSION_KEY: end_ts})
 
 
 if __name__ == "__main__":
@@ -9,9 +9,15 @@ from analysis.market_price import (
     load_prices_with_returns,
     compute_multi_window_stats,
 )
-from power.fetch_power.state import load_hwm_map, load_hwm, save_hwm, floor_to_quarter
+from analysis.streaming_stats import stream_multi_window_stats
+from power.fetch_power.state import load_hwm_map, load_hwm, save_hwm, floor_to_quarter, bump_data_versions, STATS_VERSION_KEY
 from power.fetch_power.parquet_convert import to_parquet_bytes
 from power.fetch_power.io_s3 import write_atomic
+from analysis.spread_cube import update_spread_cube, SPREAD_CUBE_PATH
+from analysis.feature_store import update_feature_store
+from analysis.baseline_forecast import update_baseline_forecasts
+from analysis.comoment_store import update_comoment_store
+from power.fetch_power.run_metrics import RunMetrics
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 DATA_ROOT = PROJECT_ROOT / "data"
@@ -19,60 +25,102 @@ STATE_ROOT = PROJECT_ROOT / "state"
 
 DATA_HWM_PATH = STATE_ROOT / "high_watermark.json"          # raw data HWM (per filter)
 STATS_HWM_PATH = STATE_ROOT / "stats_high_watermark.json"   # stats HWM (single)
+DATA_VERSIONS_PATH = STATE_ROOT / "data_versions.json"      # per-filter / stats data versions
 
 STATS_FAST_PATH = DATA_ROOT / "stats" / "market_price_stats_fast.parquet"
 FAST_WINDOWS = ["1D", "3D"]  # light windows
+# stream only the partitions the windows need instead of loading the full history
+STATS_STREAMING = os.environ.get("STATS_STREAMING", "1") == "1"
 
 
 def main(filter_group_name: str | None = None):
     if filter_group_name is None:
         filter_group_name = os.environ.get("FILTER_GROUP", "market_price")
-
-    # 1) Data HWM (per filter) -> group cutoff
-    hwm_map = load_hwm_map(DATA_HWM_PATH)
-    if not hwm_map:
-        print("No data HWM found; nothing to do.")
-        return
-
-    data_hwm = min(hwm_map.values())
-    data_hwm = floor_to_quarter(data_hwm)
-    print(f"Data HWM (min over filters) = {data_hwm}")
-
-    # 2) Stats HWM (single)
-    stats_hwm = load_hwm(STATS_HWM_PATH)
-    if isinstance(stats_hwm, pd.Timestamp) and data_hwm <= stats_hwm:
-        print("Stats already up to date; exiting.")
-        return
-
-    # 3) Load all prices + returns up to data_hwm
-    prices = load_prices_with_returns(filter_group_name=filter_group_name)
-    if prices.empty:
-        print("No prices data; aborting stats incremental.")
-        return
-
-    prices = prices.copy()
-    prices["time"] = pd.to_datetime(prices["time"], utc=True)
-    prices = prices[prices["time"] <= data_hwm]
-
-    if prices.empty:
-        print("No prices up to data_hwm; aborting.")
-        return
-
-    # 4) Compute fast-window stats for the group
-    stats_fast = compute_multi_window_stats(prices, FAST_WINDOWS)
-    if stats_fast.empty:
-        print("No stats produced for fast windows.")
-        return
-
-    # Option A: overwrite a single combined stats file with only 1D/3D
-    # Option B (later): merge with slow stats, or write a separate file.
-    data_bytes = to_parquet_bytes(stats_fast)
-    write_atomic(STATS_FAST_PATH, data_bytes)
-    print(f"Saved fast-window stats to {STATS_FAST_PATH}")
-
-    # 5) Update stats HWM
-    save_hwm(STATS_HWM_PATH, data_hwm)
-    print(f"Stats HWM -> {data_hwm.isoformat()}")
+    # step timings + stats watermark lag -> metrics/ingest_runs.jsonl
+    metrics = RunMetrics("stats_incremental", filter_group=filter_group_name)
+
+    # every exit (early return or error) records the run; the stats HWM
+    # stays at its previous value until step 9 moves it
+    watermarks = {}
+    try:
+        # 1) Data HWM (per filter) -> group cutoff
+        hwm_map = load_hwm_map(DATA_HWM_PATH)
+        if not hwm_map:
+            print("No data HWM found; nothing to do.")
+            return
+
+        data_hwm = min(hwm_map.values())
+        data_hwm = floor_to_quarter(data_hwm)
+        print(f"Data HWM (min over filters) = {data_hwm}")
+
+        # 2) Stats HWM (single)
+        stats_hwm = load_hwm(STATS_HWM_PATH)
+        watermarks[STATS_VERSION_KEY] = stats_hwm
+        if isinstance(stats_hwm, pd.Timestamp) and data_hwm <= stats_hwm:
+            print("Stats already up to date; exiting.")
+            return
+
+        if STATS_STREAMING:
+            # 3+4) Fast-window stats reading only the last few days of partitions
+            with metrics.step("stats"):
+                stats_fast = stream_multi_window_stats(FAST_WINDOWS, filter_group_name=filter_group_name, end=data_hwm)
+            metrics.extra["rows"] = stats_fast.attrs.get("rows", 0)
+        else:
+            # 3) Load all prices + returns up to data_hwm
+            with metrics.step("load_prices"):
+                prices = load_prices_with_returns(filter_group_name=filter_group_name)
+            if prices.empty:
+                print("No prices data; aborting stats incremental.")
+                return
+
+            prices = prices[prices["time"] <= data_hwm]
+
+            if prices.empty:
+                print("No prices up to data_hwm; aborting.")
+                return
+
+            # 4) Compute fast-window stats for the group
+            metrics.extra["rows"] = len(prices)
+            with metrics.step("stats"):
+                stats_fast = compute_multi_window_stats(prices, FAST_WINDOWS)
+        if stats_fast.empty:
+            print("No stats produced for fast windows.")
+            return
+
+        # Option A: overwrite a single combined stats file with only 1D/3D
+        # Option B (later): merge with slow stats, or write a separate file.
+        data_bytes = to_parquet_bytes(stats_fast)
+        write_atomic(STATS_FAST_PATH, data_bytes)
+        print(f"Saved fast-window stats to {STATS_FAST_PATH}")
+
+        # 5) Extend the spread cube (all zone pairs) with the new quarter-hours
+        with metrics.step("spread_cube"):
+            cube = update_spread_cube(end=data_hwm)
+        print(f"Spread cube: {len(cube)} rows x {max(len(cube.columns) - 1, 0)} pairs -> {SPREAD_CUBE_PATH}")
+
+        # 6) Extend the DE feature store from its watermark
+        with metrics.step("feature_store"):
+            meta = update_feature_store(end=data_hwm)
+        print(f"Feature store v{meta.get('version')} -> {meta.get('watermark')}")
+
+        # 7) Add the new rows to the baseline forecaster and write its forecasts
+        with metrics.step("baseline"):
+            baseline = update_baseline_forecasts(end=data_hwm)
+        print(f"Baseline forecasts written for zones {sorted(baseline.get('zones', {}))}")
+
+        # 8) Add the newly closed days to the feature co-moment store
+        with metrics.step("comoments"):
+            comoments = update_comoment_store(end=data_hwm)
+        print(f"Co-moment windows updated ({len(comoments)} rows)")
+
+        # 9) Update stats HWM
+        save_hwm(STATS_HWM_PATH, data_hwm)
+        watermarks[STATS_VERSION_KEY] = data_hwm
+        print(f"Stats HWM -> {data_hwm.isoformat()}")
+        # derived tables (stats, cube, features, baseline, co-moments) changed
+        bump_data_versions(DATA_VERSIONS_PATH, [STATS_VERSION_KEY])
+    finally:
+        metrics.finish(watermarks=watermarks)
 
 
 if __name__ == "__main__":
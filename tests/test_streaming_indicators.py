@@ -0,0 +1,132 @@
+# tests/test_streaming_indicators.py
+
+import functools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from analysis.read_data import load_filter_history
+from analysis.market_price import add_technical_indicators, add_rolling_volatility
+from analysis.streaming_indicators import (
+    IndicatorState,
+    INDICATOR_COLUMNS,
+    advance_indicators,
+    load_indicator_states,
+    save_indicator_states,
+)
+from power.fetch_power.parquet_convert import merge_incoming_data
+
+# lake slices with the cases the two paths used to disagree on:
+# zero prices (0 -> 0 returns), flat prices (zero average loss) and a gap of
+# missing prices (EMA decay)
+SLICES = [
+    ("4169", "2022-01-10", "2022-02-25"),
+    ("4169", "2025-11-25", "2025-12-20"),
+]
+
+
+def _batch(df: pd.DataFrame) -> pd.DataFrame:
+    prices = pd.DataFrame({"time": pd.to_datetime(df["time_utc"], utc=True), "zone": "DE", "price": df["value"]})
+    out = add_technical_indicators(prices)
+    out["zone"] = "DE"  # groupby.apply drops the grouping column
+    return add_rolling_volatility(out).reset_index(drop=True)
+
+
+def _replay(df: pd.DataFrame, split: int | None = None) -> pd.DataFrame:
+    state, rows = IndicatorState(), []
+    for i, (t, v) in enumerate(zip(pd.to_datetime(df["time_utc"], utc=True), df["value"].to_numpy())):
+        if i == split:  # persist + reload mid-stream, as between two ingest runs
+            state = IndicatorState.from_dict(state.to_dict())
+        rows.append(state.update(t, v))
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("filter_id,start,end", SLICES)
+def test_replay_matches_batch(filter_id, start, end):
+    df = load_filter_history(filter_id, start=start, end=end)
+    if df.empty:
+        pytest.skip("lake slice not available")
+
+    batch = _batch(df)
+    streamed = _replay(df, split=len(df) // 2)
+
+    for col in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(
+            streamed[col].to_numpy(float), batch[col].to_numpy(float), rtol=1e-7, atol=1e-7, err_msg=col
+        )
+
+
+def _ingest(tmp_path, states, df, rewind_hours=24):
+    """One incremental step: raw rows into the lake, then the indicators; state saved + reloaded."""
+    merge_incoming_data(tmp_path / "data", "DE", "4169", df)
+    advance_indicators(
+        states, "4169", df, root=tmp_path, indicator_root=tmp_path / "data" / "indicators", rewind_hours=rewind_hours
+    )
+    save_indicator_states(tmp_path / "state.json", states)
+    return load_indicator_states(tmp_path / "state.json")
+
+
+@pytest.mark.parametrize("revise_hours_back,rewind_hours", [(1, 24), (6, 2)])
+def test_overlap_revisions_reach_indicators(tmp_path, revise_hours_back, rewind_hours):
+    df = load_filter_history("4169", start="2025-11-01", end="2025-11-10").dropna().reset_index(drop=True)
+    if df.empty:
+        pytest.skip("lake slice not available")
+
+    # first run, then an overlapping re-fetch that revises rows already processed
+    n1 = len(df) - 96
+    states = _ingest(tmp_path, {"DE": IndicatorState()}, df.iloc[:n1], rewind_hours)
+    overlap = df.iloc[n1 - 4 * revise_hours_back - 8:].copy()
+    revised = overlap.index[:4]
+    overlap.loc[revised, "value"] += 25.0
+    states = _ingest(tmp_path, states, overlap, rewind_hours)
+
+    expected = df.copy()
+    expected.loc[revised, "value"] += 25.0
+    stored = load_filter_history("4169", root=tmp_path, data_root=tmp_path / "data" / "indicators")
+    batch = _batch(expected)
+    assert len(stored) == len(batch)
+    for col in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(
+            stored[col].to_numpy(float), batch[col].to_numpy(float), rtol=1e-7, atol=1e-7, err_msg=col
+        )
+
+
+def test_backfill_revisions_reach_indicators(tmp_path, monkeypatch):
+    import backfill
+
+    df = load_filter_history("4169", start="2025-11-01", end="2025-11-10").dropna().reset_index(drop=True)
+    if df.empty:
+        pytest.skip("lake slice not available")
+
+    # indicators maintained by incremental runs, then a backfill revises rows
+    # days before the state's checkpoint
+    (tmp_path / "state").mkdir()
+    states = _ingest(tmp_path, {"DE": IndicatorState()}, df, rewind_hours=24)
+    save_indicator_states(tmp_path / "state" / "indicator_state.json", states)
+
+    expected = df.copy()
+    revised = expected.index[300:304]
+    expected.loc[revised, "value"] += 25.0
+    monkeypatch.setattr(backfill, "smard_range", lambda filter_id, **kwargs: expected if filter_id == "4169" else pd.DataFrame())
+    monkeypatch.setattr(backfill, "DATA_VERSIONS_PATH", tmp_path / "state" / "data_versions.json")
+    monkeypatch.setattr(
+        backfill.RunMetrics, "finish", functools.partialmethod(backfill.RunMetrics.finish, path=tmp_path / "runs.jsonl")
+    )
+    backfill.main(
+        "2025-11-01", "2025-11-10", "market_price", data_root=tmp_path / "data", hmw_path=tmp_path / "state" / "hwm.json"
+    )
+
+    stored = load_filter_history("4169", root=tmp_path, data_root=tmp_path / "data" / "indicators")
+    batch = _batch(expected)
+    assert len(stored) == len(batch)
+    for col in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(
+            stored[col].to_numpy(float), batch[col].to_numpy(float), rtol=1e-7, atol=1e-7, err_msg=col
+        )